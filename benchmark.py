@@ -0,0 +1,1506 @@
+"""
+Benchmarks for the MTG Deck Analyzer (v13.py).
+
+Every benchmark runs against synthetic data or a local mock of the Moxfield API,
+so no network access is needed.
+
+Usage:
+    python benchmark.py fetch --decks 500 --latency 0.05
+    python benchmark.py search --commanders 5 --pages 10
+    python benchmark.py throttle --server-rate 40 --error-rate 0.05
+    python benchmark.py store --decks 2000
+    python benchmark.py incremental --decks 2000 --new-decks 50
+    python benchmark.py cooccurrence --decks 1000 10000 50000
+    python benchmark.py parallel --decks 20000 --workers 4
+    python benchmark.py decode --decks 2000
+    python benchmark.py normalize --lookups 1000000
+    python benchmark.py memory --decks 10000
+    python benchmark.py matching --decks 10000 --seeds 13 --minimum 3
+    python benchmark.py scoring --decks 5000 --seeds 13
+    python benchmark.py synergy --decks 5000 --deck-size 150
+    python benchmark.py index --decks 5000 --top-k 100
+    python benchmark.py streaming --decks 5000 --budget-mb 1
+    python benchmark.py approximate --decks 5000 --permutations 32 128 512 --epsilon 1e-3 1e-5
+    python benchmark.py cache --commanders 6 --analysis-size 3 --overlap 2
+    python benchmark.py refresh --commanders 3 --changed 0.1
+    python benchmark.py view --cards 20000
+    python benchmark.py startup --runs 5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import v13
+
+CARD_TYPES = [
+    "Creature — Elf Druid", "Instant", "Sorcery", "Artifact", "Enchantment",
+    "Legendary Creature — Human Wizard", "Land", "Artifact Creature — Golem", "Basic Land — Forest"
+]
+MANA_COSTS = ["{1}{G}", "{2}{U}", "{B}", "{3}{R}{R}", "{W}{W}", "{4}", "", "{X}{G}{U}"]
+
+
+def make_card(card_number):
+    """Build a deterministic fake card entry in the Moxfield payload format"""
+    rng = random.Random(card_number)
+    return {
+        "quantity": 1,
+        "boardType": "mainboard",
+        "card": {
+            "id": f"card{card_number}",
+            "name": f"Card Number {card_number}",
+            "type_line": rng.choice(CARD_TYPES),
+            "mana_cost": rng.choice(MANA_COSTS),
+            # Unused fields to make payloads closer to real Moxfield responses
+            "oracle_text": "Lorem ipsum dolor sit amet. " * 8,
+            "prices": {"usd": rng.random() * 10, "eur": rng.random() * 10},
+            "set": "abc",
+            "rarity": "rare"
+        }
+    }
+
+
+def make_deck(public_id, vocabulary_size=2000, deck_size=99, revision=0):
+    """Build a deterministic fake decklist; popular cards appear much more often"""
+    rng = random.Random(f"{public_id}:{revision}" if revision else public_id)
+    cards = set()
+    while len(cards) < deck_size:
+        # Skewed distribution so that some cards are staples and most are rare
+        cards.add(int(vocabulary_size * rng.random() ** 3))
+
+    return {
+        "publicId": public_id,
+        "name": f"Deck {public_id}",
+        "mainboard": {f"card{n}": make_card(n) for n in sorted(cards)},
+        "commanders": {"cmdr": {"quantity": 1, "card": {
+            "name": "Gyome, Master Chef",
+            "type_line": "Legendary Creature — Troll Warlock",
+            "mana_cost": "{2}{B}{G}"
+        }}}
+    }
+
+
+class MockMoxfieldServer:
+    """Local HTTP server imitating the Moxfield deck and search endpoints"""
+
+    def __init__(self, latency=0.05, decks_per_commander=200, page_size=64, max_requests_per_second=None,
+                 error_rate=0.0, retry_after=1):
+        """
+        Args:
+            latency (float): Seconds to wait before answering each request
+            decks_per_commander (int): Number of search results per commander
+            page_size (int): Search results per page
+            max_requests_per_second (int): Answer 429 with Retry-After above this rate (None = never)
+            error_rate (float): Fraction of requests answered with a random 503
+            retry_after (int): Value of the Retry-After header on 429 responses
+        """
+        self.latency = latency
+        self.decks_per_commander = decks_per_commander
+        self.page_size = page_size
+        self.max_requests_per_second = max_requests_per_second
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.throttled_count = 0
+        self.recent_requests = deque()
+        self.rng = random.Random(0)
+        self.lock = threading.Lock()
+        self.revisions = Counter()  # public ID -> number of times the deck was edited
+        self.server = None
+        self.thread = None
+
+    @property
+    def api_base(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v2"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(mock.latency)
+                status, payload, headers = mock.throttle()
+                if status is None:
+                    status, payload = mock.handle(self.path)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def throttle(self):
+        """Decide whether to reject a request; returns (status, payload, headers) or (None, None, {})"""
+        with self.lock:
+            self.request_count += 1
+            now = time.monotonic()
+            while self.recent_requests and now - self.recent_requests[0] > 1.0:
+                self.recent_requests.popleft()
+
+            if self.max_requests_per_second and len(self.recent_requests) >= self.max_requests_per_second:
+                self.throttled_count += 1
+                return 429, {"error": "rate limited"}, {"Retry-After": str(self.retry_after)}
+
+            self.recent_requests.append(now)
+            if self.rng.random() < self.error_rate:
+                self.throttled_count += 1
+                return 503, {"error": "unavailable"}, {}
+
+        return None, None, {}
+
+    def last_updated(self, public_id):
+        """lastUpdatedAtUtc of a deck, moved forward a day by every edit"""
+        return f"2024-01-{1 + self.revisions[public_id]:02d}T00:00:00.000Z"
+
+    def handle(self, path):
+        """Return (status, payload) for a request path"""
+        parsed = urlparse(path)
+        if parsed.path.startswith("/v2/decks/all/"):
+            public_id = parsed.path.rsplit("/", 1)[1]
+            deck = make_deck(public_id, revision=self.revisions[public_id])
+            deck["lastUpdatedAtUtc"] = self.last_updated(public_id)
+            return 200, deck
+
+        if parsed.path == "/v2/decks/search-sfw":
+            query = parse_qs(parsed.query)
+            commander_id = query["commanderCardId"][0]
+            page_number = int(query["pageNumber"][0])
+            start = (page_number - 1) * self.page_size
+            end = min(start + self.page_size, self.decks_per_commander)
+            ids = [f"{commander_id}-{i}" for i in range(start, end)]
+            return 200, {"data": [{"publicId": pid, "lastUpdatedAtUtc": self.last_updated(pid)} for pid in ids]}
+
+        return 404, {"error": "not found"}
+
+
+def make_analyzer(api_base, concurrency=16, deck_cache=None):
+    """
+    Create an analyzer writing to a temporary directory and talking to the mock server.
+
+    Unless a deck cache is given, the analyzer gets its own empty one, so decks downloaded
+    by an earlier benchmark run are never restored from the shared cache.
+    """
+    output_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+    analyzer = v13.MoxfieldAnalyzer(output_dir=output_dir, session_pool=v13.ScraperSessionPool(size=concurrency))
+    analyzer.api_base = api_base
+    analyzer.fetch_concurrency = concurrency
+    if deck_cache is None:
+        deck_cache = v13.DeckCache(os.path.join(output_dir, v13.DeckCache.FILENAME))
+    analyzer.deck_cache = deck_cache
+    return analyzer
+
+
+def bench_fetch(args):
+    """Compare the asyncio collection engine with the original thread pool"""
+    public_ids = [f"deck{i}" for i in range(args.decks)]
+    results = []
+
+    with MockMoxfieldServer(latency=args.latency) as server:
+        for label, use_async in (("thread pool (5 workers)", False), ("asyncio engine", True)):
+            analyzer = make_analyzer(server.api_base, concurrency=args.concurrency)
+            analyzer.use_async_collection = use_async
+            analyzer.requests_per_second = args.rate
+
+            start = time.perf_counter()
+            collected = analyzer.collect_decklists_parallel(public_ids, max_workers=5)
+            elapsed = time.perf_counter() - start
+            results.append((label, collected, elapsed))
+            shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+
+    print(f"\nCollected {args.decks} decks, {args.latency * 1000:.0f} ms simulated latency")
+    for label, collected, elapsed in results:
+        print(f"  {label:<28} {collected:>6} decks  {elapsed:7.2f}s  {collected / elapsed:8.1f} decks/s")
+
+
+def sequential_search_then_collect(analyzer, commander_ids, page_limit, page_delay):
+    """The original flow: one page at a time with a fixed sleep, then a separate download phase"""
+    all_public_ids = []
+    for commander_id in commander_ids:
+        for page_number in range(1, page_limit + 1):
+            ids = analyzer.fetch_search_page(commander_id, page_number)
+            if not ids:
+                break
+            all_public_ids.extend(ids)
+            time.sleep(page_delay)
+
+    all_public_ids = list(set(all_public_ids))
+    analyzer.use_async_collection = False
+    return all_public_ids, analyzer.collect_decklists_parallel(all_public_ids, max_workers=5)
+
+
+def bench_search(args):
+    """Compare sequential search + download with the pipelined concurrent search"""
+    commander_ids = [f"cmdr{i}" for i in range(args.commanders)]
+    results = []
+
+    with MockMoxfieldServer(latency=args.latency, decks_per_commander=args.decks_per_commander) as server:
+        analyzer = make_analyzer(server.api_base)
+        start = time.perf_counter()
+        found, collected = sequential_search_then_collect(analyzer, commander_ids, args.pages, args.page_delay)
+        results.append(("sequential + sleep", len(found), collected, time.perf_counter() - start))
+        shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+
+        analyzer = make_analyzer(server.api_base, concurrency=args.concurrency)
+        analyzer.requests_per_second = args.rate
+        start = time.perf_counter()
+        found, collected = analyzer.search_and_collect_decklists(commander_ids, page_limit=args.pages)
+        results.append(("pipelined", len(found), collected, time.perf_counter() - start))
+        shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+
+    print(f"\n{args.commanders} commanders x up to {args.pages} pages, "
+          f"{args.decks_per_commander} decks per commander")
+    for label, found, collected, elapsed in results:
+        print(f"  {label:<22} found {found:>6}  collected {collected:>6}  {elapsed:7.2f}s")
+
+
+def bench_throttle(args):
+    """Run the pipeline against a throttling server with and without the adaptive limiter"""
+    commander_ids = [f"cmdr{i}" for i in range(args.commanders)]
+    expected = args.commanders * args.decks_per_commander
+    results = []
+
+    for label, adaptive in (("no retries, fixed limits", False), ("adaptive limiter", True)):
+        with MockMoxfieldServer(latency=args.latency, decks_per_commander=args.decks_per_commander,
+                                max_requests_per_second=args.server_rate, error_rate=args.error_rate) as server:
+            analyzer = make_analyzer(server.api_base, concurrency=args.concurrency)
+            analyzer.requests_per_second = args.rate
+            if not adaptive:
+                analyzer.max_retries = 0
+                analyzer.min_fetch_concurrency = args.concurrency
+                analyzer.min_requests_per_second = args.rate
+
+            start = time.perf_counter()
+            found, collected = analyzer.search_and_collect_decklists(commander_ids, page_limit=args.pages)
+            elapsed = time.perf_counter() - start
+            results.append((label, len(found), collected, elapsed, server.throttled_count,
+                            analyzer.get_rate_limiter().describe()))
+            shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+
+    print(f"\n{expected} decks behind a server allowing {args.server_rate} req/s "
+          f"with {args.error_rate * 100:.0f}% random 503s")
+    for label, found, collected, elapsed, throttled, limiter in results:
+        print(f"  {label:<26} found {found:>5}/{expected}  collected {collected:>5}  "
+              f"missing {expected - collected:>5}  {elapsed:6.2f}s  ({throttled} rejected by server)")
+        print(f"      limiter: {limiter}")
+
+
+def bench_cache(args):
+    """Overlapping commander analyses in separate output directories, with and without the shared deck cache"""
+    commander_ids = [f"cmdr{i}" for i in range(args.commanders)]
+    step = args.analysis_size - args.overlap
+    analyses = [commander_ids[start:start + args.analysis_size]
+                for start in range(0, len(commander_ids) - args.overlap, step)]
+    results = []
+
+    for label, shared in (("per-directory downloads", False), ("shared deck cache", True)):
+        cache_dir = tempfile.mkdtemp(prefix="moxfield_cache_")
+        deck_cache = v13.DeckCache(os.path.join(cache_dir, v13.DeckCache.FILENAME)) if shared else None
+        with MockMoxfieldServer(latency=args.latency, decks_per_commander=args.decks_per_commander) as server:
+            collected = 0
+            start = time.perf_counter()
+            for analysis in analyses:
+                analyzer = make_analyzer(server.api_base, concurrency=args.concurrency, deck_cache=deck_cache)
+                collected += analyzer.search_and_collect_decklists(analysis, page_limit=args.pages)[1]
+                shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+            results.append((label, collected, server.request_count, time.perf_counter() - start))
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"\n{len(analyses)} analyses of {args.analysis_size} commanders, {args.overlap} shared with the next, "
+          f"{args.decks_per_commander} decks per commander")
+    for label, collected, requests, elapsed in results:
+        print(f"  {label:<24} collected {collected:>6}  {requests:>6} requests  {elapsed:7.2f}s")
+
+
+def bench_refresh(args):
+    """Bring collected decks up to date after some changed: skip, full re-scrape or conditional re-fetch"""
+    commander_ids = [f"cmdr{i}" for i in range(args.commanders)]
+    results = []
+
+    with MockMoxfieldServer(latency=args.latency, decks_per_commander=args.decks_per_commander) as server:
+        analyzer = make_analyzer(server.api_base, concurrency=args.concurrency)
+        analyzer.requests_per_second = args.rate
+        public_ids, _ = analyzer.search_and_collect_decklists(commander_ids, page_limit=args.pages)
+
+        # Edit some of the decks on the server
+        rng = random.Random(0)
+        changed = rng.sample(public_ids, int(len(public_ids) * args.changed))
+        for public_id in changed:
+            server.revisions[public_id] += 1
+
+        def stale_count(analyzer):
+            fetch_times = analyzer.deck_store.fetch_times()
+            return sum(fetch_times[public_id][1] != server.last_updated(public_id) for public_id in public_ids)
+
+        # Old behaviour: the saved IDs are all collected, nothing is downloaded
+        start = time.perf_counter()
+        requests = server.request_count
+        analyzer.collect_decklists_parallel(public_ids)
+        results.append(("saved IDs only", server.request_count - requests, time.perf_counter() - start,
+                        stale_count(analyzer)))
+
+        # Full re-scrape into a fresh directory
+        scrape = make_analyzer(server.api_base, concurrency=args.concurrency)
+        scrape.requests_per_second = args.rate
+        start = time.perf_counter()
+        requests = server.request_count
+        scrape.search_and_collect_decklists(commander_ids, page_limit=args.pages)
+        results.append(("full re-scrape", server.request_count - requests, time.perf_counter() - start,
+                        stale_count(scrape)))
+        shutil.rmtree(scrape.output_dir, ignore_errors=True)
+
+        # Search again, only changed decks are downloaded
+        start = time.perf_counter()
+        requests = server.request_count
+        analyzer.search_and_collect_decklists(commander_ids, page_limit=args.pages)
+        results.append(("conditional re-fetch", server.request_count - requests, time.perf_counter() - start,
+                        stale_count(analyzer)))
+        shutil.rmtree(analyzer.output_dir, ignore_errors=True)
+
+    print(f"\n{len(public_ids)} collected decks, {len(changed)} changed on the server")
+    for label, requests, elapsed, stale in results:
+        print(f"  {label:<22} {requests:>6} requests  {elapsed:7.2f}s  {stale:>5} stale decks left")
+
+
+def make_all_cards_report(card_count):
+    """Build a fake all cards report DataFrame like generate_owned_vs_scraped_report"""
+    rng = random.Random(0)
+    return v13.pd.DataFrame([{
+        'Card Name': f"card {n}",
+        'Mana Cost': rng.choice(MANA_COSTS),
+        'Deck Count': int(card_count / (n + 1)),
+        'Card Type': rng.choice(["Creature", "Instant", "Sorcery", "Artifact", "Land"]),
+        'Owned': n % 3 == 0,
+        'Quantity Owned': 1 if n % 3 == 0 else 0
+    } for n in range(card_count)])
+
+
+def legacy_results_rows(df, freq_col):
+    """The per-row iterrows loop of update_results_view from before ResultsViewModel, kept as a reference"""
+    rows = []
+    for _, row in df.iterrows():
+        is_auto_include = row.get('Auto-Include', False)
+        is_owned = row.get('Owned', False)
+        mana_cost = row.get('Mana Cost', '')
+        colors = tuple(f"{{{symbol}}}" in mana_cost for symbol, _ in v13.MANA_COLORS)
+        colorless = bool(mana_cost) and not any(colors)
+        values = (row.get('Rank', ''), row.get('Card Name', ''), row.get(freq_col, 0),
+                  row.get('Card Type', 'Unknown'), row.get('Synergy Score', ''), "Yes" if is_owned else "No",
+                  row.get('Quantity Owned', 0), "Yes" if is_auto_include else "No")
+        if is_auto_include:
+            tag = 'auto_include'
+        elif is_owned:
+            tag = 'owned'
+        else:
+            tag = ''
+        rank = row.get('Rank', 0)
+        if 101 <= rank <= 150:
+            tag = 'extended'
+        color_key = v13.MANA_COLORLESS if colorless else sum(1 << i for i, has in enumerate(colors) if has)
+        rows.append((values, (tag,) if tag else (), color_key))
+    return rows
+
+
+def legacy_sort(order, cells, ascending, numeric):
+    """sort_treeview's sort of the cell strings read back from the Treeview, returns the new row order"""
+    def safe_float(val):
+        try:
+            return float(val) if val else 0
+        except ValueError:
+            return 0
+
+    items = [(str(cells[row]), row) for row in order]
+    if numeric:
+        items.sort(key=lambda x: safe_float(x[0]), reverse=not ascending)
+    else:
+        items.sort(key=lambda x: x[0].lower(), reverse=not ascending)
+    return [row for _, row in items]
+
+
+def bench_view(args):
+    """Compare building the results view rows with iterrows against ResultsViewModel"""
+    df = make_all_cards_report(args.cards)
+    df = df.sort_values('Deck Count', ascending=False)
+    df['Rank'] = range(1, len(df) + 1)
+    df['Synergy Score'] = ''
+    print(f"\n{len(df)} cards in the All Cards view")
+
+    start = time.perf_counter()
+    legacy = legacy_results_rows(df, 'Deck Count')
+    legacy_build = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy_order = legacy_sort(range(len(legacy)), [values[2] for values, _, _ in legacy], False, True)
+    legacy_order = legacy_sort(legacy_order, [values[1] for values, _, _ in legacy], True, False)
+    legacy_sort_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = v13.ResultsViewModel(df, 'Deck Count')
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    model.sort("Frequency", ascending=False)
+    order = model.sort("Card Name", ascending=True)
+    sort_time = time.perf_counter() - start
+
+    assert [(values, tags, key) for values, tags, key in legacy] == list(zip(model.values, model.tags,
+                                                                            model.color_keys)), "Rows differ"
+    assert order == legacy_order, "Sort order differs"
+    print(f"  iterrows rows       {legacy_build * 1000:8.1f} ms   two sorts {legacy_sort_time * 1000:6.1f} ms")
+    print(f"  ResultsViewModel    {build * 1000:8.1f} ms   two sorts {sort_time * 1000:6.1f} ms  "
+          f"({(legacy_build + legacy_sort_time) / (build + sort_time):.1f}x)")
+
+    # Multi-key sorts with filters, checked against a row by row filter and a key tuple sort
+    queries = [
+        ([("Frequency", False)], {}),
+        ([("Card Type", True), ("Frequency", False)], {'owned': True}),
+        ([("Card Name", True), ("Card Type", True), ("Rank", True)], {'name': "card 1", 'colors': "UG"}),
+        ([("Owned", False), ("Quantity", False), ("Rank", True)], {'card_type': "Creature", 'colors': "C"}),
+    ]
+    for sort_keys, filters in queries:
+        start = time.perf_counter()
+        rows = model.query(sort_keys, **filters)
+        query_time = time.perf_counter() - start
+        assert rows == reference_query(model, sort_keys, **filters), f"Query differs: {sort_keys} {filters}"
+        described = ", ".join(f"{column} {'asc' if ascending else 'desc'}" for column, ascending in sort_keys)
+        print(f"  query {described:<45} {str(filters):<35} {len(rows):6d} rows {query_time * 1000:6.1f} ms")
+
+
+def reference_query(model, sort_keys, name='', card_type=None, owned=None, colors=''):
+    """Filter the model's cells row by row and sort them with one key tuple per row"""
+    rows = []
+    for row, values in enumerate(model.values):
+        cells = dict(zip(model.COLUMNS, values))
+        key = model.color_keys[row]
+        row_colors = {symbol for bit, (symbol, _) in enumerate(v13.MANA_COLORS) if key & (1 << bit)}
+        if key == v13.MANA_COLORLESS:
+            row_colors = {"C"}
+        if name and name not in str(cells["Card Name"]).lower():
+            continue
+        if card_type is not None and cells["Card Type"] != card_type:
+            continue
+        if owned is not None and (cells["Owned"] == "Yes") != owned:
+            continue
+        if colors and not row_colors & set(colors):
+            continue
+        rows.append(row)
+
+    def sort_key(row):
+        key = []
+        for column, ascending in sort_keys:
+            value = model.sort_keys(column)[row]
+            if not ascending:
+                value = -value if isinstance(value, (int, float)) else Descending(value)
+            key.append(value)
+        return key
+
+    return sorted(rows, key=sort_key)
+
+
+class Descending(str):
+    """Text that sorts in reverse, for descending text columns in reference_query"""
+    def __lt__(self, other):
+        return str.__gt__(self, other)
+
+
+# Imported at the top of v13.py before LazyModule, matplotlib was not used at all
+DEFERRED_MODULES = ("numpy", "pandas", "cloudscraper", "scipy.sparse", "matplotlib.pyplot")
+
+
+def import_times(statement):
+    """
+    Run a statement in a fresh interpreter with -X importtime.
+
+    Returns:
+        list: (level, name, cumulative seconds) per imported module, in the order they finished
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            times.append((len(match.group(2)) // 2, match.group(3), int(match.group(1)) / 1e6))
+    return times
+
+
+def module_import_times(module):
+    """Cumulative import time of a module and of each module it imports directly"""
+    times = import_times(f"import {module}")
+    children = []
+    for level, name, seconds in times:
+        if level == 0 and name == module:
+            return seconds, children
+        if level == 0:
+            children = []
+        elif level == 1:
+            children.append((name, seconds))
+    raise RuntimeError(f"{module} not found in the import times")
+
+
+def bench_startup(args):
+    """Time importing v13 in fresh interpreters, per module, and the modules it now loads on first use"""
+    totals = []
+    imports = defaultdict(list)
+    for _ in range(args.runs):
+        total, children = module_import_times("v13")
+        totals.append(total)
+        for name, seconds in children:
+            imports[name].append(seconds)
+    print(f"\nimport v13: {min(totals) * 1000:.1f} ms (best of {args.runs}), time of its direct imports:")
+    for name, seconds in sorted(((name, min(times)) for name, times in imports.items()),
+                                key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+    check = "import sys, v13; print(' '.join(m for m in %r if m in sys.modules))" % (DEFERRED_MODULES,)
+    result = subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    loaded = result.stdout.split()
+    assert not loaded, f"Imported at startup: {loaded}"
+
+    print("Deferred until first use:")
+    for module in DEFERRED_MODULES:
+        try:
+            seconds = min(module_import_times(module)[0] for _ in range(args.runs))
+        except RuntimeError:
+            print(f"  {module:<28}  not installed")
+            continue
+        print(f"  {module:<28} {seconds * 1000:8.1f} ms")
+
+
+def directory_size(path):
+    """Total size in bytes of the files in a directory"""
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def scan_json_files(decklists_dir):
+    """The original full scan: json.load every deck file and read the analysed fields"""
+    cards_read = 0
+    for filename in os.listdir(decklists_dir):
+        with open(os.path.join(decklists_dir, filename), 'r') as f:
+            deck_data = json.load(f)
+        for board in ("mainboard", "commanders"):
+            for card_info in deck_data.get(board, {}).values():
+                card = card_info.get('card', {})
+                if card.get('name', ''):
+                    cards_read += 1
+    return cards_read
+
+
+def scan_store(store):
+    """Full scan of the deck store"""
+    return sum(len(mainboard) + len(commanders) for _, mainboard, commanders in store.iter_decks())
+
+
+def bench_store(args):
+    """Compare full-scan reads of per-deck JSON files with the SQLite deck store"""
+    work_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+    decklists_dir = os.path.join(work_dir, "decklists")
+    os.makedirs(decklists_dir)
+
+    try:
+        for i in range(args.decks):
+            with open(os.path.join(decklists_dir, f"deck{i}.json"), "w") as f:
+                json.dump(make_deck(f"deck{i}"), f, indent=2)
+
+        store = v13.DeckStore(os.path.join(work_dir, "decks.sqlite"))
+        start = time.perf_counter()
+        store.import_decklists_dir(decklists_dir)
+        import_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        json_cards = scan_json_files(decklists_dir)
+        json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store_cards = scan_store(store)
+        store_time = time.perf_counter() - start
+        store.close()
+
+        json_size = directory_size(decklists_dir)
+        store_size = os.path.getsize(store.path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(store.path + suffix):
+                store_size += os.path.getsize(store.path + suffix)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    assert json_cards == store_cards, (json_cards, store_cards)
+    print(f"\nFull scan of {args.decks} decks ({store_cards} card entries)")
+    print(f"  JSON files   {json_time:7.2f}s  {json_size / 1e6:8.1f} MB")
+    print(f"  deck store   {store_time:7.2f}s  {store_size / 1e6:8.1f} MB  "
+          f"({json_time / store_time:.0f}x faster, one-time import {import_time:.2f}s)")
+
+
+def synergy_snapshot(results):
+    """Comparable form of analyze_all_decklists() results"""
+    card_frequency, synergy_matrix, cards_per_deck, deck_count = results
+    return (
+        dict(card_frequency),
+        {card: dict(related) for card, related in synergy_matrix.items() if related},
+        sorted(sorted(cards) for cards in cards_per_deck),
+        deck_count
+    )
+
+
+def bench_incremental(args):
+    """Compare a full analysis with an incremental rerun after new decks arrive"""
+    work_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+    state_path = os.path.join(work_dir, "analysis_state.json")
+
+    try:
+        analyzer = v13.MoxfieldAnalyzer(output_dir=work_dir)
+        for i in range(args.decks):
+            analyzer.deck_store.add_deck(f"deck{i}", make_deck(f"deck{i}"), commit=False)
+        analyzer.deck_store.add_deck(f"deck{args.decks}", make_deck(f"deck{args.decks}"))
+
+        start = time.perf_counter()
+        analyzer.analyze_all_decklists()
+        full_time = time.perf_counter() - start
+
+        for i in range(args.decks + 1, args.decks + 1 + args.new_decks):
+            analyzer.deck_store.add_deck(f"deck{i}", make_deck(f"deck{i}"))
+
+        start = time.perf_counter()
+        incremental = synergy_snapshot(analyzer.analyze_all_decklists())
+        incremental_time = time.perf_counter() - start
+
+        # Drop a few decks, then check the folded state against a rebuild from scratch
+        analyzer.deck_store.remove_decks(["deck0", "deck1", "deck2"])
+        after_removal = synergy_snapshot(analyzer.analyze_all_decklists())
+        os.remove(state_path)
+        rebuilt = synergy_snapshot(analyzer.analyze_all_decklists())
+        analyzer.deck_store.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    assert incremental[3] == args.decks + 1 + args.new_decks
+    assert after_removal == rebuilt, "incremental state differs from a full rebuild"
+    print(f"\nAnalysis of {args.decks + 1 + args.new_decks} decks")
+    print(f"  full analysis        {full_time:7.2f}s")
+    print(f"  +{args.new_decks} new decks rerun  {incremental_time:7.2f}s  "
+          f"({full_time / incremental_time:.1f}x faster, results match full rebuild)")
+
+
+def bench_streaming(args):
+    """Peak memory of a full analysis with and without a memory budget for synergy pairs"""
+    work_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+
+    try:
+        analyzer = v13.MoxfieldAnalyzer(output_dir=work_dir)
+        for i in range(args.decks):
+            analyzer.deck_store.add_deck(f"deck{i}", make_deck(f"deck{i}", args.vocabulary), commit=False)
+        analyzer.deck_store.add_deck(f"deck{args.decks}", make_deck(f"deck{args.decks}", args.vocabulary))
+        print(f"\nFull analysis of {args.decks + 1} decks, {args.vocabulary} card vocabulary")
+
+        snapshots = []
+        for label, budget in (("in memory", None), (f"{args.budget_mb} MB budget", args.budget_mb * 1024 * 1024)):
+            # Start from scratch every time
+            for name in ("analysis_state.json", v13.AnalysisState.INDEX_DIR, "synergy_index"):
+                path = os.path.join(work_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+            analyzer.analysis_memory_budget = budget
+            analyzer.synergy_index = None
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = analyzer.analyze_all_decklists()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {label:15s} {elapsed:6.2f}s  peak {peak / 1e6:7.1f} MB")
+            snapshots.append(synergy_snapshot(results))
+            del results
+        analyzer.deck_store.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    assert snapshots[0] == snapshots[1], "spilled analysis differs from the in-memory one"
+
+
+def bench_approximate(args):
+    """Accuracy, time and memory of the MinHash / Count-Min engine against exact counting"""
+    rng = random.Random(0)
+    sample = rng.sample(range(args.decks * 10), args.decks)
+    corpus = v13.DeckCorpus.from_decks([make_deck_cards(i, args.vocabulary) for i in sample])
+    print(f"\n{args.decks} sampled decks, {args.vocabulary} card vocabulary, synergy above {args.threshold}")
+
+    engine = v13.CooccurrenceEngine(corpus)
+    start = time.perf_counter()
+    size, pairs = traced_size(lambda: [block for block in engine.iter_synergy_pairs(args.threshold)])
+    exact_time = time.perf_counter() - start
+    exact = {(card1, card2): score for block in pairs for card1, card2, score in zip(*(a.tolist() for a in block))}
+    print(f"  exact             {exact_time:6.2f}s  {size / 1e6:7.1f} MB  {len(exact)} pairs")
+
+    for num_perm in args.permutations:
+        approximate = v13.ApproximateCooccurrenceEngine(corpus, num_perm=num_perm)
+        start = time.perf_counter()
+        estimates = {(card1, card2): score for block in approximate.iter_synergy_pairs(args.threshold)
+                     for card1, card2, score in zip(*(a.tolist() for a in block))}
+        elapsed = time.perf_counter() - start
+
+        found = exact.keys() & estimates.keys()
+        errors = np.array([abs(estimates[pair] - exact[pair]) for pair in found] or [0.0])
+        precision = len(found) / len(estimates) if estimates else 1.0
+        recall = len(found) / len(exact) if exact else 1.0
+        print(f"  minhash {num_perm:4d}      {elapsed:6.2f}s  {approximate.memory_size() / 1e6:7.1f} MB  "
+              f"{len(estimates)} pairs, precision {precision:.3f}, recall {recall:.3f}, "
+              f"error mean {errors.mean():.4f} max {errors.max():.4f} "
+              f"(expected std at the threshold {np.sqrt(args.threshold * (1 - args.threshold) / num_perm):.4f})")
+
+    # Count-Min pair counts for the exact pairs
+    card1_ids, card2_ids, counts = engine.pair_counts()
+    for epsilon in args.epsilon:
+        approximate = v13.ApproximateCooccurrenceEngine(corpus, epsilon=epsilon)
+        start = time.perf_counter()
+        sketch = approximate.count_min()
+        sketch_time = time.perf_counter() - start
+        overestimate = sketch.query(card1_ids * len(corpus.cards) + card2_ids) - counts
+        assert overestimate.min() >= 0, "Count-Min underestimated a pair count"
+        print(f"  count-min {epsilon:<7g} {sketch_time:6.2f}s  {sketch.nbytes / 1e6:7.1f} MB  "
+              f"overestimate mean {overestimate.mean():.2f} max {overestimate.max()} of {counts.mean():.0f} "
+              f"on average (bound {sketch.error_bound():.0f} with probability {1 - sketch.delta:.2f})")
+
+
+def make_deck_cards(deck_number, vocabulary_size=20000, deck_size=99):
+    """Normalized card names of a fake deck, with the same skew as make_deck()"""
+    rng = random.Random(deck_number)
+    cards = set()
+    while len(cards) < deck_size:
+        cards.add(f"card number {int(vocabulary_size * rng.random() ** 3)}")
+    return cards
+
+
+def legacy_synergy_matrix(cards_per_deck):
+    """The original per-deck pair loop of analyze_all_decklists()"""
+    card_frequency = Counter()
+    synergy_pairs = Counter()
+    for deck_cards in cards_per_deck:
+        card_frequency.update(deck_cards)
+        deck_cards_list = list(deck_cards)
+        for i in range(len(deck_cards_list)):
+            for j in range(i + 1, len(deck_cards_list)):
+                pair = tuple(sorted([deck_cards_list[i], deck_cards_list[j]]))
+                synergy_pairs[pair] += 1
+
+    synergy_matrix = defaultdict(dict)
+    for (card1, card2), count in synergy_pairs.items():
+        total = card_frequency[card1] + card_frequency[card2] - count
+        if total > 0 and count / total > 0.1:
+            synergy_matrix[card1][card2] = count / total
+            synergy_matrix[card2][card1] = count / total
+    return synergy_matrix
+
+
+def bench_cooccurrence(args):
+    """Compare the per-deck pair loop with the sparse co-occurrence engine"""
+    backends = [("numpy fallback", "_numpy_pair_counts")]
+    if v13.sparse.available():
+        backends.insert(0, ("scipy.sparse", "_sparse_pair_counts"))
+
+    for deck_count in args.decks:
+        cards_per_deck = [make_deck_cards(i, args.vocabulary) for i in range(deck_count)]
+        print(f"\n{deck_count} decks, {args.vocabulary} card vocabulary")
+
+        results = []
+        for label, method in backends:
+            start = time.perf_counter()
+            engine = v13.CooccurrenceEngine.from_decks(cards_per_deck)
+            engine.iter_pair_counts = getattr(engine, method)
+            results.append(engine.synergy_matrix())
+            engine_time = time.perf_counter() - start
+            print(f"  {label:15s} {engine_time:7.2f}s")
+
+        if deck_count <= args.legacy_max_decks:
+            start = time.perf_counter()
+            results.append(legacy_synergy_matrix(cards_per_deck))
+            legacy_time = time.perf_counter() - start
+            print(f"  {'pair loop':15s} {legacy_time:7.2f}s")
+        else:
+            print(f"  {'pair loop':15s} skipped (above --legacy-max-decks)")
+
+        expected = {card: dict(related) for card, related in results[0].items()}
+        for result in results[1:]:
+            assert {card: dict(related) for card, related in result.items()} == expected, "synergy mismatch"
+        print(f"  {sum(map(len, expected.values())) // 2} synergy pairs, all backends agree")
+
+
+def bench_parallel(args):
+    """Compare serial and multi-process deck parsing (legacy JSON import and deck extraction)"""
+    results = []
+    for workers in (1, args.workers):
+        work_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+        decklists_dir = os.path.join(work_dir, "decklists")
+        os.makedirs(decklists_dir)
+        try:
+            for i in range(args.decks):
+                with open(os.path.join(decklists_dir, f"deck{i}.json"), "w") as f:
+                    json.dump(make_deck(f"deck{i}"), f)
+
+            analyzer = v13.MoxfieldAnalyzer(output_dir=work_dir)
+            analyzer.analysis_workers = workers
+            analyzer.min_decks_per_worker = 1
+
+            start = time.perf_counter()
+            analyzer.deck_store.import_decklists_dir(decklists_dir, workers=workers)
+            import_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            snapshot = synergy_snapshot(analyzer.analyze_all_decklists())
+            analysis_time = time.perf_counter() - start
+            results.append((snapshot, analyzer.card_types, analyzer.card_mana_costs))
+            analyzer.deck_store.close()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        print(f"  {workers} process(es)  import {import_time:7.2f}s  analysis {analysis_time:7.2f}s")
+
+    assert results[0] == results[1], "parallel results differ from the serial run"
+    print(f"\n{args.decks} decks on {os.cpu_count()} CPUs, serial and parallel results are identical")
+
+
+def bench_decode(args):
+    """Compare JSON decoder backends and schema mode on deck payloads"""
+    payloads = [json.dumps(make_deck(f"deck{i}")).encode() for i in range(args.decks)]
+    print(f"\nDecoding {args.decks} deck payloads ({sum(map(len, payloads)) / 1e6:.1f} MB)")
+
+    baseline = None
+    expected = None
+    for backend in reversed(v13.DeckDecoder.BACKENDS):
+        for schema in (False, True):
+            try:
+                decoder = v13.DeckDecoder(backend, schema)
+            except ValueError:
+                print(f"  {backend:15s} not installed")
+                break
+            if schema and not decoder.schema:
+                continue  # Schema mode needs msgspec
+
+            start = time.perf_counter()
+            boards = [decoder.decode_deck(payload) for payload in payloads]
+            elapsed = time.perf_counter() - start
+
+            # Peak memory while decoding a single payload
+            tracemalloc.start()
+            decoder.decode_deck(payloads[0])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            if expected is None:
+                expected = boards
+            assert boards == expected, f"{backend} decoded different boards"
+            baseline = baseline or elapsed
+            label = f"{backend}{' schema' if schema else ''}"
+            print(f"  {label:15s} {elapsed:7.2f}s  ({baseline / elapsed:4.1f}x)  peak per deck {peak / 1e3:7.1f} KB")
+
+
+def legacy_normalize_card_name(card_name):
+    """The original uncompiled two-regex normalization"""
+    normalized = str(card_name).lower()
+    normalized = re.sub(r'[^a-z0-9\s]', '', normalized)
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    return normalized
+
+
+def bench_normalize(args):
+    """Compare the original card-name normalization with the cached, interning normalizer"""
+    rng = random.Random(0)
+    words = ["Sol", "Ring", "Jötun", "Lim-Dûl's", "Vault", "Æther", "Vial", "Fire", "//", "Ice", "of", "the",
+             "Arcane", "Signet", "Sword", "Fire,", "Borrowing", "100,000", "Arrows", "Gyome,", "Master", "Chef"]
+    vocabulary = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(args.vocabulary)]
+    # Skewed like deck data: a few staples are looked up far more often than the rest
+    lookups = [vocabulary[int(args.vocabulary * rng.random() ** 3)] for _ in range(args.lookups)]
+
+    print(f"\n{args.lookups} lookups over {args.vocabulary} distinct names")
+    normalizers = [
+        ("re.sub per call", legacy_normalize_card_name),
+        ("translate, no cache", v13.CardNameNormalizer()._normalize),
+        ("cached + interned", v13.CardNameNormalizer().normalize),
+    ]
+    expected = None
+    baseline = None
+    for label, normalize in normalizers:
+        start = time.perf_counter()
+        result = [normalize(name) for name in lookups]
+        elapsed = time.perf_counter() - start
+        expected = expected or result
+        assert result == expected, f"{label} normalized differently"
+        baseline = baseline or elapsed
+        print(f"  {label:20s} {elapsed:7.3f}s  ({baseline / elapsed:5.1f}x)")
+
+    # is_card_enabled used to normalize every disabled card on every lookup
+    work_dir = tempfile.mkdtemp(prefix="moxfield_bench_")
+    try:
+        manager = v13.AutoIncludeManager(output_dir=work_dir)
+        manager.disabled_cards["GREEN"] = vocabulary[:args.disabled]
+        manager.save_disabled_cards()
+        checks = lookups[:args.lookups // 100]
+
+        start = time.perf_counter()
+        legacy_result = [
+            all(legacy_normalize_card_name(card) != legacy_normalize_card_name(name)
+                for card in manager.disabled_cards["GREEN"])
+            for name in checks
+        ]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = [manager.is_card_enabled("GREEN", name) for name in checks]
+        new_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    assert result == legacy_result
+    print(f"\n{len(checks)} is_card_enabled checks against {args.disabled} disabled cards")
+    print(f"  {'re.sub per card':20s} {legacy_time:7.3f}s")
+    print(f"  {'cached name sets':20s} {new_time:7.3f}s  ({legacy_time / new_time:5.1f}x)")
+
+
+def traced_size(build):
+    """Memory allocated by build() that is still alive afterwards, and its result"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def bench_memory(args):
+    """Compare the memory of name-set decks with the card ID corpus"""
+    # Names are created (and interned) up front, both layouts share the same string objects
+    decks = [sorted(sys.intern(card) for card in make_deck_cards(i, args.vocabulary)) for i in range(args.decks)]
+    print(f"\n{args.decks} decks, {args.vocabulary} card vocabulary, "
+          f"{sum(map(len, decks)) / args.decks:.0f} cards per deck")
+
+    sets_size, sets = traced_size(lambda: [set(deck) for deck in decks])
+    corpus_size, corpus = traced_size(lambda: v13.DeckCorpus.from_decks(decks))
+    print(f"  cards_per_deck   list of name sets {sets_size / 1e6:7.1f} MB   "
+          f"DeckCorpus {corpus_size / 1e6:6.1f} MB  ({sets_size / corpus_size:.0f}x smaller)")
+
+    def name_state():
+        return {f"deck{i}": list(deck) for i, deck in enumerate(decks)}
+
+    def id_state():
+        state = v13.AnalysisState()
+        for i, deck in enumerate(decks):
+            state.add_deck(f"deck{i}", deck)
+        return state
+
+    names_size, _ = traced_size(name_state)
+    ids_size, state = traced_size(id_state)
+    print(f"  analysis state   name lists        {names_size / 1e6:7.1f} MB   "
+          f"ID arrays   {ids_size / 1e6:6.1f} MB  ({names_size / ids_size:.1f}x smaller)")
+
+    assert sorted(map(sorted, corpus)) == sorted(map(sorted, sets))
+    assert sorted(map(sorted, state.corpus())) == sorted(map(sorted, sets))
+
+
+# Bits set in each byte value, for numpy versions without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Number of set bits in each uint64 word"""
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(words)
+    return _POPCOUNT_TABLE[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1)
+
+
+class DeckBitsetIndex:
+    """
+    Bitset inverted index over a DeckCorpus.
+
+    Row c of bits is a bitset over the decks (64 decks per uint64 word) with bit d set when
+    deck d contains card c. Deck subsets are bitsets of the same shape, so "decks with at least
+    N of these cards" is a few bitwise ops over the rows of the query cards, and "card counts
+    over these decks" is a popcount of every row ANDed with the subset. Takes cards x decks / 8 bytes
+    (about 125 MB for 20k cards and 50k decks), so the analysis uses the CSR scans of DeckCorpus
+    (overlap_counts, card_counts) instead; kept here as a reference for bench_matching.
+    """
+
+    def __init__(self, corpus):
+        """
+        Args:
+            corpus (DeckCorpus): The decks to index
+        """
+        self.deck_count = len(corpus)
+        self.word_count = (self.deck_count + 63) // 64
+        self.bits = np.zeros((len(corpus.cards), self.word_count), dtype=np.uint64)
+
+        decks = np.repeat(np.arange(self.deck_count, dtype=np.uint64), corpus.deck_sizes())
+        np.bitwise_or.at(self.bits, (corpus.indices, decks // 64), np.left_shift(np.uint64(1), decks % 64))
+
+    def all_decks(self):
+        """Bitset of every deck"""
+        decks = np.full(self.word_count, np.iinfo(np.uint64).max, dtype=np.uint64)
+        if self.deck_count % 64:
+            decks[-1] = np.uint64((1 << (self.deck_count % 64)) - 1)
+        return decks
+
+    def decks_with_at_least(self, card_ids, minimum):
+        """
+        Find the decks containing at least minimum of the given cards.
+
+        Args:
+            card_ids (array): Distinct card IDs
+            minimum (int): Number of the cards a deck needs
+
+        Returns:
+            ndarray: Bitset of the matching decks
+        """
+        if minimum <= 0:
+            return self.all_decks()
+
+        # at_least[j] holds the decks containing at least j of the cards seen so far
+        at_least = [self.all_decks()] + [np.zeros(self.word_count, dtype=np.uint64) for _ in range(minimum)]
+        for seen, card_id in enumerate(card_ids):
+            row = self.bits[card_id]
+            for j in range(min(minimum, seen + 1), 0, -1):
+                at_least[j] |= at_least[j - 1] & row
+        return at_least[minimum]
+
+    def count(self, decks):
+        """Number of decks in a bitset"""
+        return int(popcount(decks).sum())
+
+    def deck_mask(self, decks):
+        """Convert a bitset to a boolean mask over the decks"""
+        deck_bytes = decks.astype('<u8', copy=False).view(np.uint8)
+        return np.unpackbits(deck_bytes, bitorder='little')[:self.deck_count].astype(bool)
+
+    def card_counts(self, decks=None, chunk_size=4096):
+        """
+        Count the decks containing each card.
+
+        Args:
+            decks (ndarray): Bitset of the decks to count (all decks if None)
+            chunk_size (int): Cards per step, bounds the temporary AND result
+
+        Returns:
+            ndarray: Number of the decks containing each card, indexed by card ID
+        """
+        counts = np.zeros(len(self.bits), dtype=np.int64)
+        for start in range(0, len(self.bits), chunk_size):
+            rows = self.bits[start:start + chunk_size]
+            if decks is not None:
+                rows = rows & decks
+            counts[start:start + chunk_size] = popcount(rows).sum(axis=1)
+        return counts
+
+
+def bench_matching(args):
+    """Compare the seed-card matching loop with the corpus scan and the bitset index"""
+    cards_per_deck = [make_deck_cards(i, args.vocabulary) for i in range(args.decks)]
+    corpus = v13.DeckCorpus.from_decks(cards_per_deck)
+    # Seeds are a mix of staples and mid-popularity cards, like the owned cards used as seeds
+    frequency = corpus.card_counts()
+    by_frequency = [corpus.cards.names[card_id] for card_id in np.argsort(-frequency, kind='stable')]
+    recommended = by_frequency[:args.seeds // 2] + by_frequency[200:200 + args.seeds - args.seeds // 2]
+    print(f"\n{args.decks} decks, decks with >= {args.minimum} of {len(recommended)} seed cards, "
+          f"then card counts over them ({args.repeat} queries)")
+
+    def legacy():
+        matching_decks = []
+        for deck_cards in cards_per_deck:
+            if len(set(recommended) & deck_cards) >= args.minimum:
+                matching_decks.append(deck_cards)
+        matching_cards = Counter()
+        for deck in matching_decks:
+            for card in deck:
+                if card not in recommended:
+                    matching_cards[card] += 1
+        return len(matching_decks), dict(matching_cards)
+
+    def corpus_scan():
+        seed_ids = corpus.cards.lookup(recommended)
+        matching = corpus.overlap_counts(seed_ids) >= args.minimum
+        counts = corpus.card_counts(matching)
+        counts[seed_ids] = 0
+        return int(matching.sum()), counts
+
+    def bitset():
+        seed_ids = corpus.cards.lookup(recommended)
+        matching = index.decks_with_at_least(seed_ids, args.minimum)
+        counts = index.card_counts(matching)
+        counts[seed_ids] = 0
+        return index.count(matching), counts
+
+    start = time.perf_counter()
+    index = DeckBitsetIndex(corpus)
+    build_time = time.perf_counter() - start
+
+    expected = None
+    baseline = None
+    for label, query in (("set loop", legacy), ("corpus scan", corpus_scan), ("bitset index", bitset)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            deck_count, counts = query()
+        elapsed = (time.perf_counter() - start) / args.repeat
+        if not isinstance(counts, dict):
+            counts = {corpus.cards.names[card_id]: int(counts[card_id]) for card_id in np.flatnonzero(counts)}
+        expected = expected or (deck_count, counts)
+        assert (deck_count, counts) == expected, f"{label} found different decks"
+        baseline = baseline or elapsed
+        print(f"  {label:15s} {elapsed * 1000:8.1f} ms per query  ({baseline / elapsed:5.1f}x)")
+
+    print(f"  {expected[0]} matching decks, bitset index built once in {build_time * 1000:.0f} ms "
+          f"({index.bits.nbytes / 1e6:.1f} MB)")
+
+
+def legacy_candidate_scores(recommended, card_frequency, synergy_matrix, owned_cards, cards_per_deck):
+    """The Counter-based candidate scoring from before CandidateScores, kept as a reference"""
+    candidate_scores = Counter()
+    for card in recommended:
+        if card in synergy_matrix:
+            for related_card, synergy_score in synergy_matrix[card].items():
+                if related_card not in recommended:
+                    candidate_scores[related_card] += synergy_score * 10
+    for card, freq in card_frequency.items():
+        if card not in recommended:
+            normalized_freq = freq / max(card_frequency.values()) if card_frequency else 0
+            candidate_scores[card] += normalized_freq
+            if card in owned_cards:
+                candidate_scores[card] *= 1.5
+    matching_decks = [deck for deck in cards_per_deck if len(set(recommended) & deck) >= 3]
+    matching_cards = Counter()
+    for deck in matching_decks:
+        for card in deck:
+            if card not in recommended:
+                matching_cards[card] += 1
+    for card, count in matching_cards.items():
+        candidate_scores[card] += count / len(matching_decks) * 5
+    return candidate_scores
+
+
+def bench_scoring(args):
+    """Compare the Counter-based candidate scoring with CandidateScores, checking the top cards match"""
+    cards_per_deck = [make_deck_cards(i, args.vocabulary) for i in range(args.decks)]
+    corpus = v13.DeckCorpus.from_decks(cards_per_deck)
+    card_frequency = Counter(corpus.cards.names[card_id] for deck in corpus for card_id in
+                             corpus.cards.lookup(deck).tolist())
+    synergy_matrix = v13.CooccurrenceEngine(corpus).synergy_matrix()
+    by_frequency = [card for card, _ in card_frequency.most_common()]
+    recommended = by_frequency[:args.seeds // 2] + by_frequency[200:200 + args.seeds - args.seeds // 2]
+    owned_cards = set(by_frequency[::3])
+    print(f"\n{args.decks} decks, {len(card_frequency)} cards, {len(recommended)} seed cards, "
+          f"top {args.top} candidates")
+
+    # The legacy loop's max(card_frequency.values()) per card is quadratic, so time it once
+    start = time.perf_counter()
+    legacy = legacy_candidate_scores(recommended, card_frequency, synergy_matrix, owned_cards, cards_per_deck)
+    legacy_time = time.perf_counter() - start
+    expected = [card for card, _ in legacy.most_common(args.top)]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        recommended_ids = corpus.cards.lookup(recommended)
+        matching_decks = corpus.overlap_counts(recommended_ids) >= 3
+        scores = v13.CandidateScores(recommended, card_frequency, synergy_matrix, owned_cards,
+                                     deck_cards=corpus.cards, matching_counts=corpus.card_counts(matching_decks),
+                                     matching_deck_count=int(matching_decks.sum()))
+    elapsed = (time.perf_counter() - start) / args.repeat
+
+    assert scores.top(args.top) == expected, "CandidateScores ranked the top candidates differently"
+    assert scores.top(len(scores)) == [card for card, _ in legacy.most_common()], "Full ranking differs"
+    print(f"  Counter loop      {legacy_time * 1000:8.1f} ms")
+    print(f"  CandidateScores   {elapsed * 1000:8.1f} ms  ({legacy_time / elapsed:5.1f}x)")
+    print(f"  identical top {args.top} over {len(scores)} candidates; best is {scores.top(1)[0]}: "
+          f"{scores.explain(scores.top(1)[0])}")
+
+
+def legacy_synergy_scores(recommended, synergy_matrix):
+    """The double loop over the recommended cards from before DeckSynergy, kept as a reference"""
+    synergy_scores = {}
+    for card1 in recommended:
+        synergy_scores[card1] = 0
+        card_count = 0
+        for card2 in recommended:
+            if card1 != card2:
+                if card1 in synergy_matrix and card2 in synergy_matrix[card1]:
+                    synergy_scores[card1] += synergy_matrix[card1][card2]
+                    card_count += 1
+        if card_count > 0:
+            synergy_scores[card1] /= card_count
+    return synergy_scores
+
+
+def bench_synergy(args):
+    """Compare the in-deck synergy double loop with DeckSynergy, and what-if swaps with a full recompute"""
+    cards_per_deck = [make_deck_cards(i, args.vocabulary) for i in range(args.decks)]
+    corpus = v13.DeckCorpus.from_decks(cards_per_deck)
+    synergy_matrix = v13.CooccurrenceEngine(corpus).synergy_matrix()
+    frequency = corpus.card_counts()
+    by_frequency = [corpus.cards.names[card_id] for card_id in np.argsort(-frequency, kind='stable')]
+    deck = by_frequency[:args.deck_size]
+    bench = by_frequency[args.deck_size:args.deck_size + args.swaps]
+    print(f"\n{args.decks} decks, {args.deck_size} card deck, {args.swaps} what-if swaps")
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = func()
+        return result, (time.perf_counter() - start) / args.repeat
+
+    expected, legacy_time = timed(lambda: legacy_synergy_scores(deck, synergy_matrix))
+    scores, deck_time = timed(lambda: v13.DeckSynergy(deck, synergy_matrix).scores())
+    assert scores == expected, "DeckSynergy scores differ from the double loop"
+    print(f"  double loop       {legacy_time * 1000:8.2f} ms")
+    print(f"  DeckSynergy       {deck_time * 1000:8.2f} ms  ({legacy_time / deck_time:5.1f}x)")
+
+    # Each swap replaces a card with a bench card: recompute the deck or adjust the submatrix
+    deck_synergy = v13.DeckSynergy(deck, synergy_matrix)
+    swaps = [(deck[i % len(deck)], card_in) for i, card_in in enumerate(bench)]
+
+    def recompute():
+        results = []
+        for card_out, card_in in swaps:
+            swapped = [card_in if card == card_out else card for card in deck]
+            results.append(legacy_synergy_scores(swapped, synergy_matrix))
+        return results
+
+    expected, recompute_time = timed(recompute)
+    swapped, swap_time = timed(lambda: [deck_synergy.swap_scores(*swap) for swap in swaps])
+    for new, old in zip(swapped, expected):
+        assert new.keys() == old.keys()
+        assert all(abs(new[card] - old[card]) < 1e-9 for card in old), "Swap scores differ from a recompute"
+    print(f"  recompute deck    {recompute_time * 1000:8.2f} ms for {len(swaps)} swaps")
+    print(f"  swap_scores       {swap_time * 1000:8.2f} ms  ({recompute_time / swap_time:5.1f}x)")
+
+    best = max(swaps, key=lambda swap: deck_synergy.swap_delta(*swap))
+    print(f"  best swap: {best[0]} -> {best[1]} ({deck_synergy.swap_delta(*best):+.3f} total synergy)")
+
+
+def bench_index(args):
+    """Compare the dict-of-dicts synergy matrix with the saved top-k synergy index"""
+    cards_per_deck = [make_deck_cards(i, args.vocabulary) for i in range(args.decks)]
+    engine = v13.CooccurrenceEngine.from_decks(cards_per_deck)
+    print(f"\n{args.decks} decks, {args.vocabulary} card vocabulary, top {args.top_k} neighbours")
+
+    start = time.perf_counter()
+    matrix_size, synergy_matrix = traced_size(engine.synergy_matrix)
+    matrix_time = time.perf_counter() - start
+    start = time.perf_counter()
+    index_size, index = traced_size(lambda: engine.synergy_index(k=args.top_k))
+    index_time = time.perf_counter() - start
+    print(f"  dict of dicts     {matrix_time:6.2f}s  {matrix_size / 1e6:7.1f} MB")
+    print(f"  synergy index     {index_time:6.2f}s  {index_size / 1e6:7.1f} MB in memory")
+
+    temp_dir = tempfile.mkdtemp(prefix="synergy_index_")
+    try:
+        index.save(temp_dir)
+        start = time.perf_counter()
+        loaded = v13.SynergyIndex.load(temp_dir)
+        load_time = time.perf_counter() - start
+        print(f"  load (mmap)       {load_time * 1000:6.1f} ms, {directory_size(temp_dir) / 1e6:.1f} MB on disk")
+
+        cards = [card for card in synergy_matrix][:args.queries]
+        start = time.perf_counter()
+        for card in cards:
+            expected = sorted(synergy_matrix[card].items(), key=lambda item: -item[1])[:10]
+        dict_query = (time.perf_counter() - start) / len(cards)
+        start = time.perf_counter()
+        for card in cards:
+            loaded.most_synergistic(card, 10)
+        index_query = (time.perf_counter() - start) / len(cards)
+        print(f"  top 10 for a card {dict_query * 1e6:6.1f} us sorting a dict row, "
+              f"{index_query * 1e6:.1f} us from the index")
+
+        for card in cards:
+            best = sorted(synergy_matrix[card].items(), key=lambda item: (-item[1], loaded.positions[item[0]]))
+            assert loaded.most_synergistic(card) == best[:args.top_k], f"Neighbours of {card} differ"
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+BENCHMARKS = {
+    "fetch": bench_fetch,
+    "search": bench_search,
+    "throttle": bench_throttle,
+    "store": bench_store,
+    "incremental": bench_incremental,
+    "cooccurrence": bench_cooccurrence,
+    "parallel": bench_parallel,
+    "decode": bench_decode,
+    "normalize": bench_normalize,
+    "memory": bench_memory,
+    "matching": bench_matching,
+    "scoring": bench_scoring,
+    "synergy": bench_synergy,
+    "index": bench_index,
+    "streaming": bench_streaming,
+    "approximate": bench_approximate,
+    "cache": bench_cache,
+    "refresh": bench_refresh,
+    "view": bench_view,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the MTG Deck Analyzer")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="Async deck collection vs thread pool")
+    fetch_parser.add_argument("--decks", type=int, default=500)
+    fetch_parser.add_argument("--latency", type=float, default=0.05)
+    fetch_parser.add_argument("--concurrency", type=int, default=32)
+    fetch_parser.add_argument("--rate", type=float, default=0, help="Requests per second (0 = unlimited)")
+
+    search_parser = subparsers.add_parser("search", help="Pipelined commander search vs sequential pages")
+    search_parser.add_argument("--commanders", type=int, default=5)
+    search_parser.add_argument("--pages", type=int, default=10)
+    search_parser.add_argument("--decks-per-commander", type=int, default=200)
+    search_parser.add_argument("--latency", type=float, default=0.05)
+    search_parser.add_argument("--page-delay", type=float, default=1.0, help="Sleep between pages in the old flow")
+    search_parser.add_argument("--concurrency", type=int, default=32)
+    search_parser.add_argument("--rate", type=float, default=0, help="Requests per second (0 = unlimited)")
+
+    throttle_parser = subparsers.add_parser("throttle", help="Adaptive limiter against a throttling server")
+    throttle_parser.add_argument("--commanders", type=int, default=3)
+    throttle_parser.add_argument("--pages", type=int, default=5)
+    throttle_parser.add_argument("--decks-per-commander", type=int, default=150)
+    throttle_parser.add_argument("--latency", type=float, default=0.02)
+    throttle_parser.add_argument("--server-rate", type=int, default=40, help="Requests per second the server allows")
+    throttle_parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of random 503 responses")
+    throttle_parser.add_argument("--concurrency", type=int, default=16)
+    throttle_parser.add_argument("--rate", type=float, default=100, help="Starting requests per second")
+
+    store_parser = subparsers.add_parser("store", help="Deck store full scan vs JSON files")
+    store_parser.add_argument("--decks", type=int, default=2000)
+
+    incremental_parser = subparsers.add_parser("incremental", help="Incremental analysis rerun vs full analysis")
+    incremental_parser.add_argument("--decks", type=int, default=2000)
+    incremental_parser.add_argument("--new-decks", type=int, default=50)
+
+    cooccurrence_parser = subparsers.add_parser("cooccurrence", help="Sparse synergy engine vs pair loop")
+    cooccurrence_parser.add_argument("--decks", type=int, nargs="+", default=[1000, 10000, 50000])
+    cooccurrence_parser.add_argument("--vocabulary", type=int, default=20000)
+    cooccurrence_parser.add_argument("--legacy-max-decks", type=int, default=10000,
+                                     help="Largest deck count to run the slow pair loop on")
+
+    parallel_parser = subparsers.add_parser("parallel", help="Multi-process deck parsing vs serial")
+    parallel_parser.add_argument("--decks", type=int, default=20000)
+    parallel_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    decode_parser = subparsers.add_parser("decode", help="JSON decoder backends and schema mode")
+    decode_parser.add_argument("--decks", type=int, default=2000)
+
+    normalize_parser = subparsers.add_parser("normalize", help="Card-name normalization micro-benchmark")
+    normalize_parser.add_argument("--lookups", type=int, default=1000000)
+    normalize_parser.add_argument("--vocabulary", type=int, default=5000)
+    normalize_parser.add_argument("--disabled", type=int, default=50, help="Disabled auto-include cards")
+
+    memory_parser = subparsers.add_parser("memory", help="Memory of name-set decks vs the card ID corpus")
+    memory_parser.add_argument("--decks", type=int, default=10000)
+    memory_parser.add_argument("--vocabulary", type=int, default=20000)
+
+    matching_parser = subparsers.add_parser("matching", help="Seed-card matching decks: set loop vs bitset index")
+    matching_parser.add_argument("--decks", type=int, default=10000)
+    matching_parser.add_argument("--vocabulary", type=int, default=20000)
+    matching_parser.add_argument("--seeds", type=int, default=13)
+    matching_parser.add_argument("--minimum", type=int, default=3)
+    matching_parser.add_argument("--repeat", type=int, default=5)
+
+    scoring_parser = subparsers.add_parser("scoring", help="Candidate scoring: Counter loop vs CandidateScores")
+    scoring_parser.add_argument("--decks", type=int, default=5000)
+    scoring_parser.add_argument("--vocabulary", type=int, default=2000)
+    scoring_parser.add_argument("--seeds", type=int, default=13)
+    scoring_parser.add_argument("--top", type=int, default=150)
+    scoring_parser.add_argument("--repeat", type=int, default=5)
+
+    synergy_parser = subparsers.add_parser("synergy", help="In-deck synergy: double loop vs DeckSynergy")
+    synergy_parser.add_argument("--decks", type=int, default=5000)
+    synergy_parser.add_argument("--vocabulary", type=int, default=2000)
+    synergy_parser.add_argument("--deck-size", type=int, default=150)
+    synergy_parser.add_argument("--swaps", type=int, default=50)
+    synergy_parser.add_argument("--repeat", type=int, default=3)
+
+    index_parser = subparsers.add_parser("index", help="Synergy dict of dicts vs the saved top-k index")
+    index_parser.add_argument("--decks", type=int, default=5000)
+    index_parser.add_argument("--vocabulary", type=int, default=300)
+    index_parser.add_argument("--top-k", type=int, default=100)
+    index_parser.add_argument("--queries", type=int, default=200)
+
+    streaming_parser = subparsers.add_parser("streaming", help="Analysis peak memory with a spill budget")
+    streaming_parser.add_argument("--decks", type=int, default=5000)
+    streaming_parser.add_argument("--vocabulary", type=int, default=2000)
+    streaming_parser.add_argument("--budget-mb", type=int, default=1)
+
+    approximate_parser = subparsers.add_parser("approximate", help="MinHash / Count-Min synergy vs exact counting")
+    approximate_parser.add_argument("--decks", type=int, default=5000)
+    approximate_parser.add_argument("--vocabulary", type=int, default=300)
+    approximate_parser.add_argument("--threshold", type=float, default=0.1)
+    approximate_parser.add_argument("--permutations", type=int, nargs="+", default=[32, 128, 512])
+    approximate_parser.add_argument("--epsilon", type=float, nargs="+", default=[1e-3, 1e-5])
+
+    cache_parser = subparsers.add_parser("cache", help="Shared deck cache across overlapping analyses")
+    cache_parser.add_argument("--commanders", type=int, default=4)
+    cache_parser.add_argument("--analysis-size", type=int, default=2, help="Commanders per analysis")
+    cache_parser.add_argument("--overlap", type=int, default=1, help="Commanders shared by consecutive analyses")
+    cache_parser.add_argument("--pages", type=int, default=5)
+    cache_parser.add_argument("--decks-per-commander", type=int, default=200)
+    cache_parser.add_argument("--latency", type=float, default=0.05)
+    cache_parser.add_argument("--concurrency", type=int, default=16)
+
+    refresh_parser = subparsers.add_parser("refresh", help="Conditional re-fetch of changed decks vs re-scrape")
+    refresh_parser.add_argument("--commanders", type=int, default=3)
+    refresh_parser.add_argument("--pages", type=int, default=5)
+    refresh_parser.add_argument("--decks-per-commander", type=int, default=200)
+    refresh_parser.add_argument("--changed", type=float, default=0.1, help="Fraction of decks edited on the server")
+    refresh_parser.add_argument("--latency", type=float, default=0.05)
+    refresh_parser.add_argument("--concurrency", type=int, default=16)
+    refresh_parser.add_argument("--rate", type=float, default=50, help="Starting requests per second")
+
+    view_parser = subparsers.add_parser("view", help="Results view rows: iterrows vs ResultsViewModel")
+    view_parser.add_argument("--cards", type=int, default=20000)
+
+    startup_parser = subparsers.add_parser("startup", help="Import cost of v13 and its modules at startup")
+    startup_parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    startup_parser.add_argument("--top", type=int, default=12, help="Imports of v13 to list")
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
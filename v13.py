@@ -1,44 +1,105 @@
-import cloudscraper
+import asyncio
 import json
 import time
 import os
 import csv
-import pandas as pd
 import re
 import datetime
+import random
+import email.utils
+import functools
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
 from tkinter.font import Font
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from collections import defaultdict, Counter
+import queue
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import pathlib
+import shutil
+import tempfile
+from collections import defaultdict, Counter, deque
 import sys
 import hashlib
+import importlib
+import sqlite3
+from array import array
+from typing import Dict, List, Optional
 
-# Add debug print statements
-print("Script started")
-print(f"Python version: {sys.version}")
-print(f"Current working directory: {os.getcwd()}")
 
-# Check if matplotlib is available
-try:
-    import matplotlib.pyplot as plt
-    import numpy as np
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+class LazyModule:
+    """
+    Module imported on first attribute access.
+
+    numpy, pandas, cloudscraper and scipy.sparse take most of the import time of this script
+    but are only needed once an analysis runs or a CSV file is loaded, so they are bound to
+    LazyModule proxies and the window comes up without them. Attributes read through a proxy
+    are kept on it, so later reads (np.zeros in a loop) cost a plain attribute lookup.
+
+    The proxy's own methods start with an underscore, except available(), so they don't hide
+    module attributes such as np.load.
+    """
+
+    def __init__(self, name, optional=False):
+        """
+        Args:
+            name (str): Module to import, e.g. "scipy.sparse"
+            optional (bool): A missing module makes available() return False instead of raising
+        """
+        self._name = name
+        self._optional = optional
+        self._module = None
+
+    def _load(self):
+        """Import the module (once) and return it"""
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def available(self):
+        """Import the module if needed, False if it is optional and not installed"""
+        try:
+            self._load()
+        except ImportError:
+            if not self._optional:
+                raise
+            return False
+        return True
+
+    def __getattr__(self, attribute):
+        if attribute in ('_name', '_optional', '_module'):
+            # Not set yet (e.g. on a copy made without __init__)
+            raise AttributeError(attribute)
+        value = getattr(self._load(), attribute)
+        self.__dict__[attribute] = value
+        return value
+
+    def __repr__(self):
+        state = "not loaded" if self._module is None else "loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
 
-    print("Matplotlib imported successfully")
-except ImportError as e:
-    print(f"Error importing matplotlib: {e}")
 
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+cloudscraper = LazyModule("cloudscraper")
+requests = LazyModule("requests")  # Loaded with cloudscraper, only its exception classes are used
 
-    # Create a fallback for the visualizer
-    class FigureCanvasTkAgg:
-        def __init__(self, fig, master):
-            self.master = master
+# scipy is optional, co-occurrence counting falls back to plain numpy without it
+sparse = LazyModule("scipy.sparse", optional=True)
 
-        def get_tk_widget(self):
-            label = tk.Label(self.master, text="Matplotlib not available. Install with: pip install matplotlib")
-            return label
+# Fast JSON decoders are optional, DeckDecoder falls back to the stdlib json module without them
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # Simple class for handling card visualization without matplotlib dependency
@@ -238,6 +299,290 @@ class SimpleCardVisualizer:
         return mana_cost
 
 
+# Log records shown in the GUI log widget
+class GuiLogSink:
+    """
+    Thread-safe, batched log pipeline from any thread to the log text widget.
+
+    log() only formats a record, prints it and puts it on a queue, so worker threads never
+    touch Tk. The Tk main loop drains the queue on an `after` tick and inserts each batch
+    with a single text insert, keeping at most max_lines lines of scrollback. Records below
+    the display level are left out of the widget; every record also goes to the optional
+    rotating log file.
+    """
+
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+    def __init__(self, root, level="INFO", max_lines=5000, interval_ms=100, batch_size=1000,
+                 log_file=None, max_file_bytes=5 * 1024 * 1024, backup_count=3):
+        """
+        Args:
+            root (tk.Tk): The Tk root whose main loop drains the queue
+            level (str): Lowest level shown in the widget (one of LEVELS)
+            max_lines (int): Lines of scrollback kept in the widget, older lines are dropped
+            interval_ms (int): Milliseconds between drains while the queue is empty
+            batch_size (int): Most records inserted per drain, so a flood can't freeze the UI
+            log_file (str): Path of a rotating log file (None = no log file)
+            max_file_bytes (int): Size at which the log file is rotated
+            backup_count (int): Number of rotated log files kept
+        """
+        self.root = root
+        self.widget = None
+        self.level = self.LEVELS.get(level, self.LEVELS["INFO"])
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.batch_size = batch_size
+        self.records = queue.SimpleQueue()  # (level number, message, formatted line)
+
+        self.file_handler = None
+        if log_file:
+            self.file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_file_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+            )
+
+        self.root.after(self.interval_ms, self._drain)
+
+    def attach(self, widget):
+        """Set the text widget records are shown in"""
+        self.widget = widget
+
+    def set_level(self, level):
+        """Show only records at or above level in the widget from now on"""
+        self.level = self.LEVELS.get(level, self.level)
+
+    def log(self, message, level="INFO"):
+        """Log a message to the console and queue it for the widget and log file (any thread)"""
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        line = f"[{timestamp}] {level}: {message}"
+
+        # Always print to console
+        print(line)
+        self.records.put((self.LEVELS.get(level, self.LEVELS["INFO"]), message, line))
+
+    def _drain(self):
+        """Show a batch of queued records (Tk main loop only)"""
+        try:
+            self.flush(self.batch_size)
+        finally:
+            # Come back right away while a backlog is left, otherwise on the next tick
+            self.root.after(1 if not self.records.empty() else self.interval_ms, self._drain)
+
+    def flush(self, limit=None):
+        """Write up to limit queued records (all if None) to the widget and log file"""
+        batch = []
+        while limit is None or len(batch) < limit:
+            try:
+                batch.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+
+        if self.file_handler is not None:
+            for levelno, _, line in batch:
+                self.file_handler.emit(logging.makeLogRecord({'msg': line, 'levelno': levelno}))
+
+        shown = [message for levelno, message, _ in batch if levelno >= self.level]
+        if self.widget is None or not shown:
+            return
+        self.widget.insert(tk.END, "\n".join(shown) + "\n")
+
+        # Drop the oldest lines past the scrollback limit
+        excess = int(self.widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.widget.delete("1.0", f"{excess + 1}.0")
+        self.widget.see(tk.END)
+
+    def close(self):
+        """Write out the queued records and close the log file"""
+        self.flush()
+        if self.file_handler is not None:
+            self.file_handler.close()
+
+
+# Mana color cells of the results view, in column order
+MANA_COLORS = (("W", "white"), ("U", "blue"), ("B", "black"), ("R", "red"), ("G", "green"))
+MANA_CELL_SIZE = 16  # Pixels per mana color cell, fits the default Treeview row height
+MANA_COLORLESS = 1 << len(MANA_COLORS)  # Color key of colorless mana costs
+
+
+class ResultsViewModel:
+    """
+    Display model of the results view, built from a report DataFrame with column operations.
+
+    Holds every row's Treeview values, highlight tags and mana color key, and the current
+    row order. Sorting reorders the rows by sort keys derived once per column, so the view
+    never reads cell values back from the Treeview. Rows are identified by their position
+    in the DataFrame, which is also their Treeview item ID.
+
+    query() combines a multi-key sort with the results tab filters (name search, card type,
+    owned, auto-include and mana colors), which are evaluated as masks over column arrays.
+    """
+
+    COLUMNS = ("Rank", "Card Name", "Frequency", "Card Type", "Synergy Score", "Owned", "Quantity", "Auto-Include")
+    NUMERIC_COLUMNS = {"Rank", "Frequency", "Synergy Score", "Quantity"}
+
+    def __init__(self, df, freq_col):
+        """
+        Args:
+            df (DataFrame): The all cards or recommended decklist report
+            freq_col (str): Report column shown as Frequency ('Deck Count' or 'Frequency')
+        """
+        def column(name, default):
+            if name in df.columns:
+                return df[name]
+            return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+        is_auto_include = column('Auto-Include', False).fillna(False).astype(bool).to_numpy()
+        is_owned = column('Owned', False).fillna(False).astype(bool).to_numpy()
+        rank = column('Rank', '')
+        card_type = column('Card Type', 'Unknown')
+
+        self.columns = {
+            "Rank": rank.tolist(),
+            "Card Name": column('Card Name', '').tolist(),
+            "Frequency": column(freq_col, 0).tolist(),
+            "Card Type": card_type.tolist(),
+            "Synergy Score": column('Synergy Score', '').tolist(),
+            "Owned": np.where(is_owned, "Yes", "No").tolist(),
+            "Quantity": column('Quantity Owned', 0).tolist(),
+            "Auto-Include": np.where(is_auto_include, "Yes", "No").tolist(),
+        }
+        self.values = list(zip(*(self.columns[name] for name in self.COLUMNS)))
+
+        # Auto-includes are yellow, owned cards blue, and ranks 101-150 (extended) orange over both
+        rank_number = pd.to_numeric(rank, errors='coerce').to_numpy(dtype=float)
+        is_extended = (rank_number >= 101) & (rank_number <= 150)
+        tags = np.where(is_extended, 'extended', np.where(is_auto_include, 'auto_include',
+                                                          np.where(is_owned, 'owned', '')))
+        self.tags = [(tag,) if tag else () for tag in tags.tolist()]
+
+        # Bit i is set if the mana cost has MANA_COLORS[i], bit 5 for colorless costs (see mana_color_image)
+        mana_cost = column('Mana Cost', '').fillna('').astype(str)
+        color_keys = np.zeros(len(df), dtype=np.int64)
+        for bit, (symbol, _) in enumerate(MANA_COLORS):
+            color_keys |= mana_cost.str.contains(f"{{{symbol}}}", regex=False).to_numpy(dtype=bool).astype(np.int64) << bit
+        color_keys[(color_keys == 0) & (mana_cost != '').to_numpy()] = MANA_COLORLESS
+        self.color_keys = color_keys.tolist()
+
+        # Filter columns
+        self.is_owned = is_owned
+        self.is_auto_include = is_auto_include
+        self.card_types = card_type.astype(str).to_numpy()
+        self.color_key_array = color_keys
+        self.search_names = [str(name).lower() for name in self.columns["Card Name"]]
+
+        self.order = list(range(len(df)))  # Row positions in display order
+        self.sorted_by = None  # Sort keys self.order was last sorted by with sort_by()
+        self._sort_keys = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def sort_keys(self, column):
+        """Sort key of every row for a column: a number for numeric columns, else lowercase text"""
+        keys = self._sort_keys.get(column)
+        if keys is None:
+            if column in self.NUMERIC_COLUMNS:
+                keys = [self.to_number(value) for value in self.columns[column]]
+            else:
+                keys = [str(value).lower() for value in self.columns[column]]
+            self._sort_keys[column] = keys
+        return keys
+
+    @staticmethod
+    def to_number(value):
+        """Numeric sort key of a cell, empty or non-numeric cells sort as 0"""
+        try:
+            return float(value) if value != '' else 0
+        except (TypeError, ValueError):
+            return 0
+
+    def sort(self, column, ascending=True):
+        """
+        Sort the rows by a column. The sort is stable, rows with equal keys keep their previous order.
+
+        Returns:
+            list: Row positions in the new display order
+        """
+        keys = self.sort_keys(column)
+        self.order = sorted(self.order, key=keys.__getitem__, reverse=not ascending)
+        self.sorted_by = None
+        return self.order
+
+    def sort_by(self, sort_keys):
+        """
+        Sort the rows by several columns, starting from the DataFrame order.
+
+        Args:
+            sort_keys (list): (column, ascending) pairs, most significant first
+
+        Returns:
+            list: Row positions in the new display order
+        """
+        sort_keys = tuple(sort_keys)
+        if sort_keys != self.sorted_by:
+            order = list(range(len(self)))
+            # Stable sorts from the least significant key up leave ties ordered by the next key
+            for column, ascending in reversed(sort_keys):
+                order.sort(key=self.sort_keys(column).__getitem__, reverse=not ascending)
+            self.order = order
+            self.sorted_by = sort_keys
+        return self.order
+
+    def card_type_names(self):
+        """Distinct card types, for the type filter"""
+        return sorted(set(self.card_types.tolist()))
+
+    def filter_mask(self, name='', card_type=None, owned=None, auto_include=None, colors=''):
+        """
+        Boolean mask of the rows that pass every filter.
+
+        Args:
+            name (str): Case-insensitive substring of the card name ('' = any name)
+            card_type (str): Exact card type (None = any type)
+            owned (bool): Only owned (True) or only unowned (False) cards (None = both)
+            auto_include (bool): Only auto-includes (True) or only other cards (False) (None = both)
+            colors (str): Mana symbols from "WUBRG", plus "C" for colorless; cards with any of
+                          them pass ('' = any colors)
+
+        Returns:
+            ndarray: One bool per row
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if owned is not None:
+            mask &= self.is_owned == owned
+        if auto_include is not None:
+            mask &= self.is_auto_include == auto_include
+        if card_type is not None:
+            mask &= self.card_types == card_type
+        if colors:
+            bits = 0
+            for bit, (symbol, _) in enumerate(MANA_COLORS):
+                if symbol in colors:
+                    bits |= 1 << bit
+            color_mask = (self.color_key_array & bits) != 0
+            if "C" in colors:
+                color_mask |= self.color_key_array == MANA_COLORLESS
+            mask &= color_mask
+        name = name.lower()
+        if name:
+            mask &= np.fromiter((name in card_name for card_name in self.search_names), dtype=bool,
+                                count=len(self))
+        return mask
+
+    def query(self, sort_keys=(), **filters):
+        """
+        Rows to show for a sort and a set of filters (see sort_by and filter_mask).
+
+        Returns:
+            list: Row positions of the rows that pass the filters, in display order
+        """
+        order = self.sort_by(sort_keys) if sort_keys else self.order
+        mask = self.filter_mask(**filters).tolist()
+        return [row for row in order if mask[row]]
+
+
 # Main application class
 class MoxfieldAnalyzerApp:
     def __init__(self, root):
@@ -250,10 +595,17 @@ class MoxfieldAnalyzerApp:
         # Enable debug mode
         self.debug_mode = True
 
+        # Log records from the analysis thread are shown by the Tk main loop in batches
+        self.log_file = None  # Path of a rotating log file, e.g. "moxfield_analyzer.log" (None = no file)
+        self.log_sink = GuiLogSink(root, level="DEBUG" if self.debug_mode else "INFO", log_file=self.log_file)
+
         print("Initializing analyzer app")
 
+        # HTTP session pool shared by every analysis run in this process
+        self.session_pool = ScraperSessionPool(size=16)
+
         # Initialize analyzer
-        self.analyzer = MoxfieldAnalyzer()
+        self.analyzer = MoxfieldAnalyzer(session_pool=self.session_pool)
 
         # Initialize visualizer
         self.visualizer = None
@@ -267,11 +619,14 @@ class MoxfieldAnalyzerApp:
         self.auto_include_list = None
         self.color_vars = {}
         self.log_text = None
-        self.mana_color_frames = []  # Add this line to store color frames
+        self.mana_color_images = {}  # color key -> PhotoImage of a row's mana color cells
+        self.results_model = None  # ResultsViewModel of the results view
+        self.results_populate_job = 0  # Incremented to abandon a chunked treeview insertion
+        self.results_populated = False  # Every row of results_model is in the treeview
 
         # Initialize sort variables
-        self.sort_column = "Rank"  # Default sort column
-        self.sort_ascending = False  # Default sort direction
+        self.sort_keys = [("Rank", True)]  # (column, ascending) of the results sort, most significant first
+        self.max_sort_keys = 3  # Earlier sort columns kept as tie-breakers
 
         # Set up the GUI elements
         self.setup_ui()
@@ -281,7 +636,8 @@ class MoxfieldAnalyzerApp:
         self.root.attributes('-topmost', True)
         self.root.after_idle(self.root.attributes, '-topmost', False)
 
-        print("App initialization complete")
+        self.debug(f"Python version: {sys.version}")
+        self.debug(f"Current working directory: {os.getcwd()}")
 
     def process_mana_symbols(self, mana_cost):
         """Convert mana symbols to formatted text for display"""
@@ -865,6 +1221,17 @@ class MoxfieldAnalyzerApp:
 
         self.log_text = scrolledtext.ScrolledText(log_frame, height=15)  # Increased height to show more lines
         self.log_text.grid(row=0, column=0, sticky="nsew", padx=10, pady=5)
+        self.log_sink.attach(self.log_text)
+
+        # Lowest level of the messages shown in the log
+        level_frame = tk.Frame(log_frame, bg="#f0f0f0")
+        level_frame.grid(row=1, column=0, sticky="e", padx=10)
+        tk.Label(level_frame, text="Show:", bg="#f0f0f0").pack(side="left")
+        self.log_level_var = tk.StringVar(value="DEBUG" if self.debug_mode else "INFO")
+        level_combo = ttk.Combobox(level_frame, textvariable=self.log_level_var, values=list(GuiLogSink.LEVELS),
+                                   state="readonly", width=10)
+        level_combo.pack(side="left", padx=5)
+        level_combo.bind("<<ComboboxSelected>>", lambda e: self.log_sink.set_level(self.log_level_var.get()))
 
     def on_frame_configure(self, event):
         """Reset the scroll region to encompass the inner frame"""
@@ -1057,18 +1424,8 @@ class MoxfieldAnalyzerApp:
             self.csv_path_var.set(filename)
 
     def log(self, message, level="INFO"):
-        """Log a message to both console and GUI"""
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        log_message = f"[{timestamp}] {level}: {message}"
-
-        # Always print to console
-        print(log_message)
-
-        # Update GUI if available
-        if self.log_text:
-            self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
-            self.root.update_idletasks()
+        """Log a message to both console and GUI, safe to call from any thread (see GuiLogSink)"""
+        self.log_sink.log(message, level)
 
     def debug(self, message):
         """Log a debug message (only if debug mode is enabled)"""
@@ -1087,15 +1444,15 @@ class MoxfieldAnalyzerApp:
         self.log("Starting analysis...")
 
         if not csv_path:
-            self.log("Error: Please select a card collection CSV file.")
+            self.log("Error: Please select a card collection CSV file.", level="ERROR")
             return
 
         if not os.path.exists(csv_path):
-            self.log(f"Error: CSV file not found at {csv_path}")
+            self.log(f"Error: CSV file not found at {csv_path}", level="ERROR")
             return
 
         if not colors:
-            self.log("Error: Please select at least one commander color.")
+            self.log("Error: Please select at least one commander color.", level="ERROR")
             return
 
         commander_ids = [cmd_id.strip() for cmd_id in commander_ids_str.split(",")]
@@ -1111,7 +1468,7 @@ class MoxfieldAnalyzerApp:
             commander_hash = hashlib.md5('_'.join(sorted(commander_ids)).encode()).hexdigest()[:6]
             output_dir_name = f"{output_dir_name}_{commander_hash}"
 
-        self.analyzer = MoxfieldAnalyzer(output_dir=output_dir_name)
+        self.analyzer = MoxfieldAnalyzer(output_dir=output_dir_name, session_pool=self.session_pool)
         self.log(f"Using output directory: {output_dir_name}")
 
         # IMPORTANT: Set the auto_include_manager to the instance we've been using in the UI
@@ -1178,7 +1535,8 @@ class MoxfieldAnalyzerApp:
             self.log(f"Loaded {cards_loaded} unique cards from your collection")
             self.progress_var.set(10)
 
-            all_public_ids = []
+            # Restart the periodic rate limiter reports for this run
+            self.last_limiter_report = -1
 
             # Create a cache filename that includes the commander IDs to avoid using wrong deck IDs
             commander_ids_hash = hashlib.md5('_'.join(sorted(commander_ids)).encode()).hexdigest()[:8]
@@ -1198,40 +1556,60 @@ class MoxfieldAnalyzerApp:
                     self.log(
                         f"Cleared previous decklists to ensure fresh analysis for commanders: {', '.join(commander_ids)}")
 
+                # Clear the deck store as well, decks still in the shared deck cache are restored without a download
+                self.analyzer.deck_store.clear()
+
                 # Reset the collected decks tracker
                 self.analyzer.collected_decks = set()
 
+            # Saved search results older than the refresh policy are searched again, only decks that
+            # are new or changed since they were collected are downloaded
+            refresh_search = self.analyzer.search_is_stale(ids_file)
+
             # Check if we already have stored IDs
-            if os.path.exists(ids_file):
+            if os.path.exists(ids_file) and not refresh_search:
                 with open(ids_file, "r") as f:
                     all_public_ids = json.load(f)
                 self.log(f"Loaded {len(all_public_ids)} existing deck IDs for commanders: {', '.join(commander_ids)}")
+
+                # Collect all decklists
+                self.log("Collecting decklists (this may take a while)...")
+                self.progress_var.set(30)
+                successful = self.analyzer.collect_decklists_parallel(
+                    all_public_ids,
+                    max_workers=5,
+                    progress_callback=self.update_collection_progress
+                )
             else:
-                # Collect deck IDs for each commander
+                if refresh_search:
+                    self.log(f"Deck search results are older than {self.analyzer.search_refresh_days} days, "
+                             f"searching again")
+
+                # Search all commanders concurrently and download decks as they are found
                 self.log(f"Will scrape up to {page_limit} pages per commander ({page_limit * 64} decks per commander)")
-                for i, commander_id in enumerate(commander_ids):
-                    self.log(f"Searching for decks with commander ID: {commander_id}...")
-                    public_ids = self.analyzer.search_decks_by_commander(commander_id, page_limit=page_limit)
-                    all_public_ids.extend(public_ids)
-                    progress = 10 + (i + 1) * 20 / len(commander_ids)
-                    self.progress_var.set(progress)
-
-                # Remove duplicates
-                all_public_ids = list(set(all_public_ids))
+                self.log("Searching and collecting decklists (this may take a while)...")
+                self.progress_var.set(30)
+                all_public_ids, successful = self.analyzer.search_and_collect_decklists(
+                    commander_ids,
+                    page_limit=page_limit,
+                    progress_callback=self.update_collection_progress
+                )
                 self.log(f"Total unique decks found: {len(all_public_ids)}")
 
+                # Decks that dropped out of the search results no longer belong in the analysis
+                if refresh_search and all_public_ids:
+                    found_ids = set(all_public_ids)
+                    dropped = self.analyzer.drop_decks([pid for pid in self.analyzer.collected_decks
+                                                        if pid not in found_ids])
+                    self.log(f"Removed {dropped} decks that are no longer in the search results")
+
                 # Save all public IDs
                 with open(ids_file, "w") as f:
                     json.dump(all_public_ids, f, indent=2)
 
-            # Collect all decklists
-            self.log("Collecting decklists (this may take a while)...")
-            successful = self.analyzer.collect_decklists_parallel(
-                all_public_ids,
-                max_workers=5,
-                progress_callback=self.update_progress
-            )
             self.log(f"Successfully collected {successful} new decklists")
+            self.log(f"Rate limiter: {self.analyzer.get_rate_limiter().describe()}")
+            self.log(f"Deck cache: {self.analyzer.deck_cache.describe()}")
             self.progress_var.set(70)
 
             # Analyze the collected data
@@ -1246,6 +1624,8 @@ class MoxfieldAnalyzerApp:
             self.recommended_df = self.analyzer.generate_recommended_decklist(
                 card_frequency, synergy_matrix, cards_per_deck, colors=colors
             )
+            # The reports hold everything the UI shows, don't keep the decks and synergy data alive with them
+            del synergy_matrix, cards_per_deck
             self.progress_var.set(100)
 
             self.log(f"Generated a recommended deck with {len(self.recommended_df)} cards")
@@ -1269,8 +1649,8 @@ class MoxfieldAnalyzerApp:
 
         except Exception as e:
             import traceback
-            self.log(f"Error during analysis: {str(e)}")
-            self.log(traceback.format_exc())
+            self.log(f"Error during analysis: {str(e)}", level="ERROR")
+            self.log(traceback.format_exc(), level="ERROR")
             self.root.after(0, lambda: self.run_button.config(state="normal"))
 
     def update_progress(self, value):
@@ -1278,10 +1658,20 @@ class MoxfieldAnalyzerApp:
         scaled = 30 + (value * 40 / 100)
         self.progress_var.set(scaled)
 
+    def update_collection_progress(self, value):
+        """Update progress during collection and report the rate limiter every 10%"""
+        self.update_progress(value)
+
+        report_step = int(value // 10)
+        if report_step > getattr(self, 'last_limiter_report', -1):
+            self.last_limiter_report = report_step
+            self.log(f"Collection {value:.0f}% - rate limiter: {self.analyzer.get_rate_limiter().describe()}")
+
     def update_results_view(self):
-        # Clear existing data
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        # Clear existing data, and stop inserting the rows of the previous view
+        self.results_populate_job += 1
+        self.results_populated = False
+        self.results_tree.delete(*self.results_tree.get_children())
 
         # Check which view is selected
         view_type = self.view_type_var.get()
@@ -1301,82 +1691,108 @@ class MoxfieldAnalyzerApp:
             df = self.recommended_df
             freq_col = 'Frequency'
         else:
+            self.results_model = None
             return
 
-        # Clear any existing color frames
-        if hasattr(self, 'mana_color_frames'):
-            for frame in self.mana_color_frames:
-                if frame and frame.winfo_exists():
-                    frame.destroy()
-        self.mana_color_frames = []
+        # Values, tags and mana colors of every row are computed column by column
+        self.results_model = ResultsViewModel(df, freq_col)
+        self.results_populated = False  # The tree still holds the rows of the previous model
 
-        # Insert data into treeview and create custom color grid
-        for _, row in df.iterrows():
-            is_auto_include = row.get('Auto-Include', False)
-            is_owned = row.get('Owned', False)
+        # Card types of this view for the type filter
+        type_names = ["All"] + self.results_model.card_type_names()
+        self.filter_type_combo["values"] = type_names
+        if self.filter_type_var.get() not in type_names:
+            self.filter_type_var.set("All")
 
-            # Parse mana cost to check for each color
-            mana_cost = row.get('Mana Cost', '')
-            has_white = '{W}' in mana_cost
-            has_blue = '{U}' in mana_cost
-            has_black = '{B}' in mana_cost
-            has_red = '{R}' in mana_cost
-            has_green = '{G}' in mana_cost
-            has_colors = has_white or has_blue or has_black or has_red or has_green
-
-            # Create values array (we'll use empty text in mana columns)
-            values = (
-                row.get('Rank', ''),
-                row.get('Card Name', ''),
-                "",  # White - Empty because we'll overlay a colored frame
-                "",  # Blue - Empty because we'll overlay a colored frame
-                "",  # Black - Empty because we'll overlay a colored frame
-                "",  # Red - Empty because we'll overlay a colored frame
-                "",  # Green - Empty because we'll overlay a colored frame
-                row.get(freq_col, 0),
-                row.get('Card Type', 'Unknown'),
-                row.get('Synergy Score', ''),
-                "Yes" if is_owned else "No",
-                row.get('Quantity Owned', 0),
-                "Yes" if is_auto_include else "No"
-            )
+        # Rows are inserted in the current sort order, hidden by the current filters
+        self.update_sort_headings()
+        self.populate_results_tree()
 
-            # Apply appropriate tag for row highlighting
-            if is_auto_include:
-                tag = 'auto_include'  # Yellow highlighting for auto-includes
-            elif is_owned:
-                tag = 'owned'  # Blue highlighting for owned cards
+    def populate_results_tree(self, chunk_size=500):
+        """
+        Insert the model's rows into the treeview in display order.
+
+        Rows are inserted chunk_size at a time, yielding to the event loop between chunks so
+        the window stays responsive with thousands of rows. Starting again (e.g. switching
+        views) abandons the chunks still pending from the previous call. Filtered out rows
+        are inserted too but detached, so a later filter change only reattaches them.
+        """
+        self.results_populate_job += 1
+        job = self.results_populate_job
+        self.results_populated = False
+        self.results_tree.delete(*self.results_tree.get_children())
+
+        model = self.results_model
+        order = list(model.sort_by(self.sort_keys))
+        shown = model.filter_mask(**self.results_filters()).tolist()
+
+        def insert_chunk(start):
+            if job != self.results_populate_job:
+                return
+            chunk = order[start:start + chunk_size]
+            for row in chunk:
+                self.results_tree.insert('', 'end', iid=row, image=self.mana_color_image(model.color_keys[row]),
+                                         values=model.values[row], tags=model.tags[row])
+            hidden = [row for row in chunk if not shown[row]]
+            if hidden:
+                self.results_tree.detach(*hidden)
+            if start + chunk_size < len(order):
+                self.root.after(1, insert_chunk, start + chunk_size)
             else:
-                tag = ''  # No highlighting for other cards
-
-            # Add 'extended' tag for cards with ranks 101-150
-            rank = row.get('Rank', 0)
-            if rank >= 101 and rank <= 150:
-                tag = 'extended'  # Light orange highlighting for extended cards (ranks 101-150)
-
-            tags = (tag,) if tag else ()
-
-            # Insert the row with appropriate tags
-            item_id = self.results_tree.insert('', 'end', values=values, tags=tags)
-
-            # Store mana color information for this row
-            # This will be used by the mana_color_grid.create_color_cells function
-            self.mana_colors_data.append({
-                'item_id': item_id,
-                'W': has_white,
-                'U': has_blue,
-                'B': has_black,
-                'R': has_red,
-                'G': has_green,
-                'colorless': not has_colors and mana_cost
-            })
+                self.results_populated = True
+                # Pick up sorts and filters changed while the rows were inserted
+                self.show_results_rows()
+
+        insert_chunk(0)
+
+    def results_filters(self):
+        """Current results tab filters, as ResultsViewModel.filter_mask arguments"""
+        card_type = self.filter_type_var.get()
+        return {
+            'name': self.filter_name_var.get().strip(),
+            'card_type': None if card_type == "All" else card_type,
+            'owned': True if self.filter_owned_var.get() else None,
+            'auto_include': True if self.filter_auto_include_var.get() else None,
+            'colors': ''.join(symbol for symbol, var in self.filter_color_vars.items() if var.get()),
+        }
+
+    def apply_results_query(self):
+        """Show the results for the current sort and filters (called when either changes)"""
+        self.update_sort_headings()
+        # While rows are still being inserted, the last chunk applies the query
+        if self.results_model is not None and self.results_populated:
+            self.show_results_rows()
+
+    def show_results_rows(self):
+        """Attach the rows that pass the filters in sort order, with one call for the whole tree"""
+        model = self.results_model
+        rows = model.query(self.sort_keys, **self.results_filters())
+        self.results_tree.set_children('', *rows)
+        self.results_count_var.set(f"Showing {len(rows)} of {len(model)} cards")
+
+    def mana_color_image(self, color_key):
+        """
+        Get the image of a row's five mana color cells (W, U, B, R, G).
 
-        # Reapply the sort if there was one
-        if hasattr(self, 'sort_column'):
-            self.sort_treeview(self.sort_column, numeric=(self.sort_column in ["Rank", "Frequency", "Quantity"]))
+        Args:
+            color_key (int): Bit i set for MANA_COLORS[i], or MANA_COLORLESS (see ResultsViewModel)
 
-        # Update the mana color grid after a short delay to ensure tree is fully rendered
-        self.root.after(100, self.mana_color_grid.create_color_cells)
+        Colored cells are filled with their color, colorless cards fill every cell with gray.
+        Rows share one image per color combination, and Treeview only draws the visible rows,
+        so scrolling or resizing costs the same with 100 or 20k rows and no widgets are created.
+        """
+        image = self.mana_color_images.get(color_key)
+        if image is None:
+            size = MANA_CELL_SIZE
+            colorless = color_key == MANA_COLORLESS
+            image = tk.PhotoImage(width=size * len(MANA_COLORS), height=size)
+            for i, (_, color) in enumerate(MANA_COLORS):
+                if colorless or color_key & (1 << i):
+                    # Outline, so white cells stand out from the row background
+                    image.put("#808080", to=(i * size, 0, (i + 1) * size - 1, size))
+                    image.put('gray' if colorless else color, to=(i * size + 1, 1, (i + 1) * size - 2, size - 1))
+            self.mana_color_images[color_key] = image
+        return image
 
     def setup_results_tab(self):
         # Configure grid weights for resizing
@@ -1419,9 +1835,37 @@ class MoxfieldAnalyzerApp:
         )
         self.export_button.pack(side="right", padx=10)
 
-        # Filter label (placeholder for future feature)
-        filter_label = tk.Label(control_frame, text="Filters coming soon...", bg="#f0f0f0", fg="#888888")
-        filter_label.pack(side="right", padx=10)
+        # Filters, applied to the results model without reading the treeview
+        filter_frame = tk.Frame(control_frame, bg="#f0f0f0")
+        filter_frame.pack(side="right", padx=10)
+
+        tk.Label(filter_frame, text="Search:", bg="#f0f0f0").pack(side="left")
+        self.filter_name_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=self.filter_name_var, width=18).pack(side="left", padx=(2, 8))
+
+        tk.Label(filter_frame, text="Type:", bg="#f0f0f0").pack(side="left")
+        self.filter_type_var = tk.StringVar(value="All")
+        self.filter_type_combo = ttk.Combobox(filter_frame, textvariable=self.filter_type_var, values=["All"],
+                                              state="readonly", width=12)
+        self.filter_type_combo.pack(side="left", padx=(2, 8))
+
+        self.filter_owned_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(filter_frame, text="Owned", variable=self.filter_owned_var,
+                       bg="#f0f0f0").pack(side="left")
+        self.filter_auto_include_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(filter_frame, text="Auto-Include", variable=self.filter_auto_include_var,
+                       bg="#f0f0f0").pack(side="left")
+
+        # Cards with any of the checked mana colors (C = colorless)
+        self.filter_color_vars = {}
+        for symbol in [symbol for symbol, _ in MANA_COLORS] + ["C"]:
+            self.filter_color_vars[symbol] = tk.BooleanVar(value=False)
+            tk.Checkbutton(filter_frame, text=symbol, variable=self.filter_color_vars[symbol],
+                           bg="#f0f0f0").pack(side="left")
+
+        for var in [self.filter_name_var, self.filter_type_var, self.filter_owned_var,
+                    self.filter_auto_include_var, *self.filter_color_vars.values()]:
+            var.trace_add("write", lambda *args: self.apply_results_query())
 
         # Results frame (will contain treeview)
         results_frame = tk.Frame(self.results_tab, bg="#f0f0f0")
@@ -1462,6 +1906,10 @@ class MoxfieldAnalyzerApp:
         green_frame.pack(side="left", padx=2)
         tk.Label(green_frame, text="G", bg="green", fg="white").pack(fill="both", expand=True)
 
+        # Number of cards passing the filters
+        self.results_count_var = tk.StringVar(value="")
+        tk.Label(legend_frame, textvariable=self.results_count_var, bg="#f0f0f0").pack(side="right", padx=5)
+
         # We need a container frame for the treeview and color overlays
         tree_container = tk.Frame(results_frame, bg="#f0f0f0")
         tree_container.grid(row=1, column=0, sticky="nsew")
@@ -1483,21 +1931,15 @@ class MoxfieldAnalyzerApp:
         self.results_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
 
         self.results_tree["columns"] = (
-            "Rank", "Card Name", "W", "U", "B", "R", "G", "Frequency", "Card Type", "Synergy Score", "Owned",
+            "Rank", "Card Name", "Frequency", "Card Type", "Synergy Score", "Owned",
             "Quantity",
             "Auto-Include")
 
-        self.results_tree.column("#0", width=0, stretch=tk.NO)
+        # The tree column shows the mana color cells as an image (see mana_color_image)
+        self.results_tree.column("#0", width=MANA_CELL_SIZE * len(MANA_COLORS) + 25, stretch=tk.NO)
         self.results_tree.column("Rank", width=50, anchor=tk.CENTER)
         self.results_tree.column("Card Name", width=200, anchor=tk.W)
 
-        # Mana color columns - small width, centered
-        self.results_tree.column("W", width=25, anchor=tk.CENTER)
-        self.results_tree.column("U", width=25, anchor=tk.CENTER)
-        self.results_tree.column("B", width=25, anchor=tk.CENTER)
-        self.results_tree.column("R", width=25, anchor=tk.CENTER)
-        self.results_tree.column("G", width=25, anchor=tk.CENTER)
-
         self.results_tree.column("Frequency", width=80, anchor=tk.CENTER)
         self.results_tree.column("Card Type", width=100, anchor=tk.CENTER)
         self.results_tree.column("Synergy Score", width=100, anchor=tk.CENTER)
@@ -1505,109 +1947,22 @@ class MoxfieldAnalyzerApp:
         self.results_tree.column("Quantity", width=70, anchor=tk.CENTER)
         self.results_tree.column("Auto-Include", width=90, anchor=tk.CENTER)
 
+        # No heading text for the mana colors since we have the colored labels above
         self.results_tree.heading("#0", text="")
-        self.results_tree.heading("Rank", text="Rank", command=lambda: self.sort_treeview("Rank", numeric=True))
+        self.results_tree.heading("Rank", text="Rank", command=lambda: self.sort_treeview("Rank"))
         self.results_tree.heading("Card Name", text="Card Name", command=lambda: self.sort_treeview("Card Name"))
 
-        # Hide the mana color heading text since we have the colored labels above
-        self.results_tree.heading("W", text="")
-        self.results_tree.heading("U", text="")
-        self.results_tree.heading("B", text="")
-        self.results_tree.heading("R", text="")
-        self.results_tree.heading("G", text="")
-
         self.results_tree.heading("Frequency", text="Frequency",
-                                  command=lambda: self.sort_treeview("Frequency", numeric=True))
+                                  command=lambda: self.sort_treeview("Frequency"))
         self.results_tree.heading("Card Type", text="Card Type", command=lambda: self.sort_treeview("Card Type"))
         self.results_tree.heading("Synergy Score", text="Synergy Score",
-                                  command=lambda: self.sort_treeview("Synergy Score", numeric=True))
+                                  command=lambda: self.sort_treeview("Synergy Score"))
         self.results_tree.heading("Owned", text="Owned", command=lambda: self.sort_treeview("Owned"))
         self.results_tree.heading("Quantity", text="Quantity",
-                                  command=lambda: self.sort_treeview("Quantity", numeric=True))
+                                  command=lambda: self.sort_treeview("Quantity"))
         self.results_tree.heading("Auto-Include", text="Auto-Include",
                                   command=lambda: self.sort_treeview("Auto-Include"))
 
-        # List for storing color frames created for the mana symbols
-        self.mana_color_frames = []
-
-        # Initialize our mana color data storage
-        self.mana_colors_data = []
-
-        # Create a special utility class to handle the colored cells
-        class ManaColorGrid:
-            def __init__(self, tree, parent_app):
-                self.tree = tree
-                self.parent = parent_app
-
-            def create_color_cells(self):
-                """Create colored cells for the mana symbols"""
-                # Clear any existing frames
-                for frame in self.parent.mana_color_frames:
-                    if frame and frame.winfo_exists():
-                        frame.destroy()
-                self.parent.mana_color_frames = []
-
-                # For each row with color data
-                for color_data in self.parent.mana_colors_data:
-                    item_id = color_data['item_id']
-
-                    # Only process if the item still exists
-                    if not self.tree.exists(item_id):
-                        continue
-
-                    # Get the item's location - we need this to position our color cells
-                    item_id_bbox = self.tree.bbox(item_id)
-                    if not item_id_bbox:
-                        continue  # Skip if not visible
-
-                    # Create frames for each mana color
-                    mana_columns = ["W", "U", "B", "R", "G"]
-                    for i, col in enumerate(mana_columns):
-                        # Only create color for columns that have mana or are colorless
-                        if color_data.get(col, False) or color_data.get('colorless', False):
-                            # Get the column's position
-                            col_id = i + 2  # Offset for Rank, Card Name
-                            col_bbox = self.tree.bbox(item_id, col_id)
-
-                            if col_bbox:
-                                x, y, width, height = col_bbox
-
-                                # Determine the color
-                                if color_data.get('colorless', False):
-                                    bg_color = 'gray'
-                                elif col == "W":
-                                    bg_color = 'white'
-                                elif col == "U":
-                                    bg_color = 'blue'
-                                elif col == "B":
-                                    bg_color = 'black'
-                                elif col == "R":
-                                    bg_color = 'red'
-                                elif col == "G":
-                                    bg_color = 'green'
-
-                                # Create a colored frame at this position
-                                color_frame = tk.Frame(
-                                    self.tree,
-                                    bg=bg_color,
-                                    borderwidth=0,
-                                    height=height - 1,
-                                    width=width - 1
-                                )
-                                color_frame.place(x=x, y=y)
-
-                                # Store the frame for later cleanup
-                                self.parent.mana_color_frames.append(color_frame)
-
-        # Initialize the color grid
-        self.mana_color_grid = ManaColorGrid(self.results_tree, self)
-
-        # Bind events to refresh the color grid on changes
-        self.results_tree.bind("<Motion>", lambda e: self.root.after(100, self.mana_color_grid.create_color_cells))
-        self.results_tree.bind("<<TreeviewSelect>>",
-                               lambda e: self.root.after(100, self.mana_color_grid.create_color_cells))
-        self.results_tree.bind("<Configure>", lambda e: self.root.after(100, self.mana_color_grid.create_color_cells))
-
         # Add tags for highlighting different types of cards
         self.results_tree.tag_configure('auto_include', background='#ffff99')  # Light yellow for auto-includes
         self.results_tree.tag_configure('owned', background='#add8e6')  # Light blue for owned cards
@@ -1659,19 +2014,6 @@ class MoxfieldAnalyzerApp:
             df.to_csv(filename, index=False)
             self.log(f"Exported to {filename}")
 
-    def highlight_mana_cells(self, event=None):
-        """Apply color highlighting to mana symbol cells after rendering"""
-        # Since ttk.Treeview doesn't support cell-level styling directly,
-        # we'll handle this with custom rendering using Canvas
-
-        # This method will be used as a fallback to the style-based approach
-        # If we find the style-based approach doesn't work consistently, we can
-        # enhance this method to manually draw colored cells
-
-        # Using ttk styles with a custom Canvas approach would be the most reliable
-        # but it's complex to implement and beyond the scope of a quick fix
-        pass
-
     def setup_visualization_tab(self):
         # Configure grid for resizing
         self.visualization_tab.rowconfigure(0, weight=1)
@@ -1695,246 +2037,3309 @@ class MoxfieldAnalyzerApp:
         )
         self.vis_placeholder.grid(row=0, column=0, sticky="nsew", pady=50)
 
-    def sort_treeview(self, column, numeric=False):
+    def sort_treeview(self, column):
         """Sort treeview when column heading is clicked"""
-        # If same column, flip the sort direction
-        if self.sort_column == column:
-            self.sort_ascending = not self.sort_ascending
-        else:
-            # New column, default to ascending
-            self.sort_ascending = True
-            self.sort_column = column
-
-        # Get all items from treeview
-        items = [(self.results_tree.set(item, column), item) for item in self.results_tree.get_children('')]
-
-        # Sort based on numeric or string comparison
-        if numeric:
-            # Handle empty values properly for numeric sorting
-            def safe_float(val):
-                try:
-                    return float(val) if val else 0
-                except ValueError:
-                    return 0
-
-            items.sort(key=lambda x: safe_float(x[0]), reverse=not self.sort_ascending)
+        primary_column, primary_ascending = self.sort_keys[0]
+        if primary_column == column:
+            # If same column, flip the sort direction
+            self.sort_keys[0] = (column, not primary_ascending)
         else:
-            items.sort(key=lambda x: x[0].lower(), reverse=not self.sort_ascending)
+            # New column, default to ascending; the previous sort columns break ties
+            previous = [key for key in self.sort_keys if key[0] != column]
+            self.sort_keys = [(column, True)] + previous[:self.max_sort_keys - 1]
 
-        # Rearrange items in the sorted order
-        for index, (val, item) in enumerate(items):
-            self.results_tree.move(item, '', index)
+        self.apply_results_query()
 
-        # Update column headings to show sort direction
+    def update_sort_headings(self):
+        """Show the sort direction on the sorted columns, numbered when there are several"""
+        directions = {column: (position, ascending) for position, (column, ascending) in enumerate(self.sort_keys)}
         for col in self.results_tree["columns"]:
-            if col == column:
-                direction = "▲" if self.sort_ascending else "▼"
-                self.results_tree.heading(col, text=f"{col} {direction}")
+            if col in directions:
+                position, ascending = directions[col]
+                direction = "▲" if ascending else "▼"
+                order = "" if position == 0 else str(position + 1)
+                self.results_tree.heading(col, text=f"{col} {direction}{order}")
             else:
                 # Remove sort indicator from other columns
                 self.results_tree.heading(col, text=col)
 
 
-class MoxfieldAnalyzer:
-    def __init__(self, output_dir="moxfield_data"):
-        """Initialize the analyzer with a scraper and output directory."""
-        self.scraper = cloudscraper.create_scraper(browser={
+class ScraperSessionPool:
+    """
+    Bounded pool of cloudscraper sessions.
+
+    A session is checked out by one request at a time, so sessions are never shared
+    between threads. Sessions are created lazily up to the pool size and kept alive
+    between requests (and between analyses when the pool is reused), so connections
+    stay open and Cloudflare clearance cookies are not solved again.
+    """
+
+    def __init__(self, size=16, browser=None):
+        """
+        Args:
+            size (int): Maximum number of sessions (and therefore concurrent requests)
+            browser (dict): Browser profile passed to cloudscraper.create_scraper
+        """
+        self.size = size
+        self.browser = browser or {
             'browser': 'chrome',
             'platform': 'windows',
             'desktop': True
-        })
-        self.output_dir = output_dir
-        self.owned_cards = set()
-        self.card_quantities = {}
-        self.auto_include_manager = AutoIncludeManager(output_dir)
-        self.card_types = {}  # Dictionary to store card types
-        self.card_mana_costs = {}  # Dictionary to store mana costs
-        self.land_count = 37  # Default land count if not specified
+        }
+        # LIFO so the most recently used (warm) sessions are handed out first
+        self.available = queue.LifoQueue()
+        self.sessions = []
+        self.lock = threading.Lock()
 
-        # Basic lands that can be included multiple times
-        self.basic_lands = ["forest", "swamp", "mountain", "plains", "island"]
+        # Cookies (including Cloudflare clearance) shared between all sessions in the pool
+        self.shared_cookies = {}
 
-        # Create output directories if they don't exist
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        if not os.path.exists(f"{output_dir}/decklists"):
-            os.makedirs(f"{output_dir}/decklists")
-        if not os.path.exists(f"{output_dir}/analysis"):
-            os.makedirs(f"{output_dir}/analysis")
+    def acquire(self):
+        """Check out a session, creating one if the pool is not full yet"""
+        try:
+            session = self.available.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = len(self.sessions) < self.size
+                if can_create:
+                    session = cloudscraper.create_scraper(browser=self.browser)
+                    self.sessions.append(session)
+            if not can_create:
+                # Pool is full, wait for another request to return its session
+                session = self.available.get()
+
+        with self.lock:
+            session.cookies.update(self.shared_cookies)
+        return session
+
+    def release(self, session):
+        """Return a session to the pool and share any cookies it picked up"""
+        with self.lock:
+            self.shared_cookies.update(session.cookies.get_dict())
+        self.available.put(session)
+
+    @contextmanager
+    def session(self):
+        """Context manager that checks a session out and returns it afterwards"""
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
 
-        # For tracking progress
-        self.collected_decks = set()
-        if os.path.exists(f"{output_dir}/collected_decks.json"):
-            with open(f"{output_dir}/collected_decks.json", "r") as f:
-                self.collected_decks = set(json.load(f))
+    def get(self, url, **kwargs):
+        """Perform a GET request on a pooled session"""
+        with self.session() as session:
+            return session.get(url, **kwargs)
 
-    def load_owned_cards(self, csv_file):
-        """
-        Load owned cards from a CSV file.
+    def close(self):
+        """Close every session in the pool"""
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+            self.available = queue.LifoQueue()
 
-        Args:
-            csv_file (str): Path to the CSV file with owned cards
 
-        Returns:
-            int: Number of owned cards loaded
+class TokenBucket:
+    """Async token bucket that limits how many requests may start per second"""
+
+    def __init__(self, rate, capacity=None):
         """
-        try:
-            # Check for the "sep=" line in the CSV
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                first_line = f.readline().strip()
-                if first_line.startswith('"sep='):
-                    delimiter = first_line.split('=')[1].strip('"')
-                else:
-                    delimiter = ','  # Default delimiter
+        Args:
+            rate (float): Tokens added per second (None or 0 disables limiting)
+            capacity (int): Maximum burst size (defaults to one second worth of tokens)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate or 1))
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.lock = None  # Created lazily so it binds to the running event loop
+
+    async def acquire(self):
+        """Wait until a token is available and consume it"""
+        if not self.rate:
+            return
 
-            # Read the CSV file
-            df = pd.read_csv(csv_file, delimiter=delimiter, skiprows=1 if first_line.startswith('"sep=') else 0)
+        if self.lock is None:
+            self.lock = asyncio.Lock()
 
-            # Get card names and quantities
-            if 'Card Name' in df.columns and 'Quantity' in df.columns:
-                for _, row in df.iterrows():
-                    card_name = row['Card Name']
-                    quantity = row['Quantity']
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
 
-                    # Normalize card name (remove special characters, lowercase)
-                    normalized_name = self.normalize_card_name(card_name)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
 
-                    self.owned_cards.add(normalized_name)
-                    self.card_quantities[normalized_name] = quantity
+                # Sleep just long enough for the next token to arrive
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
-            print(f"Loaded {len(self.owned_cards)} unique cards from your collection")
-            return len(self.owned_cards)
 
-        except Exception as e:
-            print(f"Error loading owned cards: {str(e)}")
-            return 0
+class ThrottledError(Exception):
+    """Raised for responses that should be retried later (429 and 5xx)"""
 
-    def normalize_card_name(self, card_name):
-        """Normalize card name to handle variations in naming."""
-        # Convert to lowercase
-        normalized = str(card_name).lower()
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after  # Seconds to wait, from the Retry-After header
 
-        # Remove special characters, but keep spaces
-        normalized = re.sub(r'[^a-z0-9\s]', '', normalized)
+    @staticmethod
+    def parse_retry_after(value):
+        """Parse a Retry-After header (seconds or HTTP date) into seconds, or None"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
 
-        # Remove extra spaces
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
 
-        return normalized
+class TransportError(ThrottledError):
+    """Raised for connection errors and timeouts, which are retried like 5xx responses"""
 
-    def save_collection_progress(self):
-        """Save the list of collected decks to avoid re-downloading."""
-        with open(f"{self.output_dir}/collected_decks.json", "w") as f:
-            json.dump(list(self.collected_decks), f)
+    def __init__(self, error):
+        Exception.__init__(self, f"{type(error).__name__}: {error}")
+        self.status_code = None
+        self.retry_after = None
 
-    def search_decks_by_commander(self, commander_id, page_limit=10):
-        """
-        Search for decks using a specific commander.
 
-        Args:
-            commander_id (str): The Moxfield card ID for the commander
-            page_limit (int): Maximum number of pages to retrieve (each page contains 64 decks,
-                             so page_limit=10 means up to 640 decks could be scraped)
+class AdaptiveRateLimiter:
+    """
+    Rate and concurrency limiter that adapts to how the server responds.
 
-        Returns:
-            list: List of deck public IDs for the commander
+    - 429 responses (and 503 with Retry-After) halve the concurrency and request rate, at most
+      once per decrease_interval so a burst of rejected in-flight requests counts as one event.
+      Other 5xx responses, timeouts and connection errors only lower the concurrency by one step.
+    - Other error responses (e.g. 404) are not retried but count as errors, not successes.
+    - Throttled requests are retried after the Retry-After delay (if given) or an exponential
+      backoff with full jitter.
+    - When recent requests succeed quickly and the error rate stays below max_error_rate, the
+      concurrency and rate grow again, one step per round of successful requests.
+    - When latency rises above the target the concurrency is lowered by one step.
+    """
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, min_concurrency=2, max_concurrency=16, rate=10, min_rate=1, max_rate=50,
+                 max_retries=5, base_backoff=1.0, max_backoff=60.0, target_latency=2.0, window_size=50,
+                 decrease_interval=1.0, max_error_rate=0.1):
+        """
+        Args:
+            min_concurrency (int): Lower bound for requests in flight
+            max_concurrency (int): Upper bound for requests in flight (also the starting value)
+            rate (float): Starting requests per second (None or 0 disables rate limiting)
+            min_rate (float): Lower bound for the request rate
+            max_rate (float): Upper bound for the request rate
+            max_retries (int): Retries per request before giving up
+            base_backoff (float): First backoff delay in seconds
+            max_backoff (float): Largest backoff delay in seconds
+            target_latency (float): Average latency in seconds above which concurrency is lowered
+            window_size (int): Number of recent requests used for latency and error rate
+            decrease_interval (float): Minimum seconds between two throttle-triggered decreases
+            max_error_rate (float): Error rate of recent requests above which limits are not raised
+        """
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.target_latency = target_latency
+        self.decrease_interval = decrease_interval
+        self.max_error_rate = max_error_rate
+
+        self.bucket = TokenBucket(rate)
+        self.last_decrease = 0.0
+        self.pause_until = 0.0  # Monotonic time before which no request may start
+        self.recent = deque(maxlen=window_size)  # (succeeded, latency) of recent requests
+        self.successes_since_adjust = 0
+        self.stats_lock = threading.Lock()
+
+        # Counters reported to the GUI log
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+        # Async primitives are bound to an event loop, see start()
+        self.condition = None
+        self.in_flight = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def start(self):
+        """Create the async primitives for the running event loop"""
+        self.condition = asyncio.Condition()
+        self.bucket.lock = None
+        self.in_flight = 0
+
+    async def acquire(self):
+        """Wait for a concurrency slot, any server-requested pause and a rate token"""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.bucket.acquire()
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        if retry_after is not None:
+            # Honour the server's delay, with a little jitter so retries don't arrive together
+            return min(self.max_backoff, retry_after) + random.uniform(0, self.base_backoff)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def record_success(self, latency):
+        """Record a successful request and grow the limits when the server keeps up"""
+        with self.stats_lock:
+            self.requests += 1
+            self.recent.append((True, latency))
+            self.successes_since_adjust += 1
+
+            average_latency = sum(lat for _, lat in self.recent) / len(self.recent)
+            if average_latency > self.target_latency * 2:
+                # Server is slowing down, back off gently before it starts throttling
+                if self.concurrency > self.min_concurrency:
+                    self.concurrency -= 1
+                self.successes_since_adjust = 0
+            elif self.successes_since_adjust >= self.concurrency:
+                # One full round of requests succeeded, grow additively
+                self.successes_since_adjust = 0
+                if self.error_rate() < self.max_error_rate and average_latency <= self.target_latency:
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                    if self.bucket.rate:
+                        self.bucket.rate = min(self.max_rate, self.bucket.rate + max(1.0, self.bucket.rate * 0.1))
+
+    def record_throttle(self, status_code=None, retry_after=None):
+        """Record a 429/5xx response (or timeout) and shrink the limits"""
+        with self.stats_lock:
+            self.requests += 1
+            self.throttled += 1
+            self.recent.append((False, 0.0))
+            self.successes_since_adjust = 0
+
+            now = time.monotonic()
+            rate_limited = status_code == 429 or retry_after is not None
+            if rate_limited and now - self.last_decrease >= self.decrease_interval:
+                # The server says we are too fast, decrease multiplicatively
+                self.last_decrease = now
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                if self.bucket.rate:
+                    self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+            elif not rate_limited:
+                # Server errors and timeouts: ease off a little
+                self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+
+            if retry_after is not None:
+                # The server asked everyone to wait, so pause all requests
+                self.pause_until = max(self.pause_until, time.monotonic() + retry_after)
+
+    def record_error(self):
+        """Record a request answered with an error that is not retried (the request returned None)"""
+        with self.stats_lock:
+            self.requests += 1
+            self.failures += 1
+            self.recent.append((False, 0.0))
+            self.successes_since_adjust = 0
+
+    def record_failure(self):
+        """Record a request that failed for good (errors, timeouts or retries exhausted)"""
+        with self.stats_lock:
+            self.failures += 1
+            self.recent.append((False, 0.0))
+
+    def record_retry(self):
+        with self.stats_lock:
+            self.retries += 1
+
+    def error_rate(self):
+        if not self.recent:
+            return 0.0
+        return sum(1 for ok, _ in self.recent if not ok) / len(self.recent)
+
+    def call_sync(self, func, *args):
         """
-        all_public_ids = []
-        page_number = 1
+        Call a blocking request function with retries, for code that doesn't use asyncio.
 
-        print(f"Searching for decks with commander ID: {commander_id}")
-        print(f"Will scrape up to {page_limit} pages (max {page_limit * 64} decks)")
+        func raises ThrottledError for responses that should be retried and returns None
+        for errors that should not.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self.pause_until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
-        while page_number <= page_limit:
-            url = f"https://api2.moxfield.com/v2/decks/search-sfw?pageNumber={page_number}&pageSize=64&sortType=likes&sortDirection=descending&commanderCardId={commander_id}"
+            start = time.monotonic()
             try:
-                response = self.scraper.get(url)
-                if response.status_code != 200:
-                    print(f"Error on page {page_number}: {response.status_code}")
-                    break
+                result = func(*args)
+            except ThrottledError as e:
+                self.record_throttle(e.status_code, e.retry_after)
+                if attempt == self.max_retries:
+                    print(f"Giving up after {attempt + 1} attempts: {e}")
+                    self.record_failure()
+                    return None
+                self.record_retry()
+                time.sleep(self.backoff_delay(attempt, e.retry_after))
+                continue
 
-                data = response.json()
+            if result is None:
+                self.record_error()
+            else:
+                self.record_success(time.monotonic() - start)
+            return result
 
-                # Check if we've reached the end of results
-                if len(data.get('data', [])) == 0:
-                    print(f"No more decks found after page {page_number - 1}")
-                    break
+    def describe(self):
+        """One-line summary of the current limits and counters for the log"""
+        rate = f"{self.bucket.rate:.1f} req/s" if self.bucket.rate else "unlimited rate"
+        return (f"concurrency {self.concurrency} ({self.min_concurrency}-{self.max_concurrency}), {rate}, "
+                f"{self.requests} requests, {self.retries} retries, {self.throttled} throttled, "
+                f"{self.failures} failed, error rate {self.error_rate() * 100:.0f}%")
 
-                # Extract public IDs
-                public_ids = [deck['publicId'] for deck in data.get('data', [])]
-                all_public_ids.extend(public_ids)
 
-                print(f"Found {len(public_ids)} decks on page {page_number}")
+class AsyncDeckCollector:
+    """
+    Asyncio-based decklist collection engine.
 
-                # Save progress after each page
-                page_number += 1
+    Concurrency, request rate and timeouts are controlled here instead of by the size of
+    a thread pool. The HTTP client (cloudscraper) is blocking, so each request runs on an
+    executor thread while the event loop schedules, rate limits and times out the work.
 
-                # Add a small delay to avoid rate limiting
-                time.sleep(1)
+    Commander searches and deck downloads can run as one pipeline: search pages for all
+    commanders are fetched concurrently under the same rate budget, and every deck ID found
+    is handed straight to the download workers.
+    """
 
-            except Exception as e:
-                print(f"Error fetching page {page_number}: {str(e)}")
-                break
+    def __init__(self, fetch_func, save_func, limiter=None, timeout=30, search_func=None, page_size=64,
+                 load_func=None):
+        """
+        Args:
+            fetch_func (function): fetch_func(public_id, timeout) -> deck data or None
+            save_func (function): save_func(public_id, data) persists a fetched deck
+            limiter (AdaptiveRateLimiter): Concurrency, rate and retry policy (a default one if None)
+            timeout (float): Per-request timeout in seconds
+            search_func (function): search_func(commander_id, page_number, timeout) -> list of
+                                    public IDs, or None on error
+            page_size (int): Number of decks on a full search page
+            load_func (function): load_func(public_id) -> deck data or None collects a deck without
+                                  a request (e.g. from a cache), None downloads every deck
+
+        fetch_func and search_func raise ThrottledError for responses that should be retried
+        (TransportError for connection errors and timeouts), and return None for errors that
+        should not.
+        """
+        self.fetch_func = fetch_func
+        self.save_func = save_func
+        self.search_func = search_func
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.timeout = timeout
+        self.page_size = page_size
+        self.load_func = load_func
+
+    def run(self, public_ids, progress_callback=None):
+        """
+        Collect the given decks and block until all of them are done.
 
-        print(f"Total decks found for commander {commander_id}: {len(all_public_ids)}")
-        return all_public_ids
+        Returns:
+            int: Number of successfully collected decklists
+        """
+        if not public_ids:
+            return 0
+        _, successful = asyncio.run(self._pipeline([], 0, public_ids, (), progress_callback))
+        return successful
 
-    def get_decklist(self, public_id):
+    def run_pipelined(self, commander_ids, page_limit, skip_ids=(), progress_callback=None):
         """
-        Retrieve a complete decklist by its public ID.
+        Search decks for every commander and download them as soon as they are found.
 
         Args:
-            public_id (str): The public ID of the deck
+            commander_ids (list): Moxfield commander card IDs to search
+            page_limit (int): Maximum number of search pages per commander
+            skip_ids (set): Deck IDs that are already collected and should not be downloaded
+            progress_callback (function): Callback for progress updates
 
         Returns:
-            dict: The full deck data or None if unsuccessful
+            tuple: (list of unique deck IDs found, number of successfully collected decklists)
         """
-        # Skip if already collected
-        if public_id in self.collected_decks:
-            return None
-
-        url = f"https://api2.moxfield.com/v2/decks/all/{public_id}"
-        try:
-            response = self.scraper.get(url)
-            if response.status_code != 200:
-                print(f"Error fetching deck {public_id}: {response.status_code}")
-                return None
+        return asyncio.run(self._pipeline(commander_ids, page_limit, [], skip_ids, progress_callback))
 
-            data = response.json()
+    def search(self, commander_ids, page_limit):
+        """
+        Search decks for every commander concurrently without downloading them.
 
-            # Save the decklist to file
-            output_path = f"{self.output_dir}/decklists/{public_id}.json"
-            with open(output_path, "w") as f:
-                json.dump(data, f, indent=2)
+        Returns:
+            list: Unique deck IDs in the order they were found
+        """
+        found_ids, _ = asyncio.run(self._pipeline(commander_ids, page_limit, [], None, None))
+        return found_ids
 
-            # Mark as collected
-            self.collected_decks.add(public_id)
+    async def _call(self, func, *args):
+        """
+        Run a blocking request on the executor under the limiter, retrying throttled requests.
 
-            # Return the data for further processing if needed
-            return data
+        A request that times out keeps its concurrency slot until its executor thread returns,
+        so the requests actually in flight never exceed the limiter's concurrency.
 
-        except Exception as e:
-            print(f"Error fetching deck {public_id}: {str(e)}")
+        Returns:
+            The request result, or None if it failed or every retry was throttled
+        """
+        limiter = self.limiter
+        for attempt in range(limiter.max_retries + 1):
+            await limiter.acquire()
+            start = time.monotonic()
+            future = self.loop.run_in_executor(self.executor, func, *args, self.timeout)
+            try:
+                # Shielded so a timeout doesn't cancel the future while its thread keeps running
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+            except ThrottledError as e:
+                limiter.record_throttle(e.status_code, e.retry_after)
+                error = e
+            except asyncio.TimeoutError:
+                # Timeouts under load are treated like throttling
+                limiter.record_throttle()
+                error = f"timed out after {self.timeout}s"
+            else:
+                if result is None:
+                    limiter.record_error()
+                else:
+                    limiter.record_success(time.monotonic() - start)
+                return result
+            finally:
+                if future.done():
+                    await limiter.release()
+                else:
+                    future.add_done_callback(self._release_when_done)
+
+            if attempt < limiter.max_retries:
+                limiter.record_retry()
+                # Wait outside the concurrency slot so other requests can proceed
+                await asyncio.sleep(limiter.backoff_delay(attempt, getattr(error, 'retry_after', None)))
+
+        print(f"Giving up on {func.__name__}{args} after {limiter.max_retries + 1} attempts: {error}")
+        limiter.record_failure()
+        return None
+
+    def _release_when_done(self, future):
+        """Release the slot of a timed-out request once its executor thread has returned"""
+        if not future.cancelled():
+            future.exception()  # Retrieved so a late error isn't reported as never retrieved
+        task = self.loop.create_task(self.limiter.release())
+        self.release_tasks.add(task)
+        task.add_done_callback(self.release_tasks.discard)
+
+    async def _pipeline(self, commander_ids, page_limit, public_ids, skip_ids, progress_callback):
+        """
+        Run commander searches and deck downloads concurrently.
+
+        skip_ids=None means search only: found decks are not queued for download.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.limiter.start()
+        self.release_tasks = set()  # Pending releases of timed-out requests, see _release_when_done
+        concurrency = self.limiter.max_concurrency
+
+        # One thread per in-flight request, plus headroom for timed-out calls still unwinding
+        self.executor = ThreadPoolExecutor(max_workers=concurrency * 2)
+
+        queue = asyncio.Queue()
+        found_ids = {}  # Ordered set of every deck ID seen
+        queued = 0
+        completed = 0
+        successful = 0
+        searching = len(commander_ids)
+        last_progress = 0
+
+        def report_progress():
+            nonlocal last_progress
+            if not progress_callback:
+                return
+            # While searches are running, assume every active search still has a full page to come
+            expected = queued + searching * self.page_size
+            progress = 100 * completed / expected if expected else 100
+            # Never move the progress bar backwards when new decks are discovered
+            if progress > last_progress:
+                last_progress = progress
+                progress_callback(progress)
+
+        def enqueue(public_id):
+            nonlocal queued
+            if public_id in found_ids:
+                return
+            found_ids[public_id] = None
+            if skip_ids is not None and public_id not in skip_ids:
+                queued += 1
+                queue.put_nowait(public_id)
+
+        async def search_commander(commander_id):
+            nonlocal searching
+            deck_count = 0
+            pages = 0
+            try:
+                for page_number in range(1, page_limit + 1):
+                    ids = await self._call(self.search_func, commander_id, page_number)
+                    if ids is None:
+                        # This page failed for good, the later pages may still come through
+                        continue
+                    if not ids:
+                        break
+
+                    deck_count += len(ids)
+                    pages += 1
+                    for public_id in ids:
+                        enqueue(public_id)
+
+                    # A short page is the last page, no need to request the next one
+                    if len(ids) < self.page_size:
+                        break
+
+                # Printed from the event loop, so summaries of concurrent searches don't interleave
+                print(f"Found {deck_count} decks on {pages} page(s) for commander {commander_id}")
+            except Exception as e:
+                print(f"Error searching decks for commander {commander_id}: {str(e)}")
+            finally:
+                searching -= 1
+                report_progress()
+
+        async def download_worker():
+            nonlocal completed, successful
+            while True:
+                public_id = await queue.get()
+                if public_id is None:
+                    return
+                try:
+                    data = None
+                    if self.load_func is not None:
+                        # Loaded decks are saved by load_func and never use the rate budget
+                        data = await self.loop.run_in_executor(self.executor, self.load_func, public_id)
+                    if data is None:
+                        data = await self._call(self.fetch_func, public_id)
+                        if data is not None:
+                            await self.loop.run_in_executor(self.executor, self.save_func, public_id, data)
+                    if data is not None:
+                        successful += 1
+                except Exception as e:
+                    print(f"Error collecting deck {public_id}: {str(e)}")
+                finally:
+                    completed += 1
+                    report_progress()
+
+        for public_id in public_ids:
+            enqueue(public_id)
+
+        workers = [asyncio.create_task(download_worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*(search_commander(cid) for cid in commander_ids))
+
+            # Searches are done, let the workers drain the queue and exit
+            for _ in workers:
+                queue.put_nowait(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.executor.shutdown(wait=False)
+
+        return list(found_ids), successful
+
+
+class CardNameNormalizer:
+    """
+    Card name normalization shared by every class.
+
+    Names are lowercased, everything except a-z, 0-9 and whitespace is dropped and runs of
+    whitespace are collapsed. Results are kept in an LRU cache and interned, so a name is only
+    normalized once and every class gets the same canonical string object for the same card.
+    """
+
+    class _KeepTable(dict):
+        """str.translate table that deletes every character except a-z, 0-9 and whitespace"""
+
+        def __missing__(self, code_point):
+            char = chr(code_point)
+            keep = 'a' <= char <= 'z' or '0' <= char <= '9' or char.isspace()
+            self[code_point] = code_point if keep else None
+            return self[code_point]
+
+    def __init__(self, cache_size=65536):
+        """
+        Args:
+            cache_size (int): Number of distinct raw names to remember
+        """
+        self._keep_table = self._KeepTable()
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, card_name):
+        normalized = str(card_name).lower().translate(self._keep_table)
+        # split() without arguments splits on any whitespace, so this also strips
+        return sys.intern(' '.join(normalized.split()))
+
+    def cache_info(self):
+        return self.normalize.cache_info()
+
+
+# The normalizer every class uses, so all normalized names share one cache and one set of strings
+card_names = CardNameNormalizer()
+
+
+if msgspec is not None:
+    # Typed schemas of the Moxfield payload fields we read. msgspec skips every other
+    # field while decoding, so the rest of a payload never becomes Python objects.
+    # Structs are slotted, so the decoded cards are compact too.
+
+    class CardSchema(msgspec.Struct):
+        name: Optional[str] = None
+        type_line: Optional[str] = None
+        mana_cost: Optional[str] = None
+
+    class BoardEntrySchema(msgspec.Struct):
+        card: Optional[CardSchema] = None
+
+    class DeckSchema(msgspec.Struct):
+        mainboard: Optional[Dict[str, BoardEntrySchema]] = None
+        commanders: Optional[Dict[str, BoardEntrySchema]] = None
+
+    class SearchResultSchema(msgspec.Struct):
+        publicId: str
+        lastUpdatedAtUtc: Optional[str] = None
+
+    class SearchPageSchema(msgspec.Struct):
+        data: Optional[List[SearchResultSchema]] = None
+
+    _deck_schema_decoder = msgspec.json.Decoder(DeckSchema)
+    _search_page_schema_decoder = msgspec.json.Decoder(SearchPageSchema)
+    _generic_decoder = msgspec.json.Decoder()
+
+
+class DeckDecoder:
+    """
+    Pluggable JSON decoding for Moxfield payloads and our own JSON files.
+
+    Uses the fastest installed backend (msgspec, then orjson) and falls back to the stdlib
+    json module. In schema mode deck and search payloads are decoded with typed msgspec
+    schemas that only hold the fields we read, which cuts both parse time and peak memory.
+    Without msgspec schema mode decodes the whole payload and then picks the same fields.
+    All decode errors are raised as ValueError, like json.JSONDecodeError.
+    """
+
+    BACKENDS = ("msgspec", "orjson", "json")
+
+    def __init__(self, backend=None, schema=True):
+        """
+        Args:
+            backend (str): One of BACKENDS, or None to use the fastest installed one
+            schema (bool): Decode deck and search payloads with the typed schemas
+        """
+        available = {"msgspec": msgspec is not None, "orjson": orjson is not None, "json": True}
+        if backend is None:
+            backend = next(name for name in self.BACKENDS if available[name])
+        elif not available.get(backend):
+            raise ValueError(f"JSON backend {backend} is not available")
+
+        self.backend = backend
+        self.schema = schema and backend == "msgspec"
+
+    def loads(self, data):
+        """Decode a JSON document (str or bytes) into plain Python objects"""
+        if self.backend == "msgspec":
+            try:
+                return _generic_decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+        if self.backend == "orjson":
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def load_file(self, path):
+        """Decode a JSON file"""
+        with open(path, 'rb') as f:
+            return self.loads(f.read())
+
+    def decode_deck(self, data):
+        """
+        Decode a Moxfield deck payload down to the analysed fields.
+
+        Returns:
+            list: One list of (name, type_line, mana_cost) tuples per board in DeckStore.BOARDS
+        """
+        if not self.schema:
+            return DeckStore.deck_boards(self.loads(data))
+
+        try:
+            deck = _deck_schema_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+        boards = []
+        for board in DeckStore.BOARDS:
+            cards = []
+            for entry in (getattr(deck, board) or {}).values():
+                card = entry.card
+                if card is not None and card.name:
+                    cards.append((card.name, card.type_line, card.mana_cost))
+            boards.append(cards)
+        return boards
+
+    def decode_search_page(self, data):
+        """
+        Decode a deck search results page.
+
+        Returns:
+            list: The public IDs of the decks on the page
+        """
+        return [public_id for public_id, _ in self.decode_search_results(data)]
+
+    def decode_search_results(self, data):
+        """
+        Decode a deck search results page, keeping when each deck was last changed.
+
+        Returns:
+            list: (public ID, lastUpdatedAtUtc or None) for each deck on the page
+        """
+        if not self.schema:
+            return [(deck['publicId'], deck.get('lastUpdatedAtUtc')) for deck in self.loads(data).get('data', [])]
+
+        try:
+            page = _search_page_schema_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+        return [(deck.publicId, deck.lastUpdatedAtUtc) for deck in page.data or ()]
+
+
+class DeckStore:
+    """
+    Append-only SQLite store of collected decks.
+
+    Only the fields the analysis uses are kept. Card name, type_line and mana_cost are
+    stored once per card in the cards table, keeping the first type_line and the last
+    mana_cost seen like analyze_all_decklists does. Each deck is a single row whose mainboard
+    and commanders columns hold the deck's card IDs as packed int32 arrays. The column a
+    card is in is its board, and the commanders column doubles as the commander flag.
+    A full scan therefore reads one small row per deck instead of a full Moxfield payload.
+
+    Each deck also records when it was fetched (added_at) and the lastUpdatedAtUtc Moxfield
+    reported for it, see DeckFreshness. A deck replaced by a newer version is listed in the
+    changed_decks table until the analysis has folded the new version in.
+    """
+
+    BOARDS = ("mainboard", "commanders")
+
+    def __init__(self, path, read_only=False):
+        """
+        Args:
+            path (str): Path of the SQLite database file
+            read_only (bool): Open an existing store for reading only (e.g. from a worker process)
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        if read_only:
+            uri = f"{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.card_ids = dict(self.conn.execute("SELECT name, id FROM cards"))
+            return
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                type_line TEXT NOT NULL,
+                mana_cost TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS decks (
+                id INTEGER PRIMARY KEY,
+                public_id TEXT UNIQUE NOT NULL,
+                added_at REAL NOT NULL,
+                mainboard BLOB NOT NULL,
+                commanders BLOB NOT NULL,
+                last_updated TEXT
+            );
+            CREATE TABLE IF NOT EXISTS changed_decks (
+                public_id TEXT PRIMARY KEY
+            );
+        """)
+        # Stores created before update times were recorded
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(decks)")}
+        if 'last_updated' not in columns:
+            self.conn.execute("ALTER TABLE decks ADD COLUMN last_updated TEXT")
+        self.conn.commit()
+
+        # Card name -> ID and name -> (type_line, mana_cost) caches, so inserts don't look up every card
+        self.card_ids = {}
+        self.card_fields = {}
+        for card_id, name, type_line, mana_cost in self.conn.execute(
+                "SELECT id, name, type_line, mana_cost FROM cards"):
+            self.card_ids[name] = card_id
+            self.card_fields[name] = (type_line, mana_cost)
+
+    def _card_id(self, name, type_line, mana_cost):
+        """Get the ID of a card, inserting it if new or filling in its fields (caller holds the lock)"""
+        fields = (type_line or '', mana_cost or '')
+        card_id = self.card_ids.get(name)
+        if card_id is None:
+            cursor = self.conn.execute(
+                "INSERT INTO cards (name, type_line, mana_cost) VALUES (?, ?, ?)", (name, *fields)
+            )
+            card_id = cursor.lastrowid
+            self.card_ids[name] = card_id
+            self.card_fields[name] = fields
+        else:
+            merged = self.merge_card_fields(self.card_fields[name], fields)
+            if merged != self.card_fields[name]:
+                self.conn.execute("UPDATE cards SET type_line = ?, mana_cost = ? WHERE id = ?", (*merged, card_id))
+                self.card_fields[name] = merged
+        return card_id
+
+    @staticmethod
+    def merge_card_fields(stored, fields):
+        """
+        Merge a card's newly seen (type_line, mana_cost) into the stored ones.
+
+        The first type_line and the last mana_cost seen win, empty values change nothing.
+        """
+        stored_type_line, stored_mana_cost = stored
+        type_line, mana_cost = fields
+        return stored_type_line or type_line, mana_cost or stored_mana_cost
+
+    @classmethod
+    def deck_boards(cls, deck_data):
+        """
+        Keep only the analysed fields of a Moxfield deck payload.
+
+        Returns:
+            list: One list of (name, type_line, mana_cost) tuples per board in BOARDS
+        """
+        boards = []
+        for board in cls.BOARDS:
+            cards = []
+            for card_info in (deck_data.get(board) or {}).values():
+                card = card_info.get('card') or {}
+                name = card.get('name')
+                if name:
+                    cards.append((name, card.get('type_line'), card.get('mana_cost')))
+            boards.append(cards)
+        return boards
+
+    def add_deck(self, public_id, deck_data, commit=True):
+        """
+        Add a deck from a Moxfield deck payload, keeping only the analysed fields.
+
+        Returns:
+            bool: True if the deck was added, False if it was already stored
+        """
+        return self.add_deck_boards(public_id, self.deck_boards(deck_data), commit=commit)
+
+    def add_deck_boards(self, public_id, boards, commit=True, last_updated=None, replace=False):
+        """
+        Add a deck from the output of deck_boards().
+
+        Args:
+            public_id (str): The public ID of the deck
+            boards (list): The deck's boards
+            commit (bool): Commit right away
+            last_updated (str): The deck's lastUpdatedAtUtc, None if unknown
+            replace (bool): Replace a stored deck with the same public ID (e.g. a newer version)
+
+        Returns:
+            bool: True if the deck was added, False if it was already stored
+        """
+        with self.lock:
+            packed = []
+            for cards in boards:
+                ids = array('i', (self._card_id(name, type_line, mana_cost) for name, type_line, mana_cost in cards))
+                packed.append(ids.tobytes())
+
+            if replace and self.conn.execute("DELETE FROM decks WHERE public_id = ?", (public_id,)).rowcount:
+                self.conn.execute("INSERT OR IGNORE INTO changed_decks (public_id) VALUES (?)", (public_id,))
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO decks (public_id, added_at, mainboard, commanders, last_updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (public_id, time.time(), packed[0], packed[1], last_updated)
+            )
+            if commit:
+                self.conn.commit()
+            return cursor.rowcount > 0
+
+    def import_decklists_dir(self, decklists_dir, workers=1, decoder=None):
+        """
+        Import <publicId>.json files saved by older versions, skipping decks already stored.
+
+        Args:
+            decklists_dir (str): Directory of saved decklist files
+            workers (int): Number of processes parsing the files (1 = parse in this process)
+            decoder (DeckDecoder): Decoder for the files (defaults to the fastest available)
+
+        Returns:
+            int: Number of decks imported
+        """
+        if not os.path.exists(decklists_dir):
+            return 0
+
+        known_ids = self.deck_ids()
+        paths = [
+            os.path.join(decklists_dir, filename) for filename in sorted(os.listdir(decklists_dir))
+            if filename.endswith('.json') and filename[:-len('.json')] not in known_ids
+        ]
+        if not paths:
+            return 0
+
+        if decoder is None:
+            decoder = DeckDecoder()
+
+        if workers > 1:
+            # Shards are parsed in other processes, each returns compact boards instead of full payloads
+            shards = [(shard, decoder) for shard in split_shards(paths, workers * 4)]
+            results = map_in_processes(_parse_decklist_shard, shards, workers)
+        else:
+            results = [_parse_decklist_shard((paths, decoder))]
+
+        imported = 0
+        for shard in results:
+            for filename, public_id, boards in shard:
+                if boards is None:
+                    print(f"Error parsing {filename}")
+                elif self.add_deck_boards(public_id, boards, commit=False):
+                    imported += 1
+
+        with self.lock:
+            self.conn.commit()
+
+        if imported:
+            print(f"Imported {imported} decklists from {decklists_dir} into {self.path}")
+        return imported
+
+    def iter_decks(self, skip_ids=(), row_ids=None):
+        """
+        Scan every stored deck.
+
+        Args:
+            skip_ids (set): Public IDs of decks to leave out (e.g. decks already analysed)
+            row_ids (list): Only scan the decks with these row IDs (see deck_row_ids)
+
+        Yields:
+            tuple: (public_id, mainboard, commanders) where each board is a list of
+                   (name, type_line, mana_cost) tuples
+        """
+        with self.lock:
+            cards = {card_id: (name, type_line, mana_cost) for card_id, name, type_line, mana_cost
+                     in self.conn.execute("SELECT id, name, type_line, mana_cost FROM cards")}
+            if row_ids is None:
+                rows = self.conn.execute(
+                    "SELECT id, public_id, mainboard, commanders FROM decks ORDER BY id"
+                ).fetchall()
+            elif row_ids:
+                rows = self.conn.execute(
+                    "SELECT id, public_id, mainboard, commanders FROM decks WHERE id BETWEEN ? AND ? ORDER BY id",
+                    (min(row_ids), max(row_ids))
+                ).fetchall()
+                wanted = set(row_ids)
+                rows = [row for row in rows if row[0] in wanted]
+            else:
+                rows = []
+
+        for _, public_id, mainboard, commanders in rows:
+            if public_id in skip_ids:
+                continue
+            yield (
+                public_id,
+                [cards[card_id] for card_id in array('i', mainboard)],
+                [cards[card_id] for card_id in array('i', commanders)]
+            )
+
+    def deck_row_ids(self, skip_ids=()):
+        """Get the row IDs of stored decks in scan order, used to shard scans across processes"""
+        with self.lock:
+            rows = self.conn.execute("SELECT id, public_id FROM decks ORDER BY id").fetchall()
+        return [row_id for row_id, public_id in rows if public_id not in skip_ids]
+
+    def deck_ids(self):
+        """Get the public IDs of all stored decks"""
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT public_id FROM decks")}
+
+    def fetch_times(self):
+        """Get (added_at, last_updated) of every stored deck by public ID"""
+        with self.lock:
+            return {public_id: (added_at, last_updated) for public_id, added_at, last_updated
+                    in self.conn.execute("SELECT public_id, added_at, last_updated FROM decks")}
+
+    def changed_ids(self):
+        """Get the public IDs of decks replaced by a newer version since clear_changed()"""
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT public_id FROM changed_decks")}
+
+    def clear_changed(self, public_ids):
+        """Forget that the given decks changed, once their new versions are analysed"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM changed_decks WHERE public_id = ?", [(pid,) for pid in public_ids])
+            self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM decks").fetchone()[0]
+
+    def remove_decks(self, public_ids):
+        """Remove the given decks from the store"""
+        with self.lock:
+            rows = [(pid,) for pid in public_ids]
+            self.conn.executemany("DELETE FROM decks WHERE public_id = ?", rows)
+            self.conn.executemany("DELETE FROM changed_decks WHERE public_id = ?", rows)
+            self.conn.commit()
+
+    def clear(self):
+        """Remove every stored deck (card metadata is kept)"""
+        with self.lock:
+            self.conn.execute("DELETE FROM decks")
+            self.conn.execute("DELETE FROM changed_decks")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class DeckFreshness:
+    """
+    Which collected decks are still current, given the update times found by the latest searches.
+
+    A collected deck is stale when a search reported a lastUpdatedAtUtc for it other than the
+    one it was fetched with. Decks fetched before update times were recorded are compared by
+    time instead: they are stale if Moxfield updated them after they were fetched. Decks no
+    search has reported on are assumed current.
+
+    Passed as skip_ids to AsyncDeckCollector, so a search only downloads new and changed decks.
+    """
+
+    def __init__(self, collected_ids, fetch_times, remote_updates):
+        """
+        Args:
+            collected_ids (set): Public IDs of the collected decks
+            fetch_times (dict): public ID -> (fetched_at, last_updated), see DeckStore.fetch_times()
+            remote_updates (dict): public ID -> lastUpdatedAtUtc from search results, may still
+                                   be filled in by searches while the collector runs
+        """
+        self.collected_ids = collected_ids
+        self.fetch_times = fetch_times
+        self.remote_updates = remote_updates
+
+    def __contains__(self, public_id):
+        return public_id in self.collected_ids and not self.is_stale(public_id)
+
+    def is_stale(self, public_id):
+        """Whether the deck changed on Moxfield since it was fetched"""
+        remote = self.remote_updates.get(public_id)
+        fetched_at, last_updated = self.fetch_times.get(public_id, (None, None))
+        if remote is None or fetched_at is None:
+            return False
+        if last_updated is not None:
+            return last_updated != remote
+        updated_at = self.parse_time(remote)
+        return updated_at is not None and updated_at > fetched_at
+
+    def stale_ids(self):
+        """Public IDs of the collected decks that changed since they were fetched"""
+        return [public_id for public_id in self.collected_ids if self.is_stale(public_id)]
+
+    @staticmethod
+    def parse_time(timestamp):
+        """Seconds since the epoch of an ISO 8601 timestamp (e.g. 2024-01-31T12:00:00.000Z), None if invalid"""
+        try:
+            parsed = datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+
+
+class DeckCache:
+    """
+    Downloaded decks shared by every output directory, keyed by public ID and lastUpdatedAtUtc.
+
+    One SQLite file sits next to the output directories (like CardMetadataCache), so a deck
+    downloaded for one commander analysis is restored from disk by every other analysis that
+    finds it, until Moxfield reports a newer lastUpdatedAtUtc for it. Decks are stored as
+    packed card IDs, the same way as in DeckStore.
+
+    Each output directory's DeckStore still keeps its own copy of the decks it analyses, so
+    evicting an entry here never removes a deck from an analysis, it only means the next
+    analysis that needs it downloads it again. Entries not used for max_age seconds are evicted
+    first, then the least recently used ones until the cache fits in max_bytes.
+    """
+
+    FILENAME = "deck_cache.sqlite"
+    _shared = {}  # absolute path -> DeckCache
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database file, created on first use
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = None
+        self.card_ids = None  # name -> card ID, None until opened
+        self.cards = None  # card ID -> (name, type_line, mana_cost)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def default_path(cls, output_dir):
+        """Cache path shared by output_dir and its sibling output directories"""
+        return os.path.join(os.path.dirname(os.path.abspath(output_dir)), cls.FILENAME)
+
+    @classmethod
+    def shared(cls, path):
+        """The cache for path, one instance (and connection) per file in this process"""
+        path = os.path.abspath(path)
+        with cls._shared_lock:
+            cache = cls._shared.get(path)
+            if cache is None:
+                cache = cls._shared[path] = cls(path)
+            return cache
+
+    def _open(self):
+        """Open the database and read the cards table (caller holds the lock)"""
+        if self.conn is not None:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                type_line TEXT NOT NULL,
+                mana_cost TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS decks (
+                public_id TEXT NOT NULL,
+                last_updated TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                mainboard BLOB NOT NULL,
+                commanders BLOB NOT NULL,
+                PRIMARY KEY (public_id, last_updated)
+            );
+            CREATE INDEX IF NOT EXISTS decks_accessed_at ON decks (accessed_at);
+        """)
+        self.conn.commit()
+
+        self.card_ids, self.cards = {}, {}
+        for card_id, name, type_line, mana_cost in self.conn.execute(
+                "SELECT id, name, type_line, mana_cost FROM cards"):
+            self.card_ids[name] = card_id
+            self.cards[card_id] = (name, type_line, mana_cost)
+
+    def _card_id(self, name, type_line, mana_cost):
+        """Get the ID of a card, inserting it if new or filling in its fields (caller holds the lock)"""
+        fields = (type_line or '', mana_cost or '')
+        card_id = self.card_ids.get(name)
+        if card_id is None:
+            card = (name, *fields)
+            card_id = self.conn.execute("INSERT INTO cards (name, type_line, mana_cost) VALUES (?, ?, ?)", card).lastrowid
+            self.card_ids[name] = card_id
+            self.cards[card_id] = card
+        else:
+            # Same rules as the deck store, so cached decks match what a download would store
+            stored = self.cards[card_id][1:]
+            merged = DeckStore.merge_card_fields(stored, fields)
+            if merged != stored:
+                self.conn.execute("UPDATE cards SET type_line = ?, mana_cost = ? WHERE id = ?", (*merged, card_id))
+                self.cards[card_id] = (name, *merged)
+        return card_id
+
+    def get(self, public_id, last_updated=None):
+        """
+        Get a cached deck and mark it as recently used.
+
+        Args:
+            public_id (str): The public ID of the deck
+            last_updated (str): The deck's lastUpdatedAtUtc; only that version matches.
+                                None accepts the most recently downloaded version.
+
+        Returns:
+            list: The deck's boards (see DeckDecoder.decode_deck) or None if not cached
+        """
+        with self.lock:
+            self._open()
+            if last_updated is None:
+                row = self.conn.execute(
+                    "SELECT last_updated, mainboard, commanders FROM decks WHERE public_id = ? "
+                    "ORDER BY fetched_at DESC LIMIT 1", (public_id,)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT last_updated, mainboard, commanders FROM decks WHERE public_id = ? AND last_updated = ?",
+                    (public_id, last_updated)
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.conn.execute("UPDATE decks SET accessed_at = ? WHERE public_id = ? AND last_updated = ?",
+                              (time.time(), public_id, row[0]))
+            self.conn.commit()
+            return [[self.cards[card_id] for card_id in array('i', board)] for board in row[1:]]
+
+    def put(self, public_id, last_updated, boards):
+        """
+        Cache a downloaded deck, replacing older versions of it.
+
+        Args:
+            public_id (str): The public ID of the deck
+            last_updated (str): The deck's lastUpdatedAtUtc, None if unknown
+            boards (list): The deck's boards (see DeckDecoder.decode_deck)
+        """
+        with self.lock:
+            self._open()
+            packed = [array('i', (self._card_id(*card) for card in cards)).tobytes() for cards in boards]
+            now = time.time()
+            self.conn.execute("DELETE FROM decks WHERE public_id = ?", (public_id,))
+            self.conn.execute(
+                "INSERT INTO decks (public_id, last_updated, fetched_at, accessed_at, size, mainboard, commanders) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (public_id, last_updated or '', now, now, sum(map(len, packed)), packed[0], packed[1])
+            )
+            self.conn.commit()
+
+    def evict(self, max_bytes=None, max_age=None):
+        """
+        Remove entries not used for max_age seconds, then the least recently used ones
+        until the packed decks take at most max_bytes.
+
+        Returns:
+            int: Number of decks removed
+        """
+        with self.lock:
+            self._open()
+            removed = 0
+            if max_age:
+                removed += self.conn.execute("DELETE FROM decks WHERE accessed_at < ?",
+                                             (time.time() - max_age,)).rowcount
+
+            excess = self.nbytes() - max_bytes if max_bytes else 0
+            if excess > 0:
+                doomed = []
+                for rowid, size in self.conn.execute("SELECT rowid, size FROM decks ORDER BY accessed_at"):
+                    if excess <= 0:
+                        break
+                    doomed.append((rowid,))
+                    excess -= size
+                self.conn.executemany("DELETE FROM decks WHERE rowid = ?", doomed)
+                removed += len(doomed)
+            self.conn.commit()
+
+        if removed:
+            print(f"Evicted {removed} decks from {self.path}")
+        return removed
+
+    def nbytes(self):
+        """Size of the packed decks in bytes"""
+        with self.lock:
+            self._open()
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM decks").fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            self._open()
+            return self.conn.execute("SELECT COUNT(*) FROM decks").fetchone()[0]
+
+    def describe(self):
+        return (f"{self.hits} hits, {self.misses} misses, "
+                f"{len(self)} decks ({self.nbytes() / (1024 * 1024):.1f} MB) in {self.path}")
+
+
+class CardMetadataCache:
+    """
+    Persistent card metadata (type, type_line, mana cost) keyed by normalized card name.
+
+    One SQLite file is shared by every output directory next to it, so a card's type is
+    known once any collection has seen it. It is filled as decks are collected and as
+    analysis merges card metadata, and also holds the types set by hand for auto-includes
+    (manual_type), which win over the type taken from type_line.
+
+    Rows are loaded into dicts on the first lookup, after that lookups are dict reads and
+    only new or changed cards are written.
+    """
+
+    FILENAME = "card_metadata.sqlite"
+    _shared = {}  # absolute path -> CardMetadataCache
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database file
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = None
+        self.card_types = None  # name -> type from type_line, None until loaded
+        self.manual_types = None  # name -> type set by hand
+        self.mana_costs = None  # name -> mana cost
+
+    @classmethod
+    def default_path(cls, output_dir):
+        """Cache path shared by output_dir and its sibling output directories"""
+        return os.path.join(os.path.dirname(os.path.abspath(output_dir)), cls.FILENAME)
+
+    @classmethod
+    def shared(cls, path):
+        """The cache for path, one instance (and connection) per file in this process"""
+        path = os.path.abspath(path)
+        with cls._shared_lock:
+            cache = cls._shared.get(path)
+            if cache is None:
+                cache = cls._shared[path] = cls(path)
+            return cache
+
+    def _load(self):
+        """Open the database and read every row (caller holds the lock)"""
+        if self.card_types is not None:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS card_metadata (
+                name TEXT PRIMARY KEY,
+                card_type TEXT,
+                type_line TEXT,
+                mana_cost TEXT,
+                manual_type TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self.card_types, self.manual_types, self.mana_costs = {}, {}, {}
+        for name, card_type, mana_cost, manual_type in self.conn.execute(
+                "SELECT name, card_type, mana_cost, manual_type FROM card_metadata"):
+            name = sys.intern(name)
+            if card_type:
+                self.card_types[name] = card_type
+            if mana_cost:
+                self.mana_costs[name] = mana_cost
+            if manual_type:
+                self.manual_types[name] = manual_type
+        print(f"Loaded metadata of {len(self.card_types)} cards from {self.path}")
+
+    def card_type(self, name, default="Unknown"):
+        """Type of a card: the manual type if set, else the type from its type_line"""
+        with self.lock:
+            self._load()
+            return self.manual_types.get(name) or self.card_types.get(name, default)
+
+    def manual_type(self, name, default="Unknown"):
+        """Type of a card set by hand, without the type_line fallback of card_type()"""
+        with self.lock:
+            self._load()
+            return self.manual_types.get(name, default)
+
+    def mana_cost(self, name, default=''):
+        with self.lock:
+            self._load()
+            return self.mana_costs.get(name, default)
+
+    def record(self, cards):
+        """
+        Add the metadata of scraped cards. The first type seen and the last mana cost seen are kept.
+
+        Args:
+            cards (iterable): (normalized name, type_line, mana_cost) tuples
+        """
+        with self.lock:
+            self._load()
+            rows = []
+            for name, type_line, mana_cost in cards:
+                new_type = name not in self.card_types and type_line
+                new_cost = mana_cost and self.mana_costs.get(name) != mana_cost
+                if new_type or new_cost:
+                    card_type = MoxfieldAnalyzer.get_card_type(type_line) if new_type else None
+                    rows.append((name, card_type, type_line if new_type else None, mana_cost or None))
+                    if new_type:
+                        self.card_types[name] = card_type
+                    if new_cost:
+                        self.mana_costs[name] = mana_cost
+            self._write(rows)
+
+    def update(self, card_types, card_mana_costs):
+        """
+        Add types and mana costs that are already split out (e.g. from an analysis state).
+
+        Args:
+            card_types (dict): name -> type, only added for cards without a type
+            card_mana_costs (dict): name -> mana cost, replaces the cached cost
+        """
+        with self.lock:
+            self._load()
+            rows = {}
+            for name, card_type in card_types.items():
+                if name not in self.card_types and card_type:
+                    self.card_types[name] = card_type
+                    rows[name] = [name, card_type, None, None]
+            for name, mana_cost in card_mana_costs.items():
+                if mana_cost and self.mana_costs.get(name) != mana_cost:
+                    self.mana_costs[name] = mana_cost
+                    rows.setdefault(name, [name, None, None, None])[3] = mana_cost
+            self._write(list(rows.values()))
+
+    def _write(self, rows):
+        """Upsert (name, card_type, type_line, mana_cost) rows, None keeps the stored value (caller holds the lock)"""
+        if not rows:
+            return
+        now = time.time()
+        self.conn.executemany("""
+            INSERT INTO card_metadata (name, card_type, type_line, mana_cost, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                card_type = COALESCE(card_type, excluded.card_type),
+                type_line = COALESCE(type_line, excluded.type_line),
+                mana_cost = COALESCE(excluded.mana_cost, mana_cost),
+                updated_at = excluded.updated_at
+        """, [(*row, now) for row in rows])
+        self.conn.commit()
+
+    def set_manual_type(self, name, card_type, overwrite=True):
+        """
+        Set a card's type by hand, "Unknown" (or None) clears it.
+
+        Args:
+            name (str): Normalized card name
+            card_type (str): The card's type
+            overwrite (bool): Replace a manual type that is already set
+        """
+        card_type = None if card_type in (None, "", "Unknown") else card_type
+        with self.lock:
+            self._load()
+            if not overwrite and name in self.manual_types:
+                return
+            if card_type is None:
+                self.manual_types.pop(name, None)
+            else:
+                self.manual_types[name] = card_type
+            self.conn.execute("""
+                INSERT INTO card_metadata (name, manual_type, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET manual_type = excluded.manual_type, updated_at = excluded.updated_at
+            """, (name, card_type, time.time()))
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            self._load()
+            return len(self.card_types.keys() | self.manual_types.keys() | self.mana_costs.keys())
+
+
+def split_shards(items, shard_count):
+    """Split a list into up to shard_count contiguous shards of similar size"""
+    size = max(1, -(-len(items) // max(1, shard_count)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def map_in_processes(func, shards, workers):
+    """
+    Run func over each shard in a pool of worker processes.
+
+    Returns:
+        list: The results in shard order, so merging them gives the same result as a serial run
+    """
+    return list(iter_in_processes(func, shards, workers))
+
+
+def iter_in_processes(func, shards, workers):
+    """
+    Run func over each shard in a pool of worker processes, yielding results as they are consumed.
+
+    Yields:
+        The result of each shard, in shard order
+    """
+    # Spawn rather than fork, forking a process that runs Tk and network threads isn't safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        yield from executor.map(func, shards)
+
+
+def _parse_decklist_shard(shard):
+    """Worker: parse decklist files into (filename, public_id, boards), boards is None on errors"""
+    paths, decoder = shard
+    results = []
+    for path in paths:
+        filename = os.path.basename(path)
+        try:
+            with open(path, 'rb') as f:
+                boards = decoder.decode_deck(f.read())
+        except ValueError:
+            boards = None
+        results.append((filename, filename[:-len('.json')], boards))
+    return results
+
+
+def _analyze_deck_shard(shard):
+    """Worker: extract the cards of a shard of stored decks, see MoxfieldAnalyzer.extract_decks"""
+    store_path, row_ids = shard
+    store = DeckStore(store_path, read_only=True)
+    try:
+        return MoxfieldAnalyzer.extract_decks(store.iter_decks(row_ids=row_ids))
+    finally:
+        store.close()
+
+
+class CardDictionary:
+    """
+    Dense int32 IDs for normalized card names.
+
+    IDs are handed out in first-seen order and never reused, so arrays of IDs stay valid
+    while the dictionary grows. Names are only needed again when results are exported.
+    """
+
+    def __init__(self, names=()):
+        self.names = []  # card ID -> name
+        self.ids = {}  # name -> card ID
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """Get the ID of a card, assigning the next free ID to new cards"""
+        card_id = self.ids.get(name)
+        if card_id is None:
+            card_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return card_id
+
+    def encode(self, names):
+        """Encode a deck as a sorted array of card IDs"""
+        return array('i', sorted({self.add(name) for name in names}))
+
+    def lookup(self, names):
+        """Get the sorted IDs of the given names, leaving out cards that are not in the dictionary"""
+        return np.array(sorted({self.ids[name] for name in names if name in self.ids}), dtype=np.int32)
+
+    def decode(self, card_ids):
+        """Resolve card IDs back to names"""
+        names = self.names
+        return [names[card_id] for card_id in card_ids]
+
+
+def save_arrays(directory, arrays):
+    """
+    Save numpy arrays as .npy files, each replaced atomically.
+
+    Args:
+        directory (str): Directory to save the arrays in
+        arrays (dict): name -> array
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        path = os.path.join(directory, f"{name}.npy")
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, np.asarray(values))
+        os.replace(f"{path}.tmp", path)
+
+
+def load_arrays(directory, names, sizes=None):
+    """
+    Load .npy files saved by save_arrays, memory-mapped.
+
+    Args:
+        directory (str): Directory the arrays were saved in
+        names (iterable): Names of the arrays
+        sizes (dict): Expected length of each array, checked when given
+
+    Returns:
+        dict: name -> read-only memory-mapped array
+
+    Raises:
+        OSError: If a file is missing or unreadable
+        ValueError: If a file is corrupt or doesn't have the expected length
+    """
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in names}
+    # An interrupted save can leave arrays that don't belong together
+    for name, size in (sizes or {}).items():
+        if len(arrays[name]) != size:
+            raise ValueError(f"{name}.npy has {len(arrays[name])} entries, expected {size}")
+    return arrays
+
+
+class DeckCorpus:
+    """
+    Compact, read-only collection of decks.
+
+    Every deck is a sorted run of int32 card IDs in one shared array (CSR layout: the cards of
+    deck d are indices[indptr[d]:indptr[d + 1]]), instead of a set of name strings per deck.
+    Iterating still yields each deck as a set of names for code that wants names.
+
+    The arrays can be saved and loaded memory-mapped, so the decks stay on disk and only the
+    pages that are read get loaded.
+    """
+
+    ARRAYS = ('indptr', 'indices')
+
+    def __init__(self, cards, decks):
+        """
+        Args:
+            cards (CardDictionary): Dictionary the card IDs refer to
+            decks (iterable): Sorted array('i') of card IDs, one per deck
+        """
+        self.cards = cards
+
+        indptr = array('q', [0])
+        indices = array('i')
+        for deck in decks:
+            indices.extend(deck)
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+
+    @classmethod
+    def from_decks(cls, decks, cards=None):
+        """Build a corpus from collections of card names"""
+        cards = cards if cards is not None else CardDictionary()
+        return cls(cards, [cards.encode(deck) for deck in decks])
+
+    @classmethod
+    def from_arrays(cls, cards, indptr, indices):
+        """Wrap existing CSR arrays (e.g. memory-mapped ones) without copying them"""
+        corpus = cls(cards, ())
+        corpus.indptr = indptr
+        corpus.indices = indices
+        return corpus
+
+    def save(self, directory):
+        """Save the CSR arrays to directory"""
+        save_arrays(directory, {name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, directory, cards, deck_count):
+        """
+        Load a saved corpus memory-mapped.
+
+        Args:
+            directory (str): Directory the corpus was saved in
+            cards (CardDictionary): Dictionary the card IDs refer to
+            deck_count (int): Number of decks the corpus should have
+
+        Raises:
+            OSError: If the arrays are missing or unreadable
+            ValueError: If the arrays are corrupt or don't hold deck_count decks
+        """
+        arrays = load_arrays(directory, cls.ARRAYS, sizes={'indptr': deck_count + 1})
+        if int(arrays['indptr'][-1]) != len(arrays['indices']):
+            raise ValueError(f"indices.npy has {len(arrays['indices'])} entries, expected {arrays['indptr'][-1]}")
+        return cls.from_arrays(cards, arrays['indptr'], arrays['indices'])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __iter__(self, chunk_size=1024):
+        # Convert a chunk of decks at a time, so a memory-mapped corpus isn't loaded all at once
+        names = self.cards.names
+        for start in range(0, len(self), chunk_size):
+            indptr = self.indptr[start:start + chunk_size + 1].tolist()
+            indices = self.indices[indptr[0]:indptr[-1]].tolist()
+            offset = indptr[0]
+            for deck_start, deck_stop in zip(indptr, indptr[1:]):
+                yield {names[card_id] for card_id in indices[deck_start - offset:deck_stop - offset]}
+
+    def deck(self, deck):
+        """Card IDs of one deck"""
+        return self.indices[self.indptr[deck]:self.indptr[deck + 1]]
+
+    def deck_sizes(self):
+        return np.diff(self.indptr)
+
+    def overlap_counts(self, card_ids):
+        """
+        Count how many of the given cards each deck contains.
+
+        Args:
+            card_ids (array): Distinct card IDs
+
+        Returns:
+            ndarray: Number of the cards in each deck
+        """
+        wanted = np.zeros(len(self.cards), dtype=bool)
+        wanted[card_ids] = True
+        hits = np.concatenate([[0], np.cumsum(wanted[self.indices], dtype=np.int64)])
+        return hits[self.indptr[1:]] - hits[self.indptr[:-1]]
+
+    def card_counts(self, deck_mask=None):
+        """
+        Count the decks containing each card.
+
+        Args:
+            deck_mask (ndarray): Boolean mask of the decks to count (all decks if None)
+
+        Returns:
+            ndarray: Number of selected decks containing each card, indexed by card ID
+        """
+        indices = self.indices
+        if deck_mask is not None:
+            indices = indices[np.repeat(deck_mask, self.deck_sizes())]
+        return np.bincount(indices, minlength=len(self.cards))
+
+
+class CooccurrenceEngine:
+    """
+    Vectorized card co-occurrence and synergy computation.
+
+    The decks of a DeckCorpus are the rows of a sparse deck x card incidence matrix X,
+    so X^T X holds the number of decks containing each pair of cards. Uses scipy.sparse
+    when available and a chunked numpy pair count otherwise.
+    """
+
+    def __init__(self, corpus):
+        """
+        Args:
+            corpus (DeckCorpus): The decks to analyse
+        """
+        self.card_names = corpus.cards.names
+        self.indptr = corpus.indptr
+        self.indices = corpus.indices
+
+    @classmethod
+    def from_decks(cls, decks):
+        """Build an engine from collections of distinct card names, one per deck"""
+        return cls(DeckCorpus.from_decks(decks))
+
+    @property
+    def deck_count(self):
+        return len(self.indptr) - 1
+
+    def card_frequency(self):
+        """Number of decks containing each card, indexed by card ID"""
+        return np.bincount(self.indices, minlength=len(self.card_names))
+
+    def pair_counts(self):
+        """
+        Count the decks containing each pair of cards.
+
+        Returns:
+            tuple: (card1_ids, card2_ids, counts) arrays with card1_ids < card2_ids
+        """
+        blocks = list(self.iter_pair_counts())
+        if not blocks:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        return tuple(np.concatenate(arrays) for arrays in zip(*blocks))
+
+    def iter_pair_counts(self, block_size=512):
+        """
+        Count card pairs one block of cards at a time, so memory stays bounded by the block.
+
+        Args:
+            block_size (int): Number of cards (rows of the co-occurrence matrix) per block
+
+        Yields:
+            tuple: (card1_ids, card2_ids, counts) arrays with card1_ids < card2_ids
+        """
+        if sparse.available():
+            return self._sparse_pair_counts(block_size)
+        return self._numpy_pair_counts(block_size)
+
+    def _sparse_pair_counts(self, block_size=512):
+        card_count = len(self.card_names)
+        incidence = sparse.csr_matrix(
+            (np.ones(len(self.indices), dtype=np.int32), self.indices, self.indptr),
+            shape=(self.deck_count, card_count)
+        )
+        card_decks = incidence.T.tocsr()
+        incidence = incidence.tocsc()
+
+        for start in range(0, card_count, block_size):
+            # Rows start..start+block_size of X^T X, only the columns right of the diagonal
+            block = (card_decks[start:start + block_size] @ incidence[:, start:]).tocoo()
+            card1_ids = block.row.astype(np.int64) + start
+            card2_ids = block.col.astype(np.int64) + start
+            upper = card1_ids < card2_ids
+            yield card1_ids[upper], card2_ids[upper], block.data[upper].astype(np.int64)
+
+    def _numpy_pair_counts(self, block_size=512):
+        card_count = len(self.card_names)
+        deck_sizes = np.diff(self.indptr)
+
+        # Inverted index: the decks containing card c are card_decks[card_indptr[c]:card_indptr[c + 1]]
+        deck_of_entry = np.repeat(np.arange(self.deck_count, dtype=np.int64), deck_sizes)
+        order = np.argsort(self.indices, kind='stable')
+        card_decks = deck_of_entry[order]
+        card_indptr = np.concatenate([[0], np.cumsum(np.bincount(self.indices, minlength=card_count))])
+
+        for start in range(0, card_count, block_size):
+            card1_blocks, card2_blocks, count_blocks = [], [], []
+            for card1 in range(start, min(start + block_size, card_count)):
+                decks = card_decks[card_indptr[card1]:card_indptr[card1 + 1]]
+                # Gather the cards of every deck containing card1 and count them
+                sizes = deck_sizes[decks]
+                offsets = np.repeat(self.indptr[decks] - np.cumsum(sizes) + sizes, sizes)
+                neighbours = self.indices[offsets + np.arange(len(offsets))]
+                counts = np.bincount(neighbours, minlength=card_count)[card1 + 1:]
+
+                card2_ids = np.flatnonzero(counts)
+                card1_blocks.append(np.full(len(card2_ids), card1, dtype=np.int64))
+                card2_blocks.append(card2_ids + card1 + 1)
+                count_blocks.append(counts[card2_ids])
+
+            yield np.concatenate(card1_blocks), np.concatenate(card2_blocks), np.concatenate(count_blocks)
+
+    def synergy_matrix(self, threshold=0.1):
+        """
+        Calculate Jaccard synergy scores for every pair of cards.
+
+        Args:
+            threshold (float): Only scores above this are kept
+
+        Returns:
+            defaultdict: card -> {related card -> synergy score}, stored in both directions
+        """
+        synergy_matrix = defaultdict(dict)
+        card_names = self.card_names
+
+        for card1_ids, card2_ids, scores in self.iter_synergy_pairs(threshold):
+            for card1_id, card2_id, score in zip(card1_ids.tolist(), card2_ids.tolist(), scores.tolist()):
+                card1 = card_names[card1_id]
+                card2 = card_names[card2_id]
+                synergy_matrix[card1][card2] = score
+                synergy_matrix[card2][card1] = score
+
+        return synergy_matrix
+
+    def block_size_for(self, memory_budget, bytes_per_pair=48):
+        """Cards per pair count block, so a block of every pair of its cards fits in memory_budget"""
+        if memory_budget is None:
+            return 512
+        return int(max(16, min(512, memory_budget // max(1, len(self.card_names) * bytes_per_pair))))
+
+    def iter_synergy_pairs(self, threshold=0.1, block_size=512):
+        """
+        Jaccard synergy scores above threshold, one block of cards at a time.
+
+        Yields:
+            tuple: (card1_ids, card2_ids, scores) arrays with card1_ids < card2_ids
+        """
+        frequency = self.card_frequency()
+        for card1_ids, card2_ids, both in self.iter_pair_counts(block_size):
+            # Jaccard index: decks with both cards relative to decks with either card
+            total = frequency[card1_ids] + frequency[card2_ids] - both
+            scores = both / total
+            keep = scores > threshold
+            yield card1_ids[keep], card2_ids[keep], scores[keep]
+
+    def synergy_index(self, threshold=0.1, k=None, memory_budget=None, spill_dir=None):
+        """
+        Calculate Jaccard synergy scores and keep the top k neighbours of every card.
+
+        Args:
+            threshold (float): Only scores above this are kept
+            k (int): Neighbours kept per card, None keeps every neighbour above the threshold
+            memory_budget (int): Bytes of pairs to hold in memory before spilling to disk, None for no limit
+            spill_dir (str): Directory for spilled pairs, a temporary directory if None
+
+        Returns:
+            SynergyIndex: Neighbours of every card, most synergistic first
+        """
+        with PairSpill(memory_budget, spill_dir) as pairs:
+            for block in self.iter_synergy_pairs(threshold, self.block_size_for(memory_budget)):
+                pairs.append(*block)
+            return SynergyIndex.from_pair_blocks(self.card_names, pairs, threshold=threshold, k=k,
+                                                 memory_budget=memory_budget, spill_dir=spill_dir)
+
+
+class PairSpill:
+    """
+    Buffer of card pair blocks that spills to disk once it outgrows a memory budget.
+
+    Blocks are (card1_ids, card2_ids, values) arrays. Iterating yields every block in the
+    order it was appended, spilled ones memory-mapped from disk. Spill files are removed
+    when the buffer is closed.
+    """
+
+    def __init__(self, memory_budget=None, spill_dir=None):
+        """
+        Args:
+            memory_budget (int): Bytes of blocks to keep in memory, None to never spill
+            spill_dir (str): Directory for spill files, a temporary directory if None
+        """
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.blocks = []  # In memory, or the path prefix of a spilled block
+        self.memory_size = 0
+        self.spill_paths = []
+        self.temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, card1_ids, card2_ids, values):
+        """Add a block of pairs"""
+        block = (card1_ids.astype(np.int32), card2_ids.astype(np.int32), values)
+        self.blocks.append(block)
+        self.memory_size += sum(array.nbytes for array in block)
+        if self.memory_budget is not None and self.memory_size > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """Write the blocks held in memory to disk"""
+        if self.spill_dir is None and self.temp_dir is None:
+            self.temp_dir = tempfile.mkdtemp(prefix="pair_spill_")
+        directory = self.spill_dir or self.temp_dir
+        os.makedirs(directory, exist_ok=True)
+
+        for i, block in enumerate(self.blocks):
+            if isinstance(block, str):
+                continue
+            prefix = os.path.join(directory, f"pairs_{id(self)}_{len(self.spill_paths)}")
+            for name, array in zip(('card1', 'card2', 'values'), block):
+                np.save(f"{prefix}_{name}.npy", array)
+                self.spill_paths.append(f"{prefix}_{name}.npy")
+            self.blocks[i] = prefix
+        self.memory_size = 0
+        print(f"Spilled pair blocks to {directory} ({len(self.spill_paths) // 3} on disk)")
+
+    def __iter__(self):
+        for block in self.blocks:
+            if isinstance(block, str):
+                block = tuple(np.load(f"{block}_{name}.npy", mmap_mode='r') for name in ('card1', 'card2', 'values'))
+            yield block
+
+    def close(self):
+        """Remove the spill files"""
+        self.blocks = []
+        for path in self.spill_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.spill_paths = []
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch of integer keys.
+
+    Every key is counted in one cell of each of depth rows of width counters. The estimate
+    is the smallest of its cells: never below the true count, and with probability
+    1 - delta at most epsilon x (total of all counts) above it.
+    """
+
+    def __init__(self, epsilon=1e-5, delta=0.01, seed=0):
+        """
+        Args:
+            epsilon (float): Error bound, relative to the total of all counts
+            delta (float): Probability of exceeding the error bound
+            seed (int): Seed of the hash functions
+        """
+        self.epsilon = epsilon
+        self.delta = delta
+        # Width rounded up to a power of two, so multiply-shift hashing can pick the cell
+        self.width_bits = max(1, int(np.ceil(np.log2(np.e / epsilon))))
+        self.width = 1 << self.width_bits
+        self.depth = max(1, int(np.ceil(np.log(1 / delta))))
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(1, 2 ** 63, size=self.depth, dtype=np.uint64) | np.uint64(1)
+        self.offsets = rng.integers(0, 2 ** 63, size=self.depth, dtype=np.uint64)
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.total = 0
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def cells(self, row, keys):
+        """Cell of each key in one row"""
+        hashed = keys.astype(np.uint64) * self.multipliers[row] + self.offsets[row]
+        return (hashed >> np.uint64(64 - self.width_bits)).astype(np.int64)
+
+    def add(self, keys):
+        """Count each key once"""
+        keys = np.asarray(keys)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(self.cells(row, keys), minlength=self.width).astype(np.uint32)
+        self.total += len(keys)
+
+    def query(self, keys):
+        """Estimated count of each key"""
+        keys = np.asarray(keys)
+        estimate = np.full(len(keys), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for row in range(self.depth):
+            np.minimum(estimate, self.table[row][self.cells(row, keys)], out=estimate)
+        return estimate.astype(np.int64)
+
+    def error_bound(self):
+        """Maximum overestimate of any count, with probability 1 - delta"""
+        return self.epsilon * self.total
+
+
+class ApproximateCooccurrenceEngine(CooccurrenceEngine):
+    """
+    Approximate card co-occurrence and synergy for corpora too big to count every pair.
+
+    Every card gets a MinHash signature: for each of num_perm hash functions over the deck
+    numbers, the smallest hash among the decks containing the card. Two cards have the same
+    value in a signature row with probability equal to their Jaccard synergy, so the share of
+    equal rows estimates it with a standard error of sqrt(J (1 - J) / num_perm). Only cards
+    sharing a value (cards in the deck with the smallest hash) are compared, so the work grows
+    with the number of synergistic pairs rather than with every pair of cards.
+
+    Pair counts (decks containing both cards) come from a Count-Min sketch of every pair
+    in every deck, built on first use.
+    """
+
+    def __init__(self, corpus, num_perm=128, epsilon=1e-5, delta=0.01, seed=0):
+        """
+        Args:
+            corpus (DeckCorpus): The decks to analyse
+            num_perm (int): MinHash signature length, more is more accurate and uses more memory
+            epsilon (float): Count-Min error bound, relative to the total number of card pairs
+            delta (float): Probability of a pair count exceeding the Count-Min error bound
+            seed (int): Seed of the hash functions
+        """
+        super().__init__(corpus)
+        self.num_perm = num_perm
+        self.epsilon = epsilon
+        self.delta = delta
+        self.seed = seed
+        self._signatures = None
+        self._count_min = None
+
+    def signatures(self):
+        """MinHash signatures, a num_perm x cards array (the maximum value for unused cards)"""
+        if self._signatures is None:
+            card_count = len(self.card_names)
+            frequency = self.card_frequency()
+            used = np.flatnonzero(frequency)
+            card_starts = (np.cumsum(frequency) - frequency)[used]
+            # Deck of every entry, grouped by card
+            deck_of_entry = np.repeat(np.arange(self.deck_count, dtype=np.uint64), np.diff(self.indptr))
+            card_decks = deck_of_entry[np.argsort(self.indices, kind='stable')]
+            del deck_of_entry
+
+            rng = np.random.default_rng(self.seed)
+            multipliers = rng.integers(1, 2 ** 63, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+            offsets = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+            signatures = np.full((self.num_perm, card_count), np.iinfo(np.uint32).max, dtype=np.uint32)
+            for row in range(self.num_perm):
+                hashed = ((card_decks * multipliers[row] + offsets[row]) >> np.uint64(32)).astype(np.uint32)
+                if len(used):
+                    signatures[row, used] = np.minimum.reduceat(hashed, card_starts)
+            self._signatures = signatures
+        return self._signatures
+
+    def count_min(self):
+        """Count-Min sketch of the pairs of cards in every deck, built on first use"""
+        if self._count_min is None:
+            sketch = CountMinSketch(self.epsilon, self.delta, self.seed)
+            card_count = len(self.card_names)
+            keys = []
+            pending = 0
+            for deck in range(self.deck_count):
+                cards = self.indices[self.indptr[deck]:self.indptr[deck + 1]].astype(np.int64)
+                first, second = np.triu_indices(len(cards), 1)
+                keys.append(cards[first] * card_count + cards[second])
+                pending += len(first)
+                if pending >= 1 << 20:
+                    sketch.add(np.concatenate(keys))
+                    keys, pending = [], 0
+            if keys:
+                sketch.add(np.concatenate(keys))
+            self._count_min = sketch
+        return self._count_min
+
+    def memory_size(self):
+        """Bytes taken by the signatures and, if built, the Count-Min sketch"""
+        size = self.num_perm * len(self.card_names) * np.dtype(np.uint32).itemsize
+        if self._count_min is not None:
+            size += self._count_min.nbytes
+        return size
+
+    def candidate_pairs(self, threshold=0.0, batch_size=1 << 22):
+        """
+        Pairs of cards sharing at least one signature value, with the number of rows they share.
+
+        Args:
+            threshold (float): Skip pairs whose synergy can't exceed this, a pair of cards in
+                               f1 <= f2 decks has a Jaccard index of at most f1 / f2
+            batch_size (int): Collisions collected before they are merged into the counts
+
+        Returns:
+            tuple: (card1_ids, card2_ids, shared_rows) arrays with card1_ids < card2_ids
+        """
+        card_count = len(self.card_names)
+        signatures = self.signatures()
+        frequency = self.card_frequency()
+        used = np.flatnonzero(frequency)
+        keys = np.zeros(0, dtype=np.int64)
+        shared = np.zeros(0, dtype=np.int64)
+        pending = []
+        pending_size = 0
+
+        def merge():
+            # Fold the pending collisions into the running counts
+            merged_keys, inverse = np.unique(np.concatenate([keys] + pending), return_inverse=True)
+            weights = np.concatenate([shared, np.ones(pending_size, dtype=np.int64)])
+            return merged_keys, np.bincount(inverse, weights=weights, minlength=len(merged_keys)).astype(np.int64)
+
+        for row in range(self.num_perm):
+            # Group the cards by signature value, every pair within a group is a collision
+            order = used[np.argsort(signatures[row, used], kind='stable')]
+            values = signatures[row, order]
+            group_starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+            group_sizes = np.diff(np.append(group_starts, len(values)))
+            group_ends = np.repeat(group_starts + group_sizes, group_sizes)
+            partners = group_ends - np.arange(len(values)) - 1
+            first = np.repeat(np.arange(len(values)), partners)
+            second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+            card1_ids = np.minimum(order[first], order[second])
+            card2_ids = np.maximum(order[first], order[second])
+            if threshold > 0:
+                frequency1, frequency2 = frequency[card1_ids], frequency[card2_ids]
+                possible = np.minimum(frequency1, frequency2) > threshold * np.maximum(frequency1, frequency2)
+                card1_ids, card2_ids = card1_ids[possible], card2_ids[possible]
+
+            pending.append(card1_ids * card_count + card2_ids)
+            pending_size += len(card1_ids)
+            if pending_size >= batch_size:
+                keys, shared = merge()
+                pending, pending_size = [], 0
+
+        if pending:
+            keys, shared = merge()
+        return keys // card_count, keys % card_count, shared
+
+    def iter_pair_counts(self, block_size=512):
+        """
+        Estimated decks containing each candidate pair of cards, from the Count-Min sketch.
+
+        Yields:
+            tuple: (card1_ids, card2_ids, counts) arrays with card1_ids < card2_ids
+        """
+        card1_ids, card2_ids, _ = self.candidate_pairs()
+        sketch = self.count_min()
+        counts = sketch.query(card1_ids * len(self.card_names) + card2_ids)
+        # A pair is never in more decks than either of its cards
+        frequency = self.card_frequency()
+        counts = np.minimum(counts, np.minimum(frequency[card1_ids], frequency[card2_ids]))
+        for start in range(0, len(self.card_names), block_size):
+            block = (card1_ids >= start) & (card1_ids < start + block_size)
+            yield card1_ids[block], card2_ids[block], counts[block]
+
+    def iter_synergy_pairs(self, threshold=0.1, block_size=512):
+        """
+        MinHash estimates of the Jaccard synergy scores above threshold.
+
+        Yields:
+            tuple: (card1_ids, card2_ids, scores) arrays with card1_ids < card2_ids
+        """
+        card1_ids, card2_ids, shared = self.candidate_pairs(threshold)
+        scores = shared / self.num_perm
+        keep = scores > threshold
+        card1_ids, card2_ids, scores = card1_ids[keep], card2_ids[keep], scores[keep]
+        for start in range(0, len(self.card_names), block_size):
+            block = (card1_ids >= start) & (card1_ids < start + block_size)
+            yield card1_ids[block], card2_ids[block], scores[block]
+
+
+class SynergyIndex:
+    """
+    Top-k synergy neighbours of every card in CSR arrays.
+
+    The neighbours of card i are neighbours[indptr[i]:indptr[i + 1]] with their Jaccard
+    scores in the same slice of scores, most synergistic first and equal scores by card ID.
+    The old dict-of-dicts matrix kept equal scores in set iteration order, which changed
+    with the string hash seed, so rows with ties can list them in a different order than
+    it did (and the candidates they feed can then rank ties differently). The arrays are saved as .npy
+    files and loaded memory-mapped, so an unchanged analysis doesn't rebuild or even read
+    the whole index.
+
+    Rows can be read like the old dict-of-dicts synergy matrix: index[card] and
+    index.get(card) give a {related card: score} dict.
+    """
+
+    VERSION = 1  # Bump when the saved format changes
+    ARRAYS = ('indptr', 'neighbours', 'scores')
+
+    def __init__(self, card_names, indptr, neighbours, scores, threshold=0.1, k=None, fingerprint=None):
+        """
+        Args:
+            card_names (list): Card name of each card ID
+            indptr (ndarray): Row offsets into neighbours and scores, one row per card
+            neighbours (ndarray): Card IDs of the neighbours
+            scores (ndarray): Synergy score of each neighbour
+            threshold (float): Scores at or below this were dropped
+            k (int): Neighbours kept per card, None if all were kept
+            fingerprint (str): Identifies the analysed decks the index was built from
+        """
+        self.card_names = card_names
+        self.positions = {card: card_id for card_id, card in enumerate(card_names)}
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.scores = scores
+        self.threshold = threshold
+        self.k = k
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_pairs(cls, card_names, card1_ids, card2_ids, scores, threshold=0.1, k=None, fingerprint=None):
+        """
+        Build an index from synergy pairs, each stored once.
+
+        Args:
+            card_names (list): Card name of each card ID
+            card1_ids (ndarray): First card of each pair
+            card2_ids (ndarray): Second card of each pair
+            scores (ndarray): Synergy score of each pair
+            threshold (float): Threshold the pairs were filtered with
+            k (int): Neighbours to keep per card, None keeps all
+            fingerprint (str): Identifies the analysed decks
+
+        Returns:
+            SynergyIndex: The index
+        """
+        return cls.from_pair_blocks(card_names, [(card1_ids, card2_ids, scores)], threshold=threshold, k=k,
+                                    fingerprint=fingerprint)
+
+    @classmethod
+    def from_pair_blocks(cls, card_names, blocks, threshold=0.1, k=None, fingerprint=None,
+                         memory_budget=None, spill_dir=None):
+        """
+        Build an index from blocks of synergy pairs, each pair stored once.
+
+        The blocks are read twice (count, then place), so they can be a PairSpill on disk.
+        The arrays are built in place, in memory-mapped files when they are larger than the
+        memory budget, and sorted a memory budget's worth of rows at a time.
+
+        Args:
+            card_names (list): Card name of each card ID
+            blocks (iterable): (card1_ids, card2_ids, scores) arrays, can be iterated more than once
+            threshold (float): Threshold the pairs were filtered with
+            k (int): Neighbours to keep per card, None keeps all
+            fingerprint (str): Identifies the analysed decks
+            memory_budget (int): Bytes the index arrays may take in memory, None for no limit
+            spill_dir (str): Directory for the memory-mapped arrays, a temporary directory if None
+
+        Returns:
+            SynergyIndex: The index
+        """
+        card_count = len(card_names)
+        counts = np.zeros(card_count, dtype=np.int64)
+        for card1_ids, card2_ids, _ in blocks:
+            counts += np.bincount(card1_ids, minlength=card_count)
+            counts += np.bincount(card2_ids, minlength=card_count)
+        indptr = np.zeros(card_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        total = int(indptr[-1])
+
+        entry_size = np.dtype(np.int32).itemsize + np.dtype(np.float64).itemsize
+        if memory_budget is not None and total * entry_size > memory_budget:
+            directory = spill_dir or tempfile.mkdtemp(prefix="synergy_index_")
+            os.makedirs(directory, exist_ok=True)
+            neighbours = np.lib.format.open_memmap(os.path.join(directory, f"neighbours_{id(blocks)}.npy"),
+                                                   mode='w+', dtype=np.int32, shape=(total,))
+            scores = np.lib.format.open_memmap(os.path.join(directory, f"scores_{id(blocks)}.npy"),
+                                               mode='w+', dtype=np.float64, shape=(total,))
+            print(f"Building synergy index of {total} entries in {directory}")
+        else:
+            neighbours = np.empty(total, dtype=np.int32)
+            scores = np.empty(total, dtype=np.float64)
+
+        # Place each pair in the rows of both its cards
+        cursor = indptr[:-1].copy()
+        for card1_ids, card2_ids, values in blocks:
+            for rows, columns in ((card1_ids, card2_ids), (card2_ids, card1_ids)):
+                order = np.argsort(rows, kind='stable')
+                rows = rows[order]
+                rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+                positions = cursor[rows] + rank
+                neighbours[positions] = columns[order]
+                scores[positions] = values[order]
+                cursor += np.bincount(rows, minlength=card_count)
+
+        # Sort every row best score first, then by card ID so ties have a fixed order, and keep the top k
+        kept = np.minimum(counts, k) if k is not None else counts
+        kept_indptr = np.zeros(card_count + 1, dtype=np.int64)
+        np.cumsum(kept, out=kept_indptr[1:])
+        chunk_entries = max(1, memory_budget // (4 * entry_size) if memory_budget is not None else total)
+        start_card = 0
+        while start_card < card_count:
+            stop_card = int(np.searchsorted(indptr, indptr[start_card] + chunk_entries, side='right')) - 1
+            stop_card = min(max(stop_card, start_card + 1), card_count)
+            start, stop = int(indptr[start_card]), int(indptr[stop_card])
+            rows = np.repeat(np.arange(start_card, stop_card), counts[start_card:stop_card])
+            chunk_neighbours = np.array(neighbours[start:stop])
+            chunk_scores = np.array(scores[start:stop])
+            order = np.lexsort((chunk_neighbours, -chunk_scores, rows))
+            keep = order[np.arange(len(order)) - (indptr[rows] - start) < kept[rows]]
+            # Kept rows never start after their unsorted position, so writing forward is safe
+            kept_start, kept_stop = int(kept_indptr[start_card]), int(kept_indptr[stop_card])
+            neighbours[kept_start:kept_stop] = chunk_neighbours[keep]
+            scores[kept_start:kept_stop] = chunk_scores[keep]
+            start_card = stop_card
+
+        kept_total = int(kept_indptr[-1])
+        return cls(list(card_names), kept_indptr, neighbours[:kept_total], scores[:kept_total],
+                   threshold=threshold, k=k, fingerprint=fingerprint)
+
+    def __len__(self):
+        return len(self.card_names)
+
+    def __contains__(self, card):
+        """Whether the card has any neighbours, like a key of the synergy matrix"""
+        card_id = self.positions.get(card)
+        return card_id is not None and self.indptr[card_id + 1] > self.indptr[card_id]
+
+    def __getitem__(self, card):
+        row = self.get(card)
+        if row is None:
+            raise KeyError(card)
+        return row
+
+    def get(self, card, default=None):
+        """Neighbours of a card as a {related card: score} dict, best first"""
+        if card not in self:
+            return default
+        return dict(self.most_synergistic(card))
+
+    def items(self):
+        """(card, {related card: score}) for every card with neighbours"""
+        for card in self.card_names:
+            row = self.get(card)
+            if row is not None:
+                yield card, row
+
+    def most_synergistic(self, card, limit=None):
+        """
+        Cards with the highest synergy with a card.
+
+        Args:
+            card (str): Normalized card name
+            limit (int): Maximum number of cards, None for all kept neighbours
+
+        Returns:
+            list: (card name, synergy score) tuples, best first
+        """
+        card_id = self.positions.get(card)
+        if card_id is None:
+            return []
+        start, stop = int(self.indptr[card_id]), int(self.indptr[card_id + 1])
+        if limit is not None:
+            stop = min(stop, start + limit)
+        card_names = self.card_names
+        return [(card_names[neighbour], score) for neighbour, score in
+                zip(self.neighbours[start:stop].tolist(), self.scores[start:stop].tolist())]
+
+    def save(self, directory):
+        """
+        Save the index, replacing the files one by one and the metadata last.
+
+        Args:
+            directory (str): Directory to save the index in
+        """
+        save_arrays(directory, {name: getattr(self, name) for name in self.ARRAYS})
+
+        metadata = {
+            'version': self.VERSION,
+            'threshold': self.threshold,
+            'k': self.k,
+            'fingerprint': self.fingerprint,
+            'cards': self.card_names,
+            'sizes': {name: len(getattr(self, name)) for name in self.ARRAYS}
+        }
+        path = os.path.join(directory, "index.json")
+        with open(f"{path}.tmp", 'w') as f:
+            f.write(json.dumps(metadata, separators=(',', ':')))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, directory, decoder=None):
+        """
+        Load a saved index with memory-mapped arrays.
+
+        Returns:
+            SynergyIndex: The index, or None if missing, unreadable or outdated
+        """
+        path = os.path.join(directory, "index.json")
+        if not os.path.exists(path):
+            return None
+
+        try:
+            metadata = (decoder or DeckDecoder()).load_file(path)
+            if metadata.get('version') != cls.VERSION:
+                print(f"Synergy index {directory} is outdated, rebuilding")
+                return None
+            arrays = load_arrays(directory, cls.ARRAYS, sizes=metadata['sizes'])
+        except (OSError, ValueError) as e:
+            print(f"Error loading synergy index {directory}: {e}, rebuilding")
+            return None
+
+        return cls([sys.intern(card) for card in metadata['cards']], threshold=metadata['threshold'],
+                   k=metadata['k'], fingerprint=metadata['fingerprint'], **arrays)
+
+
+class AnalysisState:
+    """
+    Persisted, mergeable analysis results.
+
+    Holds each analysed deck as a sorted array of card IDs from a CardDictionary, together
+    with the per-card deck counts built from them. Decks can be folded in or removed one at
+    a time, so a rerun only processes decks that changed since the last run. Pair counts are
+    not kept, the CooccurrenceEngine derives them from the decks faster than they could be loaded.
+
+    The decks themselves are saved as a DeckCorpus next to the state file (the deck index)
+    and loaded memory-mapped, only decks folded in since the last save are held in memory.
+    Every save writes a new generation of the deck index before the state file that refers
+    to it, so an interrupted save leaves the previous state and index intact.
+    """
+
+    VERSION = 4  # Bump when the saved format or the way deck cards are extracted changes
+    INDEX_DIR = "deck_index"  # Directory of the saved decks, next to the state file
+
+    def __init__(self):
+        self.cards = CardDictionary()
+        self.saved_decks = None  # DeckCorpus of the decks saved with the state, memory-mapped
+        self.generation = 0  # Deck index generation saved_decks was loaded from
+        self.saved_rows = {}  # public_id -> deck in saved_decks, for saved decks still in the state
+        self.new_decks = {}  # public_id -> sorted array('i') of card IDs, for decks folded in since
+        self.card_counts = array('i')  # card ID -> number of analysed decks containing the card
+        self.card_types = {}
+        self.card_mana_costs = {}
+
+    def __len__(self):
+        return len(self.saved_rows) + len(self.new_decks)
+
+    def __contains__(self, public_id):
+        return public_id in self.saved_rows or public_id in self.new_decks
+
+    def deck_ids(self):
+        """Public IDs of the analysed decks, in the order they were folded in"""
+        return list(self.saved_rows) + list(self.new_decks)
+
+    def add_deck(self, public_id, deck_cards):
+        """Fold a deck's cards (normalized names) into the counters"""
+        if public_id in self:
+            self.remove_deck(public_id)
+
+        card_ids = self.cards.encode(sorted(deck_cards))
+        self.new_decks[public_id] = card_ids
+        if len(self.card_counts) < len(self.cards):
+            self.card_counts.extend([0] * (len(self.cards) - len(self.card_counts)))
+        for card_id in card_ids:
+            self.card_counts[card_id] += 1
+
+    def remove_deck(self, public_id):
+        """Subtract a previously folded deck from the counters"""
+        card_ids = self.new_decks.pop(public_id, None)
+        if card_ids is None:
+            row = self.saved_rows.pop(public_id, None)
+            if row is None:
+                return
+            card_ids = self.saved_decks.deck(row).tolist()
+
+        for card_id in card_ids:
+            self.card_counts[card_id] -= 1
+
+    def card_frequency(self):
+        """Number of analysed decks containing each card, by name"""
+        names = self.cards.names
+        return Counter({names[card_id]: count for card_id, count in enumerate(self.card_counts) if count > 0})
+
+    def corpus(self):
+        """The analysed decks as a DeckCorpus, the saved deck index itself if nothing changed"""
+        saved = self.saved_decks
+        if saved is not None and not self.new_decks and len(self.saved_rows) == len(saved):
+            return saved
+
+        indptr = np.zeros(1, dtype=np.int64)
+        indices = np.zeros(0, dtype=np.int32)
+        if saved is not None and self.saved_rows:
+            # Saved decks are only ever removed, so the remaining ones are still in order
+            keep = np.zeros(len(saved), dtype=bool)
+            keep[list(self.saved_rows.values())] = True
+            sizes = saved.deck_sizes()
+            indices = saved.indices[np.repeat(keep, sizes)]
+            indptr = np.concatenate([indptr, np.cumsum(sizes[keep])])
+
+        new_decks = DeckCorpus(self.cards, self.new_decks.values())
+        return DeckCorpus.from_arrays(
+            self.cards,
+            np.concatenate([indptr, new_decks.indptr[1:] + indptr[-1]]),
+            np.concatenate([indices, new_decks.indices])
+        )
+
+    def fingerprint(self):
+        """Hash of the analysed deck IDs and card counts, identifies results derived from this state"""
+        digest = hashlib.sha1(str(self.VERSION).encode())
+        for public_id in sorted(self.deck_ids()):
+            digest.update(public_id.encode())
+            digest.update(b'\0')
+        # Decks replaced by a newer version keep their IDs but change the card counts
+        digest.update(self.card_counts.tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def index_dir(cls, path, generation=None):
+        """Directory the decks of the state saved at path are kept in, or of one generation of them"""
+        index_dir = os.path.join(os.path.dirname(path), cls.INDEX_DIR)
+        return index_dir if generation is None else os.path.join(index_dir, str(generation))
+
+    @classmethod
+    def load(cls, path, decoder=None):
+        """Load a saved state, or return an empty one if missing, unreadable or outdated"""
+        state = cls()
+        if not os.path.exists(path):
+            return state
+
+        try:
+            data = (decoder or DeckDecoder()).load_file(path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading analysis state {path}: {e}, rebuilding")
+            return state
+
+        if data.get('version') != cls.VERSION:
+            print(f"Analysis state {path} is outdated, rebuilding")
+            return state
+
+        # Intern names so they are the same string objects CardNameNormalizer hands out
+        cards = CardDictionary(sys.intern(name) for name in data['cards'])
+        try:
+            saved_decks = DeckCorpus.load(cls.index_dir(path, data['generation']), cards, len(data['deck_ids']))
+        except (OSError, ValueError) as e:
+            print(f"Error loading deck index of {path}: {e}, rebuilding")
+            return state
+
+        state.cards = cards
+        state.saved_decks = saved_decks
+        state.generation = data['generation']
+        state.saved_rows = {public_id: row for row, public_id in enumerate(data['deck_ids'])}
+        state.card_counts = array('i', data['card_counts'])
+        state.card_types = data['card_types']
+        state.card_mana_costs = data['card_mana_costs']
+        return state
+
+    def save(self, path):
+        """
+        Save the state atomically so an interrupted run can't leave a corrupt file.
+
+        Afterwards the state reads its decks from the newly saved deck index.
+        """
+        generation = self.generation + 1
+        deck_ids = self.deck_ids()
+        self.corpus().save(self.index_dir(path, generation))
+
+        data = {
+            'version': self.VERSION,
+            'generation': generation,
+            'cards': self.cards.names,
+            'deck_ids': deck_ids,
+            'card_counts': self.card_counts.tolist(),
+            'card_types': self.card_types,
+            'card_mana_costs': self.card_mana_costs
+        }
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            # dumps() uses the C encoder, dump() streams through the much slower Python one
+            f.write(json.dumps(data, separators=(',', ':')))
+        os.replace(temp_path, path)
+
+        self.saved_decks = DeckCorpus.load(self.index_dir(path, generation), self.cards, len(deck_ids))
+        self.generation = generation
+        self.saved_rows = {public_id: row for row, public_id in enumerate(deck_ids)}
+        self.new_decks = {}
+
+        # Older generations are no longer referenced (one still memory-mapped elsewhere is left for next time)
+        for name in os.listdir(self.index_dir(path)):
+            if name != str(generation):
+                shutil.rmtree(os.path.join(self.index_dir(path), name), ignore_errors=True)
+
+
+class CandidateScores:
+    """
+    Vectorized candidate scoring for generate_recommended_decklist.
+
+    Every component is an array over the candidate cards, so why a card ranked where it
+    did can be inspected (see explain() and to_frame()):
+
+        synergy      10 x the sum of its synergy with every recommended card
+        popularity   decks containing the card / decks containing the most popular card
+        owned_bonus  1.5 for owned cards, 1.0 otherwise (multiplies synergy + popularity)
+        matching     5 x the share of the matching decks that contain the card
+
+        score = (synergy + popularity) * owned_bonus + matching
+
+    Candidates are kept in the order the old Counter-based scoring inserted them (cards
+    related to the recommended cards first, in synergy row order, then card_frequency
+    order), and equal scores rank in that order. Synergy rows list equal scores by card ID
+    (see SynergyIndex), so ties rank the same way on every run.
+    """
+
+    SYNERGY_WEIGHT = 10
+    OWNED_BONUS = 1.5
+    MATCHING_WEIGHT = 5
+
+    def __init__(self, recommended, card_frequency, synergy_matrix, owned_cards,
+                 deck_cards=None, matching_counts=None, matching_deck_count=0):
+        """
+        Args:
+            recommended (list): Cards already in the deck, these are not candidates
+            card_frequency (Counter): Frequency of cards in scraped decks
+            synergy_matrix (SynergyIndex): Card synergy neighbours (a dict of dicts works too)
+            owned_cards (set): Normalized names of the owned cards
+            deck_cards (CardDictionary): Dictionary matching_counts is indexed by
+            matching_counts (ndarray): Number of matching decks containing each card
+            matching_deck_count (int): Number of matching decks
+        """
+        excluded = set(recommended)
+        self.cards = []
+        self.positions = {}
+
+        def position(card):
+            card_position = self.positions.get(card)
+            if card_position is None:
+                card_position = self.positions[card] = len(self.cards)
+                self.cards.append(card)
+            return card_position
+
+        # Synergy rows of the recommended cards, added in the same order as before
+        synergy_rows = []
+        for card in recommended:
+            if card in synergy_matrix:
+                related = [(position(related_card), synergy_score)
+                           for related_card, synergy_score in synergy_matrix[card].items()
+                           if related_card not in excluded]
+                if related:
+                    synergy_rows.append(related)
+
+        frequency_positions = [position(card) for card in card_frequency if card not in excluded]
+
+        matching_ids = []
+        if matching_counts is not None and matching_deck_count:
+            matching_ids = [card_id for card_id in np.flatnonzero(matching_counts).tolist()
+                            if deck_cards.names[card_id] not in excluded]
+        matching_positions = [position(deck_cards.names[card_id]) for card_id in matching_ids]
+
+        card_count = len(self.cards)
+        self.synergy = np.zeros(card_count)
+        for related in synergy_rows:
+            related_positions, synergy_scores = zip(*related)
+            self.synergy[list(related_positions)] += np.array(synergy_scores) * self.SYNERGY_WEIGHT
+
+        self.frequency = np.zeros(card_count, dtype=np.int64)
+        self.popularity = np.zeros(card_count)
+        self.owned_bonus = np.ones(card_count)
+        if frequency_positions:
+            frequency_positions = np.array(frequency_positions)
+            frequency = np.array([card_frequency[self.cards[i]] for i in frequency_positions], dtype=np.int64)
+            self.frequency[frequency_positions] = frequency
+            self.popularity[frequency_positions] = frequency / max(card_frequency.values())
+            # Only cards scored on popularity ever got the owned bonus
+            owned = np.array([self.cards[i] in owned_cards for i in frequency_positions], dtype=bool)
+            self.owned_bonus[frequency_positions[owned]] = self.OWNED_BONUS
+
+        self.matching = np.zeros(card_count)
+        if matching_positions:
+            counts = matching_counts[matching_ids].astype(np.int64)
+            self.matching[matching_positions] = counts / matching_deck_count * self.MATCHING_WEIGHT
+
+        self.score = (self.synergy + self.popularity) * self.owned_bonus + self.matching
+
+        # Stable, so ties keep candidate order
+        self.ranking = np.argsort(-self.score, kind='stable')
+        self.ranks = np.empty(card_count, dtype=np.int64)
+        self.ranks[self.ranking] = np.arange(1, card_count + 1)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def top(self, count):
+        """The count highest scoring candidates"""
+        return [self.cards[i] for i in self.ranking[:count].tolist()]
+
+    def explain(self, card):
+        """Get the score components of one candidate, or None if it isn't a candidate"""
+        i = self.positions.get(card)
+        if i is None:
+            return None
+        return {
+            'rank': int(self.ranks[i]),
+            'score': float(self.score[i]),
+            'synergy': float(self.synergy[i]),
+            'frequency': int(self.frequency[i]),
+            'popularity': float(self.popularity[i]),
+            'owned_bonus': float(self.owned_bonus[i]),
+            'matching': float(self.matching[i])
+        }
+
+    def to_frame(self):
+        """All candidates with their score components, best first"""
+        df = pd.DataFrame({
+            'Rank': self.ranks,
+            'Card Name': self.cards,
+            'Score': self.score,
+            'Synergy': self.synergy,
+            'Frequency': self.frequency,
+            'Popularity': self.popularity,
+            'Owned Bonus': self.owned_bonus,
+            'Matching Decks': self.matching
+        })
+        return df.sort_values('Rank')
+
+
+class DeckSynergy:
+    """
+    Dense synergy submatrix of the cards in one deck.
+
+    Row i holds the synergy of card i with every other card in the deck (0 where the
+    synergy matrix has no entry), so the average synergy of every card is one reduction
+    over the rows, and swapping a card only needs the row of the incoming card.
+    """
+
+    def __init__(self, cards, synergy_matrix):
+        """
+        Args:
+            cards (list): Cards in the deck, without duplicates
+            synergy_matrix (SynergyIndex): Card synergy neighbours (a dict of dicts works too)
+        """
+        self.cards = list(cards)
+        self.synergy_matrix = synergy_matrix
+        self.positions = {card: i for i, card in enumerate(self.cards)}
+        self.matrix = np.zeros((len(self.cards), len(self.cards)))
+        for i, card in enumerate(self.cards):
+            self.matrix[i] = self.gather(card)
+        np.fill_diagonal(self.matrix, 0)
+
+        # Cumulative sums add the pairs in deck order, same as summing them one by one
+        self.totals = np.cumsum(self.matrix, axis=1)[:, -1] if self.cards else np.zeros(0)
+        self.counts = np.count_nonzero(self.matrix, axis=1)
+
+    def gather(self, card):
+        """Synergy of card with every card in the deck, in deck order"""
+        row = self.synergy_matrix.get(card)
+        values = np.zeros(len(self.cards))
+        if row:
+            if len(row) < len(self.cards):
+                for related_card, synergy_score in row.items():
+                    i = self.positions.get(related_card)
+                    if i is not None:
+                        values[i] = synergy_score
+            else:
+                values[:] = [row.get(deck_card, 0) for deck_card in self.cards]
+        return values
+
+    def scores(self):
+        """
+        Average synergy of every card with the cards it has synergy with.
+
+        Returns:
+            dict: card -> average synergy score, 0 for cards without synergy in the deck
+        """
+        averages = np.divide(self.totals, self.counts, out=self.totals.copy(), where=self.counts > 0)
+        return dict(zip(self.cards, averages.tolist()))
+
+    def swap_delta(self, card_out, card_in):
+        """
+        Change in the deck's total pairwise synergy from replacing one card with another.
+
+        Args:
+            card_out (str): Card in the deck to remove
+            card_in (str): Card to add in its place
+
+        Returns:
+            float: Synergy gained (positive) or lost (negative) by the swap
+        """
+        out_position = self.positions[card_out]
+        in_row = self.gather(card_in)
+        in_row[out_position] = 0
+        return float(in_row.sum() - self.matrix[out_position].sum())
+
+    def swap_scores(self, card_out, card_in):
+        """
+        Average synergy scores of the deck after replacing one card with another.
+
+        Only the rows of the swapped cards are touched, the rest of the deck is not recomputed.
+
+        Args:
+            card_out (str): Card in the deck to remove
+            card_in (str): Card to add in its place
+
+        Returns:
+            dict: card -> average synergy score, with card_in in the place of card_out
+        """
+        out_position = self.positions[card_out]
+        in_row = self.gather(card_in)
+        in_row[out_position] = 0
+
+        totals = self.totals - self.matrix[:, out_position] + in_row
+        counts = self.counts - (self.matrix[:, out_position] != 0) + (in_row != 0)
+        totals[out_position] = in_row.sum()
+        counts[out_position] = np.count_nonzero(in_row)
+
+        averages = np.divide(totals, counts, out=totals.copy(), where=counts > 0)
+        cards = list(self.cards)
+        cards[out_position] = card_in
+        return dict(zip(cards, averages.tolist()))
+
+
+class MoxfieldAnalyzer:
+    def __init__(self, output_dir="moxfield_data", session_pool=None):
+        """
+        Initialize the analyzer with an HTTP session pool and output directory.
+
+        Args:
+            output_dir (str): Directory for decklists and analysis output
+            session_pool (ScraperSessionPool): Shared session pool; a new one is created if None
+        """
+        self.session_pool = session_pool or ScraperSessionPool()
+        self.output_dir = output_dir
+        self.owned_cards = set()
+        self.card_quantities = {}
+        self.auto_include_manager = AutoIncludeManager(output_dir)
+        self.card_types = {}  # Dictionary to store card types
+        self.card_mana_costs = {}  # Dictionary to store mana costs
+        # Card metadata shared with the other output directories, for cards not in this analysis
+        self.card_metadata = CardMetadataCache.shared(CardMetadataCache.default_path(output_dir))
+        self.land_count = 37  # Default land count if not specified
+        self.candidate_scores = None  # CandidateScores of the last recommended decklist
+        self.deck_synergy = None  # DeckSynergy of the last recommended decklist
+
+        # Network settings for deck collection
+        self.api_base = "https://api2.moxfield.com/v2"
+        self.use_async_collection = True  # Use the asyncio engine instead of the thread pool
+        self.fetch_concurrency = 16  # Maximum requests in flight for the async engine
+        self.min_fetch_concurrency = 2  # Lowest concurrency the adaptive limiter may drop to
+        self.requests_per_second = 10  # Starting request rate for the adaptive limiter
+        self.min_requests_per_second = 1  # Lowest request rate the adaptive limiter may drop to
+        self.max_requests_per_second = 50  # Highest request rate the adaptive limiter may reach
+        self.max_retries = 5  # Retries for throttled (429/5xx) requests
+        self.request_timeout = 30  # Per-request timeout in seconds
+        self.deck_cache_max_bytes = 1024 * 1024 * 1024  # Bytes of decks kept in the shared deck cache
+        self.deck_cache_max_age_days = 180  # Cached decks not used for this many days are evicted
+        self.search_refresh_days = 7  # Search again when the saved search results are older than this (None = never)
+
+        # Fastest available JSON decoder, schema mode only decodes the fields we analyse
+        self.decoder = DeckDecoder()
+
+        # Analysis settings
+        self.analysis_workers = os.cpu_count() or 1  # Processes parsing decks (1 = parse in this process)
+        self.min_decks_per_worker = 5000  # A worker takes ~1s to start, smaller jobs run faster in this process
+        self.synergy_threshold = 0.1  # Only card pairs with a higher Jaccard synergy are kept
+        self.synergy_top_k = None  # Neighbours kept per card in the synergy index (None = all above the threshold)
+        self.analysis_memory_budget = 256 * 1024 * 1024  # Bytes of synergy pairs held in memory before spilling to disk
+        self.approximate_synergy = False  # Estimate synergy from MinHash sketches instead of counting every pair
+        self.minhash_permutations = 128  # Signature length, synergy standard error is about sqrt(J (1 - J) / n)
+        self.sketch_epsilon = 1e-5  # Count-Min pair count error bound, relative to the number of card pairs
+        self.sketch_delta = 0.01  # Probability of a Count-Min pair count exceeding the error bound
+        self.synergy_index = None  # SynergyIndex of the last analysis
+        self.rate_limiter = None  # AdaptiveRateLimiter, created on first use from the settings above
+
+        # Basic lands that can be included multiple times
+        self.basic_lands = ["forest", "swamp", "mountain", "plains", "island"]
+
+        # Create output directories if they don't exist
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        if not os.path.exists(f"{output_dir}/decklists"):
+            os.makedirs(f"{output_dir}/decklists")
+        if not os.path.exists(f"{output_dir}/analysis"):
+            os.makedirs(f"{output_dir}/analysis")
+
+        # Compact store of collected decks (replaces one JSON file per deck)
+        self.deck_store = DeckStore(f"{output_dir}/decks.sqlite")
+
+        # Decks downloaded by any output directory, so overlapping analyses don't download them again
+        self.deck_cache = DeckCache.shared(DeckCache.default_path(output_dir))
+        self.deck_updates = {}  # public ID -> lastUpdatedAtUtc from the search results
+
+        # For tracking progress
+        self.collected_decks = set()
+        if os.path.exists(f"{output_dir}/collected_decks.json"):
+            with open(f"{output_dir}/collected_decks.json", "r") as f:
+                self.collected_decks = set(json.load(f))
+
+    def load_owned_cards(self, csv_file):
+        """
+        Load owned cards from a CSV file.
+
+        Args:
+            csv_file (str): Path to the CSV file with owned cards
+
+        Returns:
+            int: Number of owned cards loaded
+        """
+        try:
+            # Check for the "sep=" line in the CSV
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                first_line = f.readline().strip()
+                if first_line.startswith('"sep='):
+                    delimiter = first_line.split('=')[1].strip('"')
+                else:
+                    delimiter = ','  # Default delimiter
+
+            # Read the CSV file
+            df = pd.read_csv(csv_file, delimiter=delimiter, skiprows=1 if first_line.startswith('"sep=') else 0)
+
+            # Get card names and quantities
+            if 'Card Name' in df.columns and 'Quantity' in df.columns:
+                for _, row in df.iterrows():
+                    card_name = row['Card Name']
+                    quantity = row['Quantity']
+
+                    # Normalize card name (remove special characters, lowercase)
+                    normalized_name = self.normalize_card_name(card_name)
+
+                    self.owned_cards.add(normalized_name)
+                    self.card_quantities[normalized_name] = quantity
+
+            print(f"Loaded {len(self.owned_cards)} unique cards from your collection")
+            return len(self.owned_cards)
+
+        except Exception as e:
+            print(f"Error loading owned cards: {str(e)}")
+            return 0
+
+    @staticmethod
+    def normalize_card_name(card_name):
+        """Normalize card name to handle variations in naming (see CardNameNormalizer)."""
+        return card_names.normalize(card_name)
+
+    def save_collection_progress(self):
+        """Save the list of collected decks to avoid re-downloading."""
+        with open(f"{self.output_dir}/collected_decks.json", "w") as f:
+            json.dump(list(self.collected_decks), f)
+
+    def search_decks_by_commander(self, commander_id, page_limit=10):
+        """
+        Search for decks using a specific commander.
+
+        Args:
+            commander_id (str): The Moxfield card ID for the commander
+            page_limit (int): Maximum number of pages to retrieve (each page contains 64 decks,
+                             so page_limit=10 means up to 640 decks could be scraped)
+
+        Returns:
+            list: List of deck public IDs for the commander
+        """
+        return self.search_decks_by_commanders([commander_id], page_limit=page_limit)
+
+    def search_decks_by_commanders(self, commander_ids, page_limit=10):
+        """
+        Search for decks for several commanders concurrently under one rate budget.
+
+        Args:
+            commander_ids (list): The Moxfield card IDs for the commanders
+            page_limit (int): Maximum number of pages to retrieve per commander
+
+        Returns:
+            list: List of unique deck public IDs
+        """
+        print(f"Searching for decks with commander IDs: {commander_ids}")
+        print(f"Will scrape up to {page_limit} pages per commander (max {page_limit * 64} decks each)")
+
+        all_public_ids = self.create_collector().search(commander_ids, page_limit)
+
+        print(f"Total decks found for commanders {commander_ids}: {len(all_public_ids)}")
+        return all_public_ids
+
+    def search_and_collect_decklists(self, commander_ids, page_limit=10, progress_callback=None):
+        """
+        Search decks for all commanders and download them in one pipeline.
+
+        Deck IDs are downloaded as soon as a search page returns them, so searching and
+        collecting overlap instead of running back to back.
+
+        Args:
+            commander_ids (list): The Moxfield card IDs for the commanders
+            page_limit (int): Maximum number of pages to retrieve per commander
+            progress_callback (function): Callback for progress updates
+
+        Returns:
+            tuple: (list of unique deck public IDs, number of newly collected decklists)
+        """
+        print(f"Searching and collecting decks for commander IDs: {commander_ids}")
+
+        # Collected decks are downloaded again if the search shows they changed since
+        freshness = self.deck_freshness()
+        all_public_ids, successful = self.create_collector().run_pipelined(
+            commander_ids,
+            page_limit,
+            skip_ids=freshness,
+            progress_callback=progress_callback
+        )
+
+        # Save collection progress
+        self.save_collection_progress()
+        self.trim_deck_cache()
+
+        print(f"Found {len(all_public_ids)} unique decks, collected {successful} new decklists "
+              f"({len(freshness.stale_ids())} of them changed since they were collected)")
+        return all_public_ids, successful
+
+    def fetch_search_page(self, commander_id, page_number, timeout=None):
+        """
+        Fetch one page of deck search results for a commander.
+
+        Args:
+            commander_id (str): The Moxfield card ID for the commander
+            page_number (int): The 1-based page number
+            timeout (float): Request timeout in seconds (defaults to self.request_timeout)
+
+        Returns:
+            list: Deck public IDs on this page (empty at the end of the results), or None on error
+
+        Raises:
+            ThrottledError: For 429/5xx responses that should be retried later
+            TransportError: For connection errors and timeouts
+        """
+        url = f"{self.api_base}/decks/search-sfw?pageNumber={page_number}&pageSize=64&sortType=likes&sortDirection=descending&commanderCardId={commander_id}"
+        try:
+            response = self.session_pool.get(url, timeout=timeout or self.request_timeout)
+            self.check_throttled(response)
+            if response.status_code != 200:
+                print(f"Error on page {page_number} for commander {commander_id}: {response.status_code}")
+                return None
+
+            results = self.decoder.decode_search_results(response.content)
+            public_ids = [public_id for public_id, _ in results]
+            self.deck_updates.update((public_id, updated) for public_id, updated in results if updated)
+
+            # Pages are fetched concurrently, the collector prints one summary per commander
+            return public_ids
+
+        except ThrottledError:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # Dropped connections and timeouts are retried like server errors
+            raise TransportError(e) from e
+        except Exception as e:
+            print(f"Error fetching page {page_number} for commander {commander_id}: {str(e)}")
+            return None
+
+    def deck_freshness(self):
+        """DeckFreshness of the collected decks against the update times found by searches"""
+        return DeckFreshness(set(self.collected_decks), self.deck_store.fetch_times(), self.deck_updates)
+
+    def search_is_stale(self, ids_file):
+        """Whether saved search results are older than search_refresh_days and should be searched again"""
+        if self.search_refresh_days is None or not os.path.exists(ids_file):
+            return False
+        return time.time() - os.path.getmtime(ids_file) > self.search_refresh_days * 24 * 60 * 60
+
+    def drop_decks(self, public_ids):
+        """
+        Remove decks from this analysis, e.g. decks no longer in the search results.
+
+        They stay in the shared deck cache.
+        """
+        public_ids = [public_id for public_id in public_ids if public_id in self.collected_decks]
+        if public_ids:
+            self.deck_store.remove_decks(public_ids)
+            self.collected_decks.difference_update(public_ids)
+            self.save_collection_progress()
+        return len(public_ids)
+
+    def check_throttled(self, response):
+        """Raise ThrottledError if the response says the request should be retried later"""
+        if response.status_code in AdaptiveRateLimiter.RETRY_STATUS_CODES:
+            retry_after = ThrottledError.parse_retry_after(response.headers.get('Retry-After'))
+            raise ThrottledError(response.status_code, retry_after)
+
+    def get_rate_limiter(self):
+        """Get the adaptive rate limiter, creating it from the network settings on first use"""
+        if self.rate_limiter is None:
+            self.rate_limiter = AdaptiveRateLimiter(
+                min_concurrency=self.min_fetch_concurrency,
+                max_concurrency=self.fetch_concurrency,
+                rate=self.requests_per_second,
+                min_rate=self.min_requests_per_second,
+                max_rate=self.max_requests_per_second,
+                max_retries=self.max_retries,
+                target_latency=self.request_timeout / 10
+            )
+        return self.rate_limiter
+
+    def create_collector(self):
+        """Create an AsyncDeckCollector configured with this analyzer's network settings"""
+        return AsyncDeckCollector(
+            self.fetch_decklist,
+            self.save_decklist,
+            limiter=self.get_rate_limiter(),
+            timeout=self.request_timeout,
+            search_func=self.fetch_search_page,
+            load_func=self.load_cached_decklist
+        )
+
+    def get_decklist(self, public_id):
+        """
+        Retrieve a complete decklist by its public ID.
+
+        Args:
+            public_id (str): The public ID of the deck
+
+        Returns:
+            list: The deck's boards (see DeckDecoder.decode_deck) or None if unsuccessful
+        """
+        # Skip if already collected
+        if public_id in self.collected_decks:
+            return None
+
+        # Another analysis may already have downloaded this version of the deck
+        data = self.load_cached_decklist(public_id)
+        if data is not None:
+            return data
+
+        data = self.get_rate_limiter().call_sync(self.fetch_decklist, public_id)
+        if data is None:
             return None
 
+        self.save_decklist(public_id, data)
+
+        # Return the data for further processing if needed
+        return data
+
+    def fetch_decklist(self, public_id, timeout=None):
+        """
+        Download a decklist without saving it.
+
+        Args:
+            public_id (str): The public ID of the deck
+            timeout (float): Request timeout in seconds (defaults to self.request_timeout)
+
+        Returns:
+            list: The deck's boards (see DeckDecoder.decode_deck) or None if unsuccessful
+
+        Raises:
+            ThrottledError: For 429/5xx responses that should be retried later
+            TransportError: For connection errors and timeouts
+        """
+        url = f"{self.api_base}/decks/all/{public_id}"
+        try:
+            response = self.session_pool.get(url, timeout=timeout or self.request_timeout)
+            self.check_throttled(response)
+            if response.status_code != 200:
+                print(f"Error fetching deck {public_id}: {response.status_code}")
+                return None
+
+            # Only the analysed fields are decoded, the full payload is never built
+            return self.decoder.decode_deck(response.content)
+
+        except ThrottledError:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # Dropped connections and timeouts are retried like server errors
+            raise TransportError(e) from e
+        except Exception as e:
+            print(f"Error fetching deck {public_id}: {str(e)}")
+            return None
+
+    def save_decklist(self, public_id, boards, cache=True):
+        """Save a downloaded decklist to the deck store (and the deck cache) and mark it as collected"""
+        if cache:
+            self.deck_cache.put(public_id, self.deck_updates.get(public_id), boards)
+        # A deck that is downloaded again replaces its stored version
+        self.deck_store.add_deck_boards(public_id, boards, last_updated=self.deck_updates.get(public_id), replace=True)
+        self.card_metadata.record((self.normalize_card_name(name), type_line, mana_cost)
+                                  for cards in boards for name, type_line, mana_cost in cards)
+
+        # Mark as collected
+        self.collected_decks.add(public_id)
+
+    def load_cached_decklist(self, public_id):
+        """
+        Collect a deck from the shared deck cache instead of downloading it.
+
+        A deck found by a search only matches the cached version with the same lastUpdatedAtUtc,
+        decks whose update time is unknown match any cached version.
+
+        Returns:
+            list: The deck's boards, or None if it isn't cached
+        """
+        boards = self.deck_cache.get(public_id, self.deck_updates.get(public_id))
+        if boards is not None:
+            self.save_decklist(public_id, boards, cache=False)
+        return boards
+
+    def trim_deck_cache(self):
+        """Evict old and least recently used decks from the shared deck cache"""
+        self.deck_cache.evict(self.deck_cache_max_bytes, self.deck_cache_max_age_days * 24 * 60 * 60)
+
     def collect_decklists_parallel(self, public_ids, max_workers=5, progress_callback=None):
         """
-        Collect decklists in parallel using ThreadPoolExecutor.
+        Collect decklists in parallel.
+
+        Uses the asyncio engine (AsyncDeckCollector) unless use_async_collection is False,
+        in which case the original ThreadPoolExecutor path is used.
 
         Args:
             public_ids (list): List of public IDs to collect
-            max_workers (int): Maximum number of parallel workers
+            max_workers (int): Maximum number of parallel workers for the thread pool path
+                               (the async engine uses fetch_concurrency instead)
             progress_callback (function): Callback for progress updates
 
         Returns:
             int: Number of successfully collected decklists
         """
         # Filter out already collected decks
-        new_ids = [pid for pid in public_ids if pid not in self.collected_decks]
+        new_ids = [pid for pid in dict.fromkeys(public_ids) if pid not in self.collected_decks]
         print(f"Collecting {len(new_ids)} new decklists (skipping {len(public_ids) - len(new_ids)} already collected)")
 
+        if self.use_async_collection:
+            successful = self.create_collector().run(new_ids, progress_callback=progress_callback)
+        else:
+            successful = self.collect_decklists_threaded(new_ids, max_workers, progress_callback)
+
+        # Save collection progress
+        self.save_collection_progress()
+        self.trim_deck_cache()
+
+        return successful
+
+    def collect_decklists_threaded(self, public_ids, max_workers=5, progress_callback=None):
+        """
+        Collect decklists in parallel using ThreadPoolExecutor.
+
+        Args:
+            public_ids (list): List of public IDs to collect
+            max_workers (int): Maximum number of parallel workers
+            progress_callback (function): Callback for progress updates
+
+        Returns:
+            int: Number of successfully collected decklists
+        """
         successful = 0
-        total = len(new_ids)
+        total = len(public_ids)
         completed = 0
 
         # Function to update progress after each download
@@ -1947,7 +5352,7 @@ class MoxfieldAnalyzer:
         # Use ThreadPoolExecutor for parallel downloads
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = []
-            for pid in new_ids:
+            for pid in public_ids:
                 future = executor.submit(self.get_decklist, pid)
                 future.add_done_callback(update_progress)
                 futures.append(future)
@@ -1958,115 +5363,255 @@ class MoxfieldAnalyzer:
                 if result is not None:
                     successful += 1
 
-        # Save collection progress
-        self.save_collection_progress()
-
         return successful
 
     def analyze_all_decklists(self):
         """
         Analyze all collected decklists to generate statistics and card correlations.
 
+        Results are kept in analysis_state.json, so only decks added to (or removed from)
+        the deck store since the last run are processed.
+
         Returns:
-            tuple: (card_frequency, synergy_matrix, cards_per_deck, deck_count)
+            tuple: (card_frequency, synergy_matrix, cards_per_deck, deck_count) where
+                   synergy_matrix is a SynergyIndex and cards_per_deck is a DeckCorpus
         """
         print("Analyzing collected decklists...")
 
-        card_frequency = Counter()
-        deck_count = 0
-        synergy_pairs = Counter()
-        cards_per_deck = []
-
-        # Iterate through all collected decklist files
-        for filename in os.listdir(f"{self.output_dir}/decklists"):
-            if filename.endswith('.json'):
-                deck_path = f"{self.output_dir}/decklists/{filename}"
-                with open(deck_path, 'r') as f:
-                    try:
-                        deck_data = json.load(f)
-                        deck_count += 1
-
-                        # Get all cards in this deck (excluding basic lands)
-                        deck_cards = set()
-
-                        for card_id, card_info in deck_data.get('mainboard', {}).items():
-                            card_name = card_info.get('card', {}).get('name', '')
-                            card_type_line = card_info.get('card', {}).get('type_line', '')
-                            mana_cost = card_info.get('card', {}).get('mana_cost', '')
-
-                            # Skip basic lands
-                            if 'Basic Land' in card_type_line:
-                                continue
-
-                            if card_name:
-                                normalized_name = self.normalize_card_name(card_name)
-                                deck_cards.add(normalized_name)
-                                card_frequency[normalized_name] += 1
-
-                                # Store card type if not already stored or if current type is more specific
-                                if normalized_name not in self.card_types:
-                                    self.card_types[normalized_name] = self.get_card_type(card_type_line)
-
-                                # Store mana cost if available
-                                if mana_cost and not hasattr(self, 'card_mana_costs'):
-                                    self.card_mana_costs = {}
-                                if mana_cost:
-                                    self.card_mana_costs[normalized_name] = mana_cost
-
-                        # Add all commanders
-                        for card_id, card_info in deck_data.get('commanders', {}).items():
-                            card_name = card_info.get('card', {}).get('name', '')
-                            card_type_line = card_info.get('card', {}).get('type_line', '')
-                            mana_cost = card_info.get('card', {}).get('mana_cost', '')
-
-                            if card_name:
-                                normalized_name = self.normalize_card_name(card_name)
-                                deck_cards.add(normalized_name)
-                                card_frequency[normalized_name] += 1
-
-                                # Store card type for commanders too
-                                if normalized_name not in self.card_types:
-                                    self.card_types[normalized_name] = self.get_card_type(card_type_line)
-
-                                # Store mana cost for commanders too
-                                if mana_cost and not hasattr(self, 'card_mana_costs'):
-                                    self.card_mana_costs = {}
-                                if mana_cost:
-                                    self.card_mana_costs[normalized_name] = mana_cost
-
-                        # Record this deck's cards
-                        cards_per_deck.append(deck_cards)
-
-                        # Calculate card synergies (which cards appear together)
-                        deck_cards_list = list(deck_cards)
-                        for i in range(len(deck_cards_list)):
-                            for j in range(i + 1, len(deck_cards_list)):
-                                card_pair = tuple(sorted([deck_cards_list[i], deck_cards_list[j]]))
-                                synergy_pairs[card_pair] += 1
-
-                    except json.JSONDecodeError:
-                        print(f"Error parsing {filename}")
+        # Pick up decklist files saved by older versions
+        decklists_dir = f"{self.output_dir}/decklists"
+        if os.path.exists(decklists_dir):
+            self.deck_store.import_decklists_dir(
+                decklists_dir, workers=self.analysis_worker_count(len(os.listdir(decklists_dir))),
+                decoder=self.decoder
+            )
+
+        state_path = f"{self.output_dir}/analysis_state.json"
+        state = AnalysisState.load(state_path, self.decoder)
+
+        # Drop decks that are no longer in the deck store
+        stored_ids = self.deck_store.deck_ids()
+        removed_ids = [public_id for public_id in state.deck_ids() if public_id not in stored_ids]
+        if removed_ids and len(removed_ids) == len(state):
+            # Everything was cleared (e.g. new commanders), start over
+            generation = state.generation
+            state = AnalysisState()
+            state.generation = generation
+        else:
+            for public_id in removed_ids:
+                state.remove_deck(public_id)
+
+        # Decks downloaded again because they changed are folded in again
+        changed_ids = self.deck_store.changed_ids()
+        for public_id in changed_ids:
+            state.remove_deck(public_id)
+
+        # Card metadata from earlier runs
+        for card, card_type in state.card_types.items():
+            self.card_types.setdefault(card, card_type)
+        self.card_mana_costs.update(state.card_mana_costs)
+
+        # Stream the decks added since the last run: deck store -> card extraction -> state counters.
+        # Only one shard (or, in this process, one deck) is held in memory at a time
+        row_ids = self.deck_store.deck_row_ids(skip_ids=state)
+        workers = self.analysis_worker_count(len(row_ids))
+        if workers > 1:
+            print(f"Parsing {len(row_ids)} decks in {workers} processes")
+            shards = [(self.deck_store.path, shard) for shard in split_shards(row_ids, workers * 4)]
+            results = iter_in_processes(_analyze_deck_shard, shards, workers)
+        else:
+            decks = self.iter_deck_cards(self.deck_store.iter_decks(row_ids=row_ids),
+                                         self.card_types, self.card_mana_costs)
+            results = [(decks, {}, {})]
+
+        # Merge in shard order: the first type and the last mana cost seen win, as in a serial scan
+        new_count = 0
+        for shard_decks, shard_card_types, shard_mana_costs in results:
+            for card, card_type in shard_card_types.items():
+                self.card_types.setdefault(card, card_type)
+            self.card_mana_costs.update(shard_mana_costs)
+            for public_id, deck_cards in shard_decks:
+                state.add_deck(public_id, deck_cards)
+                new_count += 1
+
+        state.card_types = self.card_types
+        state.card_mana_costs = self.card_mana_costs
+        if new_count or removed_ids:
+            state.save(state_path)
+        if changed_ids:
+            self.deck_store.clear_changed(changed_ids)
+        # Cards imported from old decklist files or analysed before the cache existed
+        self.card_metadata.update(self.card_types, self.card_mana_costs)
+
+        print(f"Folded in {new_count} new or changed decks, removed {len(removed_ids)} decks")
+
+        card_frequency = state.card_frequency()
+        deck_count = len(state)
+        # Decks stay card ID arrays in the memory-mapped deck index, names are only resolved
+        # when results are exported
+        cards_per_deck = state.corpus()
 
         print(f"Analyzed {deck_count} decks with {len(card_frequency)} unique cards")
 
-        # Calculate normalized synergy scores
-        synergy_matrix = defaultdict(dict)
+        synergy_matrix = self.load_synergy_index(state, cards_per_deck)
 
-        for (card1, card2), count in synergy_pairs.items():
-            # Calculate Jaccard index as synergy score
-            # (how often these cards appear together relative to how often they appear at all)
-            both = count
-            total = card_frequency[card1] + card_frequency[card2] - both
+        return card_frequency, synergy_matrix, cards_per_deck, deck_count
 
-            if total > 0:
-                synergy_score = both / total
+    def load_synergy_index(self, state, cards_per_deck):
+        """
+        Load the saved synergy index, rebuilding it if the analysed decks or settings changed.
 
-                # Only keep scores above a threshold
-                if synergy_score > 0.1:  # Adjust threshold as needed
-                    synergy_matrix[card1][card2] = synergy_score
-                    synergy_matrix[card2][card1] = synergy_score
+        Args:
+            state (AnalysisState): The analysis state
+            cards_per_deck (DeckCorpus): The analysed decks
 
-        return card_frequency, synergy_matrix, cards_per_deck, deck_count
+        Returns:
+            SynergyIndex: Top synergy neighbours of every card
+        """
+        index_dir = f"{self.output_dir}/synergy_index"
+        fingerprint = state.fingerprint()
+        if self.approximate_synergy:
+            fingerprint += f":minhash{self.minhash_permutations}"
+        index = SynergyIndex.load(index_dir, self.decoder)
+        if (index is not None and index.fingerprint == fingerprint
+                and index.threshold == self.synergy_threshold and index.k == self.synergy_top_k):
+            print(f"Loaded synergy index for {len(index)} cards")
+        else:
+            print("Building synergy index...")
+            # Let go of the previous index, its files are about to be replaced
+            self.synergy_index = index = None
+            spill_dir = f"{self.output_dir}/synergy_spill"
+            index = self.cooccurrence_engine(cards_per_deck).synergy_index(
+                self.synergy_threshold, self.synergy_top_k,
+                memory_budget=self.analysis_memory_budget, spill_dir=spill_dir
+            )
+            index.fingerprint = fingerprint
+            index.save(index_dir)
+
+            # Read the saved index memory-mapped rather than keeping the built arrays (or spill files)
+            saved = SynergyIndex.load(index_dir, self.decoder)
+            if saved is not None:
+                index = saved
+                shutil.rmtree(spill_dir, ignore_errors=True)
+
+        self.synergy_index = index
+        return index
+
+    def cooccurrence_engine(self, cards_per_deck):
+        """The exact CooccurrenceEngine, or the sketch-based one when approximate_synergy is set"""
+        if self.approximate_synergy:
+            print(f"Estimating synergy from {self.minhash_permutations} MinHash permutations")
+            return ApproximateCooccurrenceEngine(cards_per_deck, num_perm=self.minhash_permutations,
+                                                 epsilon=self.sketch_epsilon, delta=self.sketch_delta)
+        return CooccurrenceEngine(cards_per_deck)
+
+    def most_synergistic(self, card_name, limit=10):
+        """
+        Cards with the highest synergy with a card, from the last analysis' synergy index.
+
+        Args:
+            card_name (str): Card name, normalized here
+            limit (int): Maximum number of cards
+
+        Returns:
+            list: (card name, synergy score) tuples, best first
+        """
+        if self.synergy_index is None:
+            self.synergy_index = SynergyIndex.load(f"{self.output_dir}/synergy_index", self.decoder)
+            if self.synergy_index is None:
+                return []
+        return self.synergy_index.most_synergistic(self.normalize_card_name(card_name), limit)
+
+    def lookup_card_type(self, card):
+        """Type of a card from this analysis, falling back to the shared card metadata cache"""
+        return self.card_types.get(card) or self.card_metadata.card_type(card)
+
+    def lookup_mana_cost(self, card):
+        """Mana cost of a card from this analysis, falling back to the shared card metadata cache"""
+        return self.card_mana_costs.get(card) or self.card_metadata.mana_cost(card)
+
+    def analysis_worker_count(self, deck_count):
+        """Number of processes to parse deck_count decks with (1 = parse in this process)"""
+        return max(1, min(self.analysis_workers, deck_count // self.min_decks_per_worker))
+
+    @classmethod
+    def extract_decks(cls, decks):
+        """
+        Extract the cards of several decks (one shard of the map-reduce analysis).
+
+        Args:
+            decks (iterable): (public_id, mainboard, commanders) tuples from DeckStore.iter_decks
+
+        Returns:
+            tuple: ([(public_id, deck_cards)], card_types, card_mana_costs) for this shard
+        """
+        card_types = {}
+        card_mana_costs = {}
+        shard_decks = list(cls.iter_deck_cards(decks, card_types, card_mana_costs))
+        return shard_decks, card_types, card_mana_costs
+
+    @classmethod
+    def iter_deck_cards(cls, decks, card_types, card_mana_costs):
+        """
+        Extract the cards of decks one at a time.
+
+        Args:
+            decks (iterable): (public_id, mainboard, commanders) tuples from DeckStore.iter_decks
+            card_types (dict): Card types to fill in, the first type seen is kept
+            card_mana_costs (dict): Mana costs to fill in, the last cost seen is kept
+
+        Yields:
+            tuple: (public_id, deck_cards) with the normalized card names of each deck
+        """
+        for public_id, mainboard, commanders in decks:
+            yield public_id, cls.extract_deck_cards(mainboard, commanders, card_types, card_mana_costs)
+
+    @classmethod
+    def extract_deck_cards(cls, mainboard, commanders, card_types, card_mana_costs):
+        """
+        Get the normalized card names of a deck and record their types and mana costs.
+
+        Args:
+            mainboard (list): (name, type_line, mana_cost) tuples of the mainboard
+            commanders (list): (name, type_line, mana_cost) tuples of the commanders
+            card_types (dict): Card types to fill in, the first type seen is kept
+            card_mana_costs (dict): Mana costs to fill in, the last cost seen is kept
+
+        Returns:
+            set: Normalized card names in the deck (excluding basic lands)
+        """
+        deck_cards = set()
+
+        for card_name, card_type_line, mana_cost in mainboard:
+            # Skip basic lands
+            if 'Basic Land' in card_type_line:
+                continue
+
+            normalized_name = cls.normalize_card_name(card_name)
+            deck_cards.add(normalized_name)
+
+            # Store card type if not already stored or if current type is more specific
+            if normalized_name not in card_types:
+                card_types[normalized_name] = cls.get_card_type(card_type_line)
+
+            # Store mana cost if available
+            if mana_cost:
+                card_mana_costs[normalized_name] = mana_cost
+
+        # Add all commanders
+        for card_name, card_type_line, mana_cost in commanders:
+            normalized_name = cls.normalize_card_name(card_name)
+            deck_cards.add(normalized_name)
+
+            # Store card type for commanders too
+            if normalized_name not in card_types:
+                card_types[normalized_name] = cls.get_card_type(card_type_line)
+
+            # Store mana cost for commanders too
+            if mana_cost:
+                card_mana_costs[normalized_name] = mana_cost
+
+        return deck_cards
 
     def generate_owned_vs_scraped_report(self, card_frequency):
         """
@@ -2082,15 +5627,11 @@ class MoxfieldAnalyzer:
         scraped_cards = []
 
         for card, frequency in card_frequency.items():
-            # Ensure the card_mana_costs dictionary exists
-            if not hasattr(self, 'card_mana_costs'):
-                self.card_mana_costs = {}
-
             scraped_cards.append({
                 'Card Name': card,
-                'Mana Cost': self.card_mana_costs.get(card, ''),
+                'Mana Cost': self.lookup_mana_cost(card),
                 'Deck Count': frequency,
-                'Card Type': self.card_types.get(card, "Unknown"),
+                'Card Type': self.lookup_card_type(card),
                 'Owned': card in self.owned_cards,
                 'Quantity Owned': self.card_quantities.get(card, 0) if card in self.owned_cards else 0
             })
@@ -2113,8 +5654,8 @@ class MoxfieldAnalyzer:
 
         Args:
             card_frequency (Counter): Frequency of cards in scraped decks
-            synergy_matrix (dict): Card synergy matrix
-            cards_per_deck (list): List of sets, where each set contains the cards in a deck
+            synergy_matrix (SynergyIndex): Card synergy neighbours (a dict of dicts works too)
+            cards_per_deck (DeckCorpus): The analysed decks (a list of card name sets also works)
             target_size (int): Target size of the recommended deck
             colors (list): List of commander colors
 
@@ -2123,6 +5664,9 @@ class MoxfieldAnalyzer:
         """
         print(f"Generating recommended decklist with target land count: {self.land_count}")
 
+        if not isinstance(cards_per_deck, DeckCorpus):
+            cards_per_deck = DeckCorpus.from_decks(cards_per_deck)
+
         # Calculate non-land count based on target size and land count
         non_land_count = target_size - self.land_count
         print(f"Target breakdown: {self.land_count} lands + {non_land_count} non-lands = {target_size} total cards")
@@ -2155,45 +5699,19 @@ class MoxfieldAnalyzer:
         # But leave room for all auto-includes
         remaining_slots = target_size - len(auto_includes)
 
-        # Calculate a score for each candidate card
-        candidate_scores = Counter()
-
-        # First, consider synergy with our seed cards
-        for card in recommended:
-            if card in synergy_matrix:
-                for related_card, synergy_score in synergy_matrix[card].items():
-                    if related_card not in recommended:
-                        candidate_scores[related_card] += synergy_score * 10  # Weight by synergy
-
-        # Next, add frequency as a factor (popularity)
-        for card, freq in card_frequency.items():
-            if card not in recommended:
-                # Normalize frequency score
-                normalized_freq = freq / max(card_frequency.values()) if card_frequency else 0
-                candidate_scores[card] += normalized_freq
-
-                # Bonus for owned cards
-                if card in self.owned_cards:
-                    candidate_scores[card] *= 1.5  # 50% bonus for owned cards
-
-        # Add commonly co-occurring cards
-        # Find decks that contain at least 3 of our seed cards
-        matching_decks = []
-        for deck_cards in cards_per_deck:
-            seed_overlap = len(set(recommended) & deck_cards)
-            if seed_overlap >= 3:
-                matching_decks.append(deck_cards)
-
-        # Count cards in these matching decks
-        matching_cards = Counter()
-        for deck in matching_decks:
-            for card in deck:
-                if card not in recommended:
-                    matching_cards[card] += 1
-
-        # Add to our candidate scores
-        for card, count in matching_cards.items():
-            candidate_scores[card] += count / len(matching_decks) * 5 if matching_decks else 0
+        # Find decks that contain at least 3 of our seed cards, and count the cards in them
+        recommended_ids = cards_per_deck.cards.lookup(recommended)
+        matching_decks = cards_per_deck.overlap_counts(recommended_ids) >= 3
+        matching_cards = cards_per_deck.card_counts(matching_decks)
+
+        # Score every candidate card on synergy with our seed cards, popularity (with a bonus
+        # for owned cards) and how common it is in the matching decks
+        candidate_scores = CandidateScores(
+            recommended, card_frequency, synergy_matrix, self.owned_cards,
+            deck_cards=cards_per_deck.cards, matching_counts=matching_cards,
+            matching_deck_count=int(matching_decks.sum())
+        )
+        self.candidate_scores = candidate_scores  # Kept so rankings can be inspected
 
         # Select the top scoring cards to complete our deck
         # Note: Only fill remaining slots after accounting for auto-includes
@@ -2201,7 +5719,7 @@ class MoxfieldAnalyzer:
         remaining_slots = target_size - len(auto_includes) - len(non_auto_includes)
 
         if remaining_slots > 0:
-            top_candidates = [card for card, _ in candidate_scores.most_common(remaining_slots)]
+            top_candidates = candidate_scores.top(remaining_slots)
             recommended.extend(top_candidates)
 
         # FIXED: Ensure auto-includes are ALWAYS in the recommended deck
@@ -2239,25 +5757,11 @@ class MoxfieldAnalyzer:
         print("--- End duplicate check ---\n")
 
         # Calculate synergy scores for each card in the recommended deck
-        synergy_scores = {}
-        for i, card1 in enumerate(recommended):
-            synergy_scores[card1] = 0
-            card_count = 0
-
-            # Check synergy with all other cards in the deck
-            for card2 in recommended:
-                if card1 != card2:
-                    # Get synergy score if available, otherwise 0
-                    if card1 in synergy_matrix and card2 in synergy_matrix[card1]:
-                        synergy_scores[card1] += synergy_matrix[card1][card2]
-                        card_count += 1
-
-            # Average the synergy score
-            if card_count > 0:
-                synergy_scores[card1] /= card_count
-
-            # Debug print
-            print(f"Synergy score for {card1}: {synergy_scores[card1]:.3f}")
+        deck_synergy = DeckSynergy(recommended, synergy_matrix)
+        self.deck_synergy = deck_synergy  # Kept for what-if swaps
+        synergy_scores = deck_synergy.scores()
+        print(f"Calculated synergy scores for {len(synergy_scores)} cards, "
+              f"{np.count_nonzero(deck_synergy.counts)} with synergy in the deck")
 
         # Separate cards into lands and non-lands
         for card in recommended:
@@ -2267,7 +5771,7 @@ class MoxfieldAnalyzer:
             if is_auto_include:
                 card_type = self.auto_include_manager.get_card_type(card)
             else:
-                card_type = self.card_types.get(card, "Unknown")
+                card_type = self.lookup_card_type(card)
 
             if card_type == "Land":
                 # Only include lands that are in auto-includes or that meet our criteria:
@@ -2315,7 +5819,7 @@ class MoxfieldAnalyzer:
                     # 1. Must be owned by the user
                     # 2. Must appear in at least 30 decks
                     if card in self.owned_cards and freq >= 30:
-                        card_type = self.card_types.get(card, "Unknown")
+                        card_type = self.lookup_card_type(card)
                         normalized_card = self.normalize_card_name(card)
 
                         # Check if it's a land but not a basic land
@@ -2449,7 +5953,7 @@ class MoxfieldAnalyzer:
             if is_auto_include:
                 card_type = self.auto_include_manager.get_card_type(card)
             else:
-                card_type = self.card_types.get(card, "Unknown")
+                card_type = self.lookup_card_type(card)
 
             # If this is a basic land but card type is Unknown, set to Land
             if card_type == "Unknown" and self.is_basic_land(card):
@@ -2542,7 +6046,7 @@ class MoxfieldAnalyzer:
                 if is_auto_include:
                     card_type = self.auto_include_manager.get_card_type(card)
                 else:
-                    card_type = self.card_types.get(scraped_card, "Unknown")
+                    card_type = self.lookup_card_type(scraped_card)
 
                 # If this is a basic land but card type is Unknown, set to Land
                 if card_type == "Unknown" and self.is_basic_land(scraped_card):
@@ -2551,7 +6055,7 @@ class MoxfieldAnalyzer:
                 deck_data.append({
                     'Rank': global_rank,  # Use global rank for consistent sorting
                     'Card Name': scraped_card,  # Use the scraped card name for consistency
-                    'Mana Cost': self.card_mana_costs.get(norm_card, ''),
+                    'Mana Cost': self.lookup_mana_cost(norm_card),
                     'Frequency': freq,
                     'Card Type': card_type,
                     'Synergy Score': f"{synergy_value:.3f}",  # Format to 3 decimal places
@@ -2569,7 +6073,7 @@ class MoxfieldAnalyzer:
                     card_type = self.auto_include_manager.get_card_type(card)
                 else:
                     base_card_name = card.split(' (')[0] if ' (' in card else card
-                    card_type = self.card_types.get(base_card_name, "Unknown")
+                    card_type = self.lookup_card_type(base_card_name)
 
                 # If this is a basic land but card type is Unknown, set to Land
                 if card_type == "Unknown" and self.is_basic_land(base_card_name):
@@ -2578,7 +6082,7 @@ class MoxfieldAnalyzer:
                 deck_data.append({
                     'Rank': global_rank,  # Use global rank for consistent sorting
                     'Card Name': card,
-                    'Mana Cost': self.card_mana_costs.get(norm_card, ''),
+                    'Mana Cost': self.lookup_mana_cost(norm_card),
                     'Frequency': card_frequency.get(card.split(' (')[0] if ' (' in card else card, 0),
                     'Card Type': card_type,
                     'Synergy Score': f"{synergy_value:.3f}",  # Format to 3 decimal places
@@ -2601,9 +6105,15 @@ class MoxfieldAnalyzer:
         df.to_csv(output_path, index=False)
 
         print(f"Exported recommended decklist to {output_path}")
+
+        # Export the score components of every candidate, to see why cards ranked where they did
+        scores_path = f"{self.output_dir}/analysis/candidate_scores.csv"
+        candidate_scores.to_frame().to_csv(scores_path, index=False)
+        print(f"Exported candidate scores to {scores_path}")
         return df
 
-    def get_card_type(self, type_line):
+    @staticmethod
+    def get_card_type(type_line):
         """
         Extract card type from type_line.
 
@@ -2666,11 +6176,12 @@ class AutoIncludeManager:
             "GREEN_RED": []
         }
 
-        # Store card types for auto-includes
-        self.card_types = {}
+        # Types set for auto-includes are kept in the card metadata cache shared with the analyzers
+        self.card_metadata = CardMetadataCache.shared(CardMetadataCache.default_path(output_dir))
 
         # Track disabled cards for each color
         self.disabled_cards = {color: [] for color in self.auto_includes.keys()}
+        self._disabled_names = {}  # color -> set of normalized disabled names, rebuilt after changes
 
         print(f"AutoIncludeManager initializing with file: {self.auto_include_file}")
 
@@ -2779,6 +6290,7 @@ class AutoIncludeManager:
                             loaded_data[key] = []
 
                     self.disabled_cards = loaded_data
+                    self._disabled_names.clear()
                     print(f"After loading, disabled GREY cards: {self.disabled_cards.get('GREY', [])}")
             except Exception as e:
                 print(f"Error loading disabled cards: {e}")
@@ -2786,18 +6298,23 @@ class AutoIncludeManager:
             print(f"Disabled cards file not found: {self.disabled_file}, using defaults")
 
     def load_card_types(self):
-        """Load card types from file"""
+        """
+        Move card types from an auto_include_types.json file into the card metadata cache.
+
+        The file is renamed to auto_include_types.json.migrated once its types are in the
+        cache, so types cleared later in the cache are not brought back on the next start.
+        """
         if os.path.exists(self.auto_include_types_file):
             try:
                 with open(self.auto_include_types_file, 'r') as f:
                     loaded_data = json.load(f)
-                    print(f"Loaded card types from {self.auto_include_types_file}")
-                    self.card_types = loaded_data
+                # Types already set in the cache are newer than the file
+                for card_name, card_type in loaded_data.items():
+                    self.card_metadata.set_manual_type(card_name, card_type, overwrite=False)
+                os.replace(self.auto_include_types_file, self.auto_include_types_file + ".migrated")
+                print(f"Moved card types from {self.auto_include_types_file} to the card metadata cache")
             except Exception as e:
                 print(f"Error loading card types: {e}")
-        else:
-            print(f"Card types file not found: {self.auto_include_types_file}, initializing empty dictionary")
-            self.card_types = {}
 
     def save_auto_includes(self):
         """Save auto-include cards to file"""
@@ -2811,6 +6328,8 @@ class AutoIncludeManager:
 
     def save_disabled_cards(self):
         """Save disabled cards to file"""
+        # Disabled cards are saved after every change, so this is where the lookup sets go stale
+        self._disabled_names.clear()
         try:
             with open(self.disabled_file, 'w') as f:
                 json.dump(self.disabled_cards, f, indent=2)
@@ -2818,15 +6337,6 @@ class AutoIncludeManager:
         except Exception as e:
             print(f"Error saving disabled cards: {e}")
 
-    def save_card_types(self):
-        """Save card types to file"""
-        try:
-            with open(self.auto_include_types_file, 'w') as f:
-                json.dump(self.card_types, f, indent=2)
-                print(f"Saved card types to {self.auto_include_types_file}")
-        except Exception as e:
-            print(f"Error saving card types: {e}")
-
     def get_auto_includes(self, colors):
         """Get auto-include cards for given colors (excluding disabled ones)"""
         includes = set()
@@ -2957,13 +6467,12 @@ class AutoIncludeManager:
         return result
 
     def get_card_type(self, card_name):
-        """Get the stored type for a card, or 'Unknown' if not set"""
-        return self.card_types.get(card_name, "Unknown")
+        """Get the type set for a card, or 'Unknown' if not set"""
+        return self.card_metadata.manual_type(card_name)
 
     def set_card_type(self, card_name, card_type):
         """Set the type for a card"""
-        self.card_types[card_name] = card_type
-        self.save_card_types()
+        self.card_metadata.set_manual_type(card_name, card_type)
         return True
 
     def is_card_enabled(self, color, card_name):
@@ -2971,24 +6480,27 @@ class AutoIncludeManager:
         # First try with the normalized color
         color = self.normalize_color_pair(color)
 
-        if color in self.disabled_cards:
-            normalized_name = self.normalize_card_name(card_name)
-            for disabled_card in self.disabled_cards[color]:
-                if self.normalize_card_name(disabled_card) == normalized_name:
-                    return False
+        normalized_name = self.normalize_card_name(card_name)
+        if normalized_name in self.disabled_names(color):
+            return False
 
         # If the color contains an underscore, try the alternate format too
         if "_" in color:
             parts = color.split("_")
             alternate_key = f"{parts[1]}_{parts[0]}"
-            if alternate_key in self.disabled_cards:
-                normalized_name = self.normalize_card_name(card_name)
-                for disabled_card in self.disabled_cards[alternate_key]:
-                    if self.normalize_card_name(disabled_card) == normalized_name:
-                        return False
+            if normalized_name in self.disabled_names(alternate_key):
+                return False
 
         return True
 
+    def disabled_names(self, color):
+        """Get the normalized names of the disabled cards for a color"""
+        names = self._disabled_names.get(color)
+        if names is None:
+            names = {self.normalize_card_name(card) for card in self.disabled_cards.get(color, [])}
+            self._disabled_names[color] = names
+        return names
+
     def toggle_card_enabled(self, color, card_name, enabled):
         """Enable or disable a card for a color"""
         print(f"Toggling card '{card_name}' for {color} to {enabled}")
@@ -3106,17 +6618,8 @@ class AutoIncludeManager:
         return False
 
     def normalize_card_name(self, card_name):
-        """Normalize card name to handle variations in naming - matches MoxfieldAnalyzer's method"""
-        # Convert to lowercase
-        normalized = str(card_name).lower()
-
-        # Remove special characters, but keep spaces
-        normalized = re.sub(r'[^a-z0-9\s]', '', normalized)
-
-        # Remove extra spaces
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-
-        return normalized
+        """Normalize card name to handle variations in naming - same normalizer as MoxfieldAnalyzer"""
+        return card_names.normalize(card_name)
 
     def normalize_color_pair(self, color):
         """Normalize a color or color pair to ensure consistent lookup"""
@@ -3136,6 +6639,7 @@ if __name__ == "__main__":
         app = MoxfieldAnalyzerApp(root)
         print("Application initialized, starting main loop")
         root.mainloop()
+        app.log_sink.close()
         print("Main loop ended")
     except Exception as e:
         import traceback